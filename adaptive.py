@@ -0,0 +1,318 @@
+"""Adaptive difficulty: Elo-style item response estimates and an ability-banded item index.
+
+A student answers an item correctly with probability ``1 / (1 + exp(b - theta))``
+(the Rasch model), where ``theta`` is the student's ability in the subject and
+``b`` the item's difficulty, both on one logit scale. Every answer moves both
+estimates towards what happened, Elo-style, by a step that shrinks as more
+answers back the estimate, so a whole bank is calibrated from everyday use.
+
+An item tells us most about a student when ``b`` is close to ``theta``, so
+``ItemIndex`` files items into fixed-width difficulty bands per subject and
+per (subject, topic). Picking the next item starts at the band holding the
+student's ability and widens outward; an answer that moves an item into
+another band moves it in O(1). Neither depends on the size of the bank.
+
+    items = ItemIndex(".smartprep/items.db")
+    items.add(qid, "Physics", "Optics", "Medium", ref=pos)
+    ref = items.pick("Physics", profile.ability.theta("Physics"), exclude=used_ids)
+"""
+import atexit
+import math
+import os
+import random
+import sqlite3
+import threading
+
+ADAPTIVE = "Adaptive"                   # quiz difficulty that follows the student's ability
+DIFFICULTY_PRIOR = {"Easy": -1.0, "Medium": 0.0, "Hard": 1.0}
+RATING_MIN, RATING_MAX = -4.0, 4.0
+BAND_WIDTH = 0.25
+N_BANDS = int((RATING_MAX - RATING_MIN) / BAND_WIDTH)
+K_ITEM = 0.4          # first step for an item's difficulty ...
+K_STUDENT = 0.6       # ... and for a student's ability
+SETTLE = 20           # answers after which a step has halved
+K_FLOOR = 0.05        # steps never shrink below this, so estimates keep tracking drift
+DEFAULT_PATH = os.path.join(".smartprep", "items.db")
+
+
+def p_correct(theta, b):
+    return 1.0 / (1.0 + math.exp(b - theta))
+
+
+def information(theta, b):
+    """Fisher information of an item about ``theta``; highest where ``b == theta``."""
+    p = p_correct(theta, b)
+    return p * (1.0 - p)
+
+
+def step(k, answers):
+    return max(K_FLOOR, k / (1.0 + answers / SETTLE))
+
+
+def clamp(rating):
+    return min(RATING_MAX, max(RATING_MIN, rating))
+
+
+def prior(label):
+    """Starting difficulty of an item with difficulty label ``label``."""
+    return DIFFICULTY_PRIOR.get(label, 0.0)
+
+
+def label_for(rating):
+    """The difficulty label nearest ``rating``, for prompts and stores keyed by label."""
+    if rating < -0.5:
+        return "Easy"
+    return "Hard" if rating > 0.5 else "Medium"
+
+
+def band_of(rating):
+    return min(N_BANDS - 1, max(0, int((rating - RATING_MIN) / BAND_WIDTH)))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# STUDENT ABILITY
+# ──────────────────────────────────────────────────────────────────────────────
+class Ability:
+    """A student's ability estimate per subject."""
+
+    def __init__(self):
+        self.subjects = {}   # subject -> [theta, answers]
+
+    def theta(self, subject):
+        est = self.subjects.get(subject)
+        return est[0] if est else 0.0
+
+    def level(self, subject):
+        return label_for(self.theta(subject))
+
+    def record(self, subject, rating, correct):
+        """Update from one answer to an item of difficulty ``rating``; returns theta before it."""
+        est = self.subjects.setdefault(subject, [0.0, 0])
+        before = est[0]
+        est[0] = clamp(before + step(K_STUDENT, est[1]) * (int(bool(correct)) - p_correct(before, rating)))
+        est[1] += 1
+        return before
+
+    def to_dict(self):
+        return {s: [round(t, 4), n] for s, (t, n) in self.subjects.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        ability = cls()
+        ability.subjects = {s: [float(t), int(n)] for s, (t, n) in (data or {}).items()}
+        return ability
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ITEM INDEX
+# ──────────────────────────────────────────────────────────────────────────────
+class _Band:
+    """Item ids in one difficulty band; O(1) add, remove and random access."""
+
+    __slots__ = ("ids", "pos")
+
+    def __init__(self):
+        self.ids = []
+        self.pos = {}
+
+    def add(self, qid):
+        self.pos[qid] = len(self.ids)
+        self.ids.append(qid)
+
+    def discard(self, qid):
+        i = self.pos.pop(qid, None)
+        if i is None:
+            return
+        last = self.ids.pop()
+        if i < len(self.ids):
+            self.ids[i] = last
+            self.pos[last] = i
+
+
+class ItemIndex:
+    """Difficulty estimates for every answered item, and indexed items filed by band.
+
+    Any question id can be rated and updated; only items registered with
+    ``add`` (and a ``ref`` to load them by, such as a bank record number) can
+    be picked. With a ``path`` the estimates are kept in SQLite across
+    restarts: ``record`` only marks an item dirty, and a daemon thread writes
+    the dirty ratings in one transaction every ``interval`` seconds (and at
+    exit), so answers never wait on disk. Thread-safe.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS items (
+        id       TEXT PRIMARY KEY,
+        rating   REAL NOT NULL,
+        answers  INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, path=None, interval=2.0):
+        self._lock = threading.Lock()
+        self._ratings = {}   # id -> [rating, answers]
+        self._items = {}     # id -> (ref, index keys, band)
+        self._bands = {}     # (subject, topic or None) -> [_Band] * N_BANDS
+        self._dirty = set()  # ids whose rating is not written yet
+        self._write_lock = threading.Lock()
+        self._conn = None
+        self.interval = interval
+        self.flushes = 0
+        self.errors = 0
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            for qid, rating, answers in self._conn.execute("SELECT id, rating, answers FROM items"):
+                self._ratings[qid] = [rating, answers]
+            self._wake = threading.Event()
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="item-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def __len__(self):
+        return len(self._items)
+
+    def ref(self, qid):
+        """The ``ref`` item ``qid`` was added with, or None."""
+        item = self._items.get(qid)
+        return item[0] if item is not None else None
+
+    def rating(self, qid, label=None):
+        """Current difficulty estimate of ``qid``; the label's prior until it has been answered."""
+        est = self._ratings.get(qid)
+        return est[0] if est else prior(label)
+
+    def add(self, qid, subject, topic, label, ref):
+        """Make item ``qid`` pickable under its subject and topic."""
+        with self._lock:
+            self._add(qid, subject, topic, label, ref)
+
+    def _add(self, qid, subject, topic, label, ref):
+        if qid in self._items:
+            return
+        keys = ((subject, None), (subject, topic))
+        band = band_of(self.rating(qid, label))
+        for key in keys:
+            bands = self._bands.get(key)
+            if bands is None:
+                bands = self._bands[key] = [_Band() for _ in range(N_BANDS)]
+            bands[band].add(qid)
+        self._items[qid] = (ref, keys, band)
+
+    def reindex(self, entries):
+        """Replace the pickable items with ``entries`` of ``add`` arguments, e.g. for a rebuilt bank.
+
+        Ratings are kept; picks wait until the new index is complete.
+        """
+        with self._lock:
+            self._items, self._bands = {}, {}
+            for entry in entries:
+                self._add(*entry)
+
+    def record(self, qid, label, theta, correct):
+        """Update ``qid``'s difficulty from one answer by a student of ability ``theta``.
+
+        Only indexed items are rated: a question that can never be picked
+        (such as a one-off AI question) just returns its prior.
+        """
+        with self._lock:
+            item = self._items.get(qid)
+            if item is None:
+                return self.rating(qid, label)
+            est = self._ratings.get(qid)
+            if est is None:
+                est = self._ratings[qid] = [prior(label), 0]
+            est[0] = clamp(est[0] - step(K_ITEM, est[1]) * (int(bool(correct)) - p_correct(theta, est[0])))
+            est[1] += 1
+            if band_of(est[0]) != item[2]:
+                ref, keys, old = item
+                new = band_of(est[0])
+                for key in keys:
+                    self._bands[key][old].discard(qid)
+                    self._bands[key][new].add(qid)
+                self._items[qid] = (ref, keys, new)
+            if self._conn is not None:
+                self._dirty.add(qid)
+            return est[0]
+
+    def pick(self, subject, theta, exclude=(), topic=None, rng=random):
+        """``ref`` of the most informative unseen item for ability ``theta``, or None.
+
+        Bands are visited outward from the one holding ``theta``; within a
+        band the walk starts at a random item and skips only ``exclude``d ones.
+        """
+        with self._lock:
+            bands = self._bands.get((subject, topic))
+            if bands is None:
+                return None
+            center = band_of(theta)
+            for offset in range(N_BANDS):
+                for b in ((center + offset, center - offset) if offset else (center,)):
+                    if not 0 <= b < N_BANDS or not bands[b].ids:
+                        continue
+                    ids = bands[b].ids
+                    start = rng.randrange(len(ids))
+                    for i in range(len(ids)):
+                        qid = ids[(start + i) % len(ids)]
+                        if qid not in exclude:
+                            return self._items[qid][0]
+            return None
+
+    def stats(self):
+        with self._lock:
+            answered = [est[1] for est in self._ratings.values()]
+            return {"indexed": len(self._items), "rated": len(answered), "answers": sum(answered)}
+
+    def prune(self):
+        """Forget the ratings of ids that are not indexed, e.g. questions gone from a rebuilt bank."""
+        with self._write_lock:
+            with self._lock:
+                stale = [qid for qid in self._ratings if qid not in self._items]
+                for qid in stale:
+                    del self._ratings[qid]
+                self._dirty.difference_update(stale)
+            if stale and self._conn is not None:
+                with self._conn:
+                    self._conn.executemany("DELETE FROM items WHERE id = ?", ((qid,) for qid in stale))
+            return len(stale)
+
+    def flush(self):
+        """Write the ratings changed since the last flush."""
+        with self._write_lock:
+            with self._lock:
+                rows = [(qid, *self._ratings[qid]) for qid in self._dirty]
+                self._dirty = set()
+            if not rows or self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.executemany("INSERT OR REPLACE INTO items (id, rating, answers) VALUES (?, ?, ?)",
+                                           rows)
+                self.flushes += 1
+            except Exception:
+                # Retry on the next tick; the ratings themselves are still in memory
+                self.errors += 1
+                with self._lock:
+                    self._dirty.update(row[0] for row in rows)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        if self._conn is None or self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._write_lock:
+            self._conn.close()
+            self._conn = None
@@ -2,8 +2,34 @@ import streamlit as st
 import google.generativeai as genai
 import time
 import random
-from datetime import datetime, timedelta
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import json
+import math
+import os
+
+from streamlit.errors import StreamlitAPIException
+
+from adaptive import ADAPTIVE, DEFAULT_PATH as ITEMS_PATH, ItemIndex
+from bank_file import BankFile, write_bank
+from broker import HOT_POOL_SIZE, GenerationBroker
+from countdown import countdown
+from fingerprint import NearDuplicateFilter
+from metrics import REGISTRY, counter, gauge, histogram, ratio
+from pregen import DEFAULT_OUT as PREGEN_BANK_PATH
+from progress_store import DEFAULT_PATH as PROGRESS_STORE_PATH, open_store
+from question_store import MIN_POOL as STORE_MIN_POOL, QuestionStore
+from quiz_engine import (EXPIRED, Profile, QuizSession, level_from_xp, next_question, subject_for_index,
+                         xp_progress_pct)
+from response_cache import (DEFAULT_MAX_KEYS as RESPONSE_CACHE_MAX_KEYS, DEFAULT_PATH as RESPONSE_CACHE_PATH,
+                            DEFAULT_VARIANTS as RESPONSE_CACHE_VARIANTS, open_cache, prompt_key)
+from response_parser import BATCH_SCHEMA, QUESTION_SCHEMA, LineParser, parse_batch, parse_question
+from scheduler import (DEFAULT_CONCURRENCY, DEFAULT_RPM, INTERACTIVE, PREFETCH, WARMUP, CallScheduler,
+                       QuotaExceeded, is_rate_limited)
+from stub_model import parse_options as parse_stub_options, stub_factory
 
 # ──────────────────────────────────────────────────────────────────────────────
 # PAGE CONFIGURATION
@@ -61,20 +87,6 @@ st.markdown("""
         padding:1rem;border-radius:0.5rem;margin:0.75rem 0;
         border-left:4px solid var(--warning);
     }
-    .timer {
-        background:linear-gradient(135deg,#e0f2fe,#bae6fd);color:#0369a1;
-        padding:0.6rem;border-radius:0.5rem;text-align:center;
-        font-size:1.2rem;font-weight:700;margin:0.4rem 0;
-    }
-    .timer-warn {background:linear-gradient(135deg,#fef9c3,#fde68a);color:#92400e}
-    .timer-danger {
-        background:linear-gradient(135deg,#fee2e2,#fecaca);color:#991b1b;
-        animation:pulse 1s infinite;
-    }
-    @keyframes pulse {
-        0%,100%{opacity:1;transform:scale(1)}
-        50%{opacity:.8;transform:scale(1.01)}
-    }
     .badge {
         display:inline-block;background:linear-gradient(135deg,#4f46e5,#7c3aed);
         color:#fff;padding:0.15rem 0.6rem;border-radius:1rem;font-size:0.8rem;
@@ -104,76 +116,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ──────────────────────────────────────────────────────────────────────────────
-# BUILT-IN JAMB QUESTION BANK  (offline fallback + supplement)
-# ──────────────────────────────────────────────────────────────────────────────
-JAMB_QUESTION_BANK = {
-    "Mathematics": [
-        {"question": "If log₁₀2 = 0.3010, find log₁₀8.", "options": ["A) 0.6020", "B) 0.9030", "C) 2.4030", "D) 1.2040"], "answer": "B", "explanation": "8 = 2³, so log₁₀8 = 3 × log₁₀2 = 3 × 0.3010 = 0.9030.", "topic": "Algebra and Equations", "difficulty": "Medium"},
-        {"question": "Convert 101101₂ to base 10.", "options": ["A) 45", "B) 53", "C) 44", "D) 46"], "answer": "A", "explanation": "1×2⁵+0×2⁴+1×2³+1×2²+0×2¹+1×2⁰ = 32+0+8+4+0+1 = 45.", "topic": "Number Bases", "difficulty": "Easy"},
-        {"question": "Solve 2x² + 5x − 3 = 0.", "options": ["A) x = ½ or x = −3", "B) x = −½ or x = 3", "C) x = 1 or x = −3", "D) x = 3 or x = ½"], "answer": "A", "explanation": "Factoring: (2x − 1)(x + 3) = 0 ⇒ x = ½ or x = −3.", "topic": "Algebra and Equations", "difficulty": "Medium"},
-        {"question": "A fair die is thrown twice. What is the probability of getting a sum of 7?", "options": ["A) 1/12", "B) 1/6", "C) 5/36", "D) 7/36"], "answer": "B", "explanation": "Favourable outcomes: (1,6),(2,5),(3,4),(4,3),(5,2),(6,1) = 6 out of 36. P = 6/36 = 1/6.", "topic": "Statistics and Probability", "difficulty": "Medium"},
-        {"question": "Find dy/dx if y = 3x³ − 2x² + x − 5.", "options": ["A) 9x² − 4x + 1", "B) 9x² − 4x − 1", "C) 9x² + 4x + 1", "D) 3x² − 2x + 1"], "answer": "A", "explanation": "Differentiating term by term: dy/dx = 9x² − 4x + 1.", "topic": "Calculus", "difficulty": "Medium"},
-        {"question": "If A = {1,2,3,4,5} and B = {3,4,5,6,7}, find A ∩ B.", "options": ["A) {1,2}", "B) {3,4,5}", "C) {6,7}", "D) {1,2,3,4,5,6,7}"], "answer": "B", "explanation": "The intersection contains elements common to both sets: {3, 4, 5}.", "topic": "Sets and Logic", "difficulty": "Easy"},
-        {"question": "Simplify (√50 − √32) / √2.", "options": ["A) 1", "B) √2", "C) 3", "D) 2"], "answer": "A", "explanation": "√50 = 5√2, √32 = 4√2. So (5√2 − 4√2)/√2 = √2/√2 = 1.", "topic": "Algebra and Equations", "difficulty": "Medium"},
-        {"question": "Find the determinant of the matrix [[2, 3],[4, 1]].", "options": ["A) −10", "B) 10", "C) −14", "D) 14"], "answer": "A", "explanation": "det = (2×1) − (3×4) = 2 − 12 = −10.", "topic": "Matrices", "difficulty": "Medium"},
-        {"question": "The 3rd term of a G.P. is 18 and the 6th term is 486. Find the first term.", "options": ["A) 2", "B) 3", "C) 6", "D) 9"], "answer": "A", "explanation": "ar² = 18, ar⁵ = 486. Dividing: r³ = 27, r = 3. Then a(9) = 18, a = 2.", "topic": "Algebra and Equations", "difficulty": "Hard"},
-        {"question": "Find the distance between points P(3, −2) and Q(−1, 1).", "options": ["A) 5", "B) 4", "C) 7", "D) √13"], "answer": "A", "explanation": "d = √[(3−(−1))² + (−2−1)²] = √[16+9] = √25 = 5.", "topic": "Geometry and Trigonometry", "difficulty": "Easy"},
-    ],
-    "English Language": [
-        {"question": "Choose the word that best completes the sentence: The teacher asked the students to ______ their essays before submission.", "options": ["A) revise", "B) devise", "C) advise", "D) supervise"], "answer": "A", "explanation": "'Revise' means to re-examine and make corrections, which is what students do to essays before submission.", "topic": "Lexis and Structure", "difficulty": "Easy"},
-        {"question": "Select the option that best explains the idiom: 'to bury the hatchet'.", "options": ["A) To start a fight", "B) To make peace", "C) To hide a weapon", "D) To dig a grave"], "answer": "B", "explanation": "'Bury the hatchet' is an idiom meaning to end a conflict and make peace.", "topic": "Figurative Expressions", "difficulty": "Medium"},
-        {"question": "Identify the figure of speech in: 'The wind howled through the night.'", "options": ["A) Simile", "B) Metaphor", "C) Personification", "D) Hyperbole"], "answer": "C", "explanation": "Attributing the human action of 'howling' to wind is personification.", "topic": "Literary Devices", "difficulty": "Easy"},
-        {"question": "Choose the correct option: Neither the students nor the teacher ______ present.", "options": ["A) were", "B) was", "C) are", "D) have been"], "answer": "B", "explanation": "With 'neither…nor', the verb agrees with the nearest subject ('teacher' = singular), so 'was'.", "topic": "Grammatical Structures", "difficulty": "Medium"},
-        {"question": "Which of these words is a synonym of 'benevolent'?", "options": ["A) Malicious", "B) Kind", "C) Wealthy", "D) Intelligent"], "answer": "B", "explanation": "'Benevolent' means well-meaning and kindly, synonymous with 'kind'.", "topic": "Synonyms and Antonyms", "difficulty": "Easy"},
-        {"question": "The expression 'a red herring' means:", "options": ["A) A type of fish", "B) A misleading clue", "C) A dangerous situation", "D) An embarrassing moment"], "answer": "B", "explanation": "A 'red herring' is something that misleads or distracts from a relevant issue.", "topic": "Figurative Expressions", "difficulty": "Medium"},
-        {"question": "Choose the word with the correct stress pattern (capitalised syllable): PHOTOGRAPH", "options": ["A) phoTOgraph", "B) PHOtograph", "C) photoGRAPH", "D) phoTOGraph"], "answer": "B", "explanation": "The stress in 'photograph' falls on the first syllable: PHO-to-graph.", "topic": "Oral Forms", "difficulty": "Medium"},
-        {"question": "Identify the sentence with correct punctuation:", "options": ["A) Its a beautiful day isnt it?", "B) It's a beautiful day, isn't it?", "C) Its a beautiful day, isn't it?", "D) It's a beautiful day isnt it."], "answer": "B", "explanation": "'It's' (contraction) and 'isn't it?' (tag question) both need apostrophes, and a comma separates the tag.", "topic": "Grammatical Structures", "difficulty": "Easy"},
-    ],
-    "Physics": [
-        {"question": "A body of mass 5 kg is moving with a velocity of 10 m/s. What is its kinetic energy?", "options": ["A) 50 J", "B) 100 J", "C) 250 J", "D) 500 J"], "answer": "C", "explanation": "KE = ½mv² = ½ × 5 × 10² = ½ × 5 × 100 = 250 J.", "topic": "Mechanics", "difficulty": "Easy"},
-        {"question": "A wire of resistance 6Ω is drawn out so that its length is doubled. What is the new resistance?", "options": ["A) 3Ω", "B) 6Ω", "C) 12Ω", "D) 24Ω"], "answer": "D", "explanation": "When length doubles, area halves (volume constant). R = ρL/A → new R = ρ(2L)/(A/2) = 4ρL/A = 4×6 = 24Ω.", "topic": "Electricity and Magnetism", "difficulty": "Hard"},
-        {"question": "Which of the following is a vector quantity?", "options": ["A) Speed", "B) Temperature", "C) Momentum", "D) Energy"], "answer": "C", "explanation": "Momentum has both magnitude and direction, making it a vector. Speed, temperature, and energy are scalars.", "topic": "Mechanics", "difficulty": "Easy"},
-        {"question": "The image formed by a plane mirror is:", "options": ["A) Real and inverted", "B) Virtual and erect", "C) Real and erect", "D) Virtual and inverted"], "answer": "B", "explanation": "A plane mirror always produces a virtual, erect, and laterally inverted image of the same size.", "topic": "Optics", "difficulty": "Easy"},
-        {"question": "A sound wave has a frequency of 340 Hz and travels at 340 m/s. What is its wavelength?", "options": ["A) 0.5 m", "B) 1.0 m", "C) 2.0 m", "D) 340 m"], "answer": "B", "explanation": "λ = v/f = 340/340 = 1.0 m.", "topic": "Waves", "difficulty": "Medium"},
-        {"question": "The half-life of a radioactive substance is 4 days. What fraction remains after 12 days?", "options": ["A) 1/4", "B) 1/8", "C) 1/16", "D) 1/2"], "answer": "B", "explanation": "12 days = 3 half-lives. Fraction remaining = (½)³ = 1/8.", "topic": "Nuclear Physics", "difficulty": "Medium"},
-        {"question": "An object is thrown vertically upward with a velocity of 20 m/s. What is the maximum height reached? (g = 10 m/s²)", "options": ["A) 10 m", "B) 20 m", "C) 40 m", "D) 80 m"], "answer": "B", "explanation": "At max height v = 0. Using v² = u² − 2gh: 0 = 400 − 20h → h = 20 m.", "topic": "Mechanics", "difficulty": "Medium"},
-    ],
-    "Chemistry": [
-        {"question": "What is the IUPAC name of CH₃CH₂OH?", "options": ["A) Methanol", "B) Ethanol", "C) Propanol", "D) Butanol"], "answer": "B", "explanation": "CH₃CH₂OH has 2 carbon atoms with an -OH group, making it ethanol.", "topic": "Organic Chemistry", "difficulty": "Easy"},
-        {"question": "Which of the following is a strong electrolyte?", "options": ["A) CH₃COOH", "B) NH₃", "C) NaCl", "D) C₂H₅OH"], "answer": "C", "explanation": "NaCl (sodium chloride) completely dissociates in water, making it a strong electrolyte.", "topic": "Electrochemistry", "difficulty": "Medium"},
-        {"question": "In the periodic table, elements in the same group have the same:", "options": ["A) Atomic mass", "B) Number of electron shells", "C) Number of valence electrons", "D) Atomic number"], "answer": "C", "explanation": "Elements in the same group have the same number of valence (outermost) electrons, giving them similar chemical properties.", "topic": "Atomic Structure", "difficulty": "Easy"},
-        {"question": "The pH of a neutral solution at 25°C is:", "options": ["A) 0", "B) 1", "C) 7", "D) 14"], "answer": "C", "explanation": "At 25°C, a neutral solution has equal concentrations of H⁺ and OH⁻, giving pH = 7.", "topic": "Acids and Bases", "difficulty": "Easy"},
-        {"question": "What type of bond is formed between Na and Cl in NaCl?", "options": ["A) Covalent", "B) Metallic", "C) Ionic", "D) Van der Waals"], "answer": "C", "explanation": "Na donates an electron to Cl, forming Na⁺ and Cl⁻ ions held together by electrostatic (ionic) bonding.", "topic": "Chemical Bonding", "difficulty": "Easy"},
-        {"question": "Which gas is produced when dilute HCl reacts with Na₂CO₃?", "options": ["A) Hydrogen", "B) Oxygen", "C) Carbon dioxide", "D) Chlorine"], "answer": "C", "explanation": "Na₂CO₃ + 2HCl → 2NaCl + H₂O + CO₂. Carbon dioxide gas is liberated.", "topic": "Chemical Reactions", "difficulty": "Medium"},
-        {"question": "Le Chatelier's principle states that when a system at equilibrium is disturbed, it:", "options": ["A) Stops reacting", "B) Shifts to oppose the change", "C) Shifts to reinforce the change", "D) Reaches a new equilibrium immediately"], "answer": "B", "explanation": "Le Chatelier's principle: a system at equilibrium shifts in the direction that tends to counteract the imposed change.", "topic": "Physical Chemistry", "difficulty": "Medium"},
-    ],
-    "Biology": [
-        {"question": "The organelle responsible for protein synthesis in a cell is the:", "options": ["A) Mitochondrion", "B) Ribosome", "C) Golgi apparatus", "D) Lysosome"], "answer": "B", "explanation": "Ribosomes are the sites of protein synthesis, translating mRNA into polypeptide chains.", "topic": "Cell Biology", "difficulty": "Easy"},
-        {"question": "In Mendel's experiment, if Tt is crossed with Tt, what is the phenotypic ratio?", "options": ["A) 1:1", "B) 1:2:1", "C) 3:1", "D) 2:1"], "answer": "C", "explanation": "Tt × Tt gives TT:Tt:tt = 1:2:1 genotypically, but 3 tall : 1 short phenotypically (3:1).", "topic": "Genetics", "difficulty": "Medium"},
-        {"question": "Malaria is caused by:", "options": ["A) Virus", "B) Bacteria", "C) Plasmodium", "D) Trypanosoma"], "answer": "C", "explanation": "Malaria is caused by Plasmodium parasites (P. falciparum, P. vivax, etc.) transmitted by female Anopheles mosquitoes.", "topic": "Microbiology", "difficulty": "Easy"},
-        {"question": "The part of the flower that develops into a fruit after fertilisation is the:", "options": ["A) Sepal", "B) Petal", "C) Ovary", "D) Anther"], "answer": "C", "explanation": "After fertilisation, the ovary of the flower develops into the fruit, enclosing the seeds.", "topic": "Plant Biology", "difficulty": "Easy"},
-        {"question": "Which blood group is the universal donor?", "options": ["A) A", "B) B", "C) AB", "D) O"], "answer": "D", "explanation": "Blood group O has no A or B antigens on red blood cells, so it can be donated to all ABO groups (universal donor).", "topic": "Human Anatomy and Physiology", "difficulty": "Easy"},
-        {"question": "The process by which green plants manufacture food using sunlight is called:", "options": ["A) Respiration", "B) Transpiration", "C) Photosynthesis", "D) Osmosis"], "answer": "C", "explanation": "Photosynthesis is the process by which plants use light energy, CO₂, and water to produce glucose and oxygen.", "topic": "Plant Biology", "difficulty": "Easy"},
-        {"question": "In an ecosystem, organisms that feed on dead organic matter are called:", "options": ["A) Producers", "B) Primary consumers", "C) Decomposers", "D) Tertiary consumers"], "answer": "C", "explanation": "Decomposers (e.g., bacteria and fungi) break down dead organic matter and recycle nutrients.", "topic": "Ecology", "difficulty": "Easy"},
-        {"question": "Sickle cell anaemia is caused by a mutation in the gene coding for:", "options": ["A) Insulin", "B) Haemoglobin", "C) Keratin", "D) Collagen"], "answer": "B", "explanation": "Sickle cell anaemia results from a point mutation in the haemoglobin gene (HBB), producing abnormal haemoglobin S.", "topic": "Genetics", "difficulty": "Medium"},
-    ],
-    "Government": [
-        {"question": "The 1999 Constitution of Nigeria provides for a:", "options": ["A) Parliamentary system", "B) Confederate system", "C) Presidential system", "D) Monarchical system"], "answer": "C", "explanation": "Nigeria's 1999 Constitution establishes a presidential system with separation of powers among the executive, legislature, and judiciary.", "topic": "Nigerian Constitution", "difficulty": "Easy"},
-        {"question": "The principle of separation of powers was advocated by:", "options": ["A) John Locke", "B) Montesquieu", "C) Jean-Jacques Rousseau", "D) Thomas Hobbes"], "answer": "B", "explanation": "Baron de Montesquieu articulated the doctrine of separation of powers into executive, legislative, and judicial branches.", "topic": "Political Parties", "difficulty": "Medium"},
-        {"question": "INEC stands for:", "options": ["A) Independent National Electoral Council", "B) Independent National Electoral Commission", "C) Internal National Electoral Commission", "D) Independent Nigerian Electoral Committee"], "answer": "B", "explanation": "INEC is the Independent National Electoral Commission, responsible for conducting elections in Nigeria.", "topic": "Electoral Systems", "difficulty": "Easy"},
-        {"question": "How many geo-political zones does Nigeria have?", "options": ["A) 4", "B) 5", "C) 6", "D) 7"], "answer": "C", "explanation": "Nigeria has 6 geo-political zones: North-Central, North-East, North-West, South-East, South-South, and South-West.", "topic": "Nigerian Federalism", "difficulty": "Easy"},
-        {"question": "The highest court in Nigeria is the:", "options": ["A) Court of Appeal", "B) Federal High Court", "C) Supreme Court", "D) High Court"], "answer": "C", "explanation": "The Supreme Court is the apex court in Nigeria and the final court of appeal.", "topic": "Nigerian Political System", "difficulty": "Easy"},
-    ],
-    "Economics": [
-        {"question": "The law of demand states that, ceteris paribus, as price increases:", "options": ["A) Quantity demanded increases", "B) Quantity demanded decreases", "C) Supply increases", "D) Supply decreases"], "answer": "B", "explanation": "The law of demand: price and quantity demanded are inversely related, all other factors held constant.", "topic": "Microeconomics", "difficulty": "Easy"},
-        {"question": "GDP stands for:", "options": ["A) General Domestic Price", "B) Gross Domestic Product", "C) General Development Plan", "D) Gross Development Product"], "answer": "B", "explanation": "GDP (Gross Domestic Product) is the total monetary value of all finished goods and services produced within a country's borders.", "topic": "Macroeconomics", "difficulty": "Easy"},
-        {"question": "An increase in supply, with demand unchanged, leads to:", "options": ["A) Higher equilibrium price", "B) Lower equilibrium price", "C) No change in price", "D) Higher demand"], "answer": "B", "explanation": "When supply increases (shifts right) with constant demand, the equilibrium price falls and quantity rises.", "topic": "Microeconomics", "difficulty": "Medium"},
-        {"question": "Which of the following is NOT a function of the Central Bank of Nigeria?", "options": ["A) Issuing currency", "B) Banker to commercial banks", "C) Accepting deposits from individuals", "D) Controlling monetary policy"], "answer": "C", "explanation": "The CBN does not accept deposits from the general public; that is the role of commercial banks.", "topic": "Monetary Economics", "difficulty": "Medium"},
-        {"question": "Inflation is best described as:", "options": ["A) A fall in the general price level", "B) A persistent rise in the general price level", "C) An increase in the value of money", "D) A decrease in production"], "answer": "B", "explanation": "Inflation is a sustained increase in the general level of prices for goods and services over time.", "topic": "Macroeconomics", "difficulty": "Easy"},
-    ],
-}
-
 # ──────────────────────────────────────────────────────────────────────────────
 # JAMB SUBJECTS & CURRICULUM TOPICS
 # ──────────────────────────────────────────────────────────────────────────────
@@ -276,29 +218,203 @@ JAMB_SUBJECTS = {
 # ──────────────────────────────────────────────────────────────────────────────
 # API INITIALISATION (with robust fallback)
 # ──────────────────────────────────────────────────────────────────────────────
+MODEL_IDS = [
+    "gemini-2.5-flash",
+    "gemini-2.0-flash",
+    "gemini-1.5-flash",
+]
+BREAKER_THRESHOLD = 3    # consecutive failures before a model is taken out of rotation
+BREAKER_COOLDOWN = 60    # seconds an open breaker waits before letting a trial call through
+
+
+class ModelHealth:
+    """Circuit breaker state for one model id."""
+
+    def __init__(self):
+        self.failures = 0
+        self.open_until = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.last_error = ""
+
+    def available(self, now):
+        return now >= self.open_until
+
+    def record_success(self):
+        self.calls += 1
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, err, trip=False):
+        self.calls += 1
+        self.errors += 1
+        self.failures += 1
+        self.last_error = f"{type(err).__name__}: {err}"[:200]
+        if trip or self.failures >= BREAKER_THRESHOLD:
+            self.open_until = time.time() + BREAKER_COOLDOWN
+
+
+class ModelRouter:
+    """Drop-in for ``GenerativeModel`` that fails over along ``MODEL_IDS``.
+
+    Nothing here touches the network until a question is actually requested;
+    a background probe only pre-emptively trips the breaker of a dead model.
+    """
+
+    def __init__(self, model_ids, factory, scheduler=None):
+        self.model_ids = list(model_ids)
+        self._models = {mid: factory(mid) for mid in self.model_ids}
+        self.health = {mid: ModelHealth() for mid in self.model_ids}
+        self.scheduler = scheduler or CallScheduler()
+        self._lock = threading.Lock()
+
+    @property
+    def model_name(self):
+        """The id real calls currently go to first."""
+        return self.candidates()[0]
+
+    def candidates(self):
+        """Model ids to try, in preference order, skipping open breakers."""
+        now = time.time()
+        with self._lock:
+            ok = [m for m in self.model_ids if self.health[m].available(now)]
+            if ok:
+                return ok
+            # Everything is tripped: try whichever breaker closes first
+            return [min(self.model_ids, key=lambda m: self.health[m].open_until)]
+
+    def generate_content(self, *args, priority=PREFETCH, **kwargs):
+        """Call the first healthy model that grants a scheduler slot at ``priority``.
+
+        A streamed call (``stream=True``) keeps its slot until the stream has
+        been read to the end; how the stream ends is what the breaker records.
+        """
+        last_err = None
+        for mid in self.candidates():
+            try:
+                self.scheduler.acquire(mid, priority)
+            except QuotaExceeded as e:
+                # Our own queue is full, not a model fault: leave the breaker alone
+                last_err = e
+                continue
+            try:
+                resp = self._models[mid].generate_content(*args, **kwargs)
+            except BaseException as e:
+                self._finish(mid, e)
+                if not isinstance(e, Exception):
+                    raise
+                last_err = e
+                continue
+            if kwargs.get("stream"):
+                return self._streamed(mid, resp)
+            self._finish(mid)
+            return resp
+        raise last_err
+
+    def _streamed(self, mid, resp):
+        """``resp``'s chunks, holding ``mid``'s slot until the stream ends or is closed."""
+        try:
+            yield from resp
+        except GeneratorExit:
+            # Abandoned by the reader, not failed by the model
+            self.scheduler.release(mid)
+            raise
+        except BaseException as e:
+            self._finish(mid, e)
+            raise
+        self._finish(mid)
+
+    def _finish(self, mid, err=None):
+        """Return ``mid``'s slot and record the call's outcome with its breaker."""
+        self.scheduler.release(mid, err)
+        if isinstance(err, Exception) or err is None:
+            with self._lock:
+                if err is None:
+                    self.health[mid].record_success()
+                else:
+                    self.health[mid].record_failure(err)
+
+    async def generate_content_async(self, *args, priority=WARMUP, **kwargs):
+        """Awaitable ``generate_content`` with the same scheduling and failover.
+
+        Models without a native async call run in the loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        last_err = None
+        for mid in self.candidates():
+            model = self._models[mid]
+            acquired = loop.run_in_executor(None, self.scheduler.acquire, mid, priority)
+            try:
+                await asyncio.shield(acquired)
+            except QuotaExceeded as e:
+                last_err = e
+                continue
+            except asyncio.CancelledError:
+                # The slot may still be granted after we stop waiting; hand it straight back
+                acquired.add_done_callback(
+                    lambda f: f.cancelled() or f.exception() or self.scheduler.release(mid))
+                raise
+            try:
+                if hasattr(model, "generate_content_async"):
+                    resp = await model.generate_content_async(*args, **kwargs)
+                else:
+                    resp = await loop.run_in_executor(None, lambda: model.generate_content(*args, **kwargs))
+            except BaseException as e:
+                self.scheduler.release(mid, e)
+                if not isinstance(e, Exception):
+                    raise
+                with self._lock:
+                    self.health[mid].record_failure(e)
+                last_err = e
+                continue
+            self.scheduler.release(mid)
+            with self._lock:
+                self.health[mid].record_success()
+            return resp
+        raise last_err
+
+    def quota_limited(self):
+        """True while Gemini is (or recently was) refusing calls for quota reasons."""
+        return self.scheduler.recently_limited()
+
+    def probe(self):
+        """Check the preferred model once; trip its breaker if it is unusable."""
+        mid = self.model_ids[0]
+        try:
+            self._models[mid].generate_content("Say OK")
+        except Exception as e:
+            with self._lock:
+                self.health[mid].record_failure(e, trip=True)
+        else:
+            with self._lock:
+                self.health[mid].record_success()
+
+    def check_in_background(self):
+        threading.Thread(target=self.probe, name="model-probe", daemon=True).start()
+
+
 @st.cache_resource
 def init_model():
-    """Initialise Gemini with a fallback chain of model IDs."""
-    api_key = st.secrets.get("GEMINI_API_KEY", "")
+    """Initialise Gemini lazily: no network calls before the first page renders.
+
+    With ``STUB_MODEL`` set (or ``SMARTPREP_STUB_MODEL`` in the environment)
+    offline stub models stand in for Gemini, for load tests and demos.
+    """
+    scheduler = CallScheduler(rpm=get_setting("MODEL_RPM", {}),
+                              default_rpm=int(get_setting("MODEL_DEFAULT_RPM", DEFAULT_RPM)),
+                              max_concurrency=int(get_setting("MODEL_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    stub = get_setting("STUB_MODEL", os.environ.get("SMARTPREP_STUB_MODEL", ""))
+    if stub:
+        return ModelRouter(MODEL_IDS, stub_factory(**parse_stub_options(stub)), scheduler)
+
+    api_key = get_setting("GEMINI_API_KEY", "")
     if not api_key:
         return None
 
     genai.configure(api_key=api_key)
-
-    model_ids = [
-        "gemini-2.5-flash",
-        "gemini-2.0-flash",
-        "gemini-1.5-flash",
-    ]
-    for mid in model_ids:
-        try:
-            model = genai.GenerativeModel(mid)
-            model.generate_content("Say OK")
-            return model
-        except Exception:
-            continue
-
-    return None
+    router = ModelRouter(MODEL_IDS, genai.GenerativeModel, scheduler)
+    router.check_in_background()
+    return router
 
 
 def get_model():
@@ -306,6 +422,82 @@ def get_model():
     return init_model()
 
 
+def get_setting(key, default):
+    """Read an optional tuning knob from Streamlit secrets."""
+    try:
+        return st.secrets.get(key, default)
+    except Exception:
+        return default
+
+
+@st.cache_resource
+def get_question_store():
+    """Open the shared on-disk question store, or None if it can't be used here."""
+    try:
+        return QuestionStore(get_setting("QUESTION_STORE_PATH", ".smartprep/questions.db"),
+                             max_rows=int(get_setting("QUESTION_STORE_MAX_ROWS", 50_000)),
+                             max_age_days=int(get_setting("QUESTION_STORE_MAX_AGE_DAYS", 180)),
+                             near_dup_threshold=float(get_setting("NEAR_DUP_THRESHOLD", NEAR_DUP_THRESHOLD)),
+                             min_pool=int(get_setting("STORE_MIN_POOL", STORE_MIN_POOL)))
+    except Exception:
+        return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# INSTRUMENTATION
+# ──────────────────────────────────────────────────────────────────────────────
+GENERATION_SECONDS = histogram("smartprep_generation_seconds", "Gemini call latency", ("kind", "outcome"))
+FIRST_QUESTION_SECONDS = histogram("smartprep_time_to_first_question_seconds",
+                                   "Time until a streamed question can be shown")
+PARSE_TOTAL = counter("smartprep_parse_total", "AI responses parsed, per question", ("format", "outcome"))
+PARSE_FIELD_FAILURES = counter("smartprep_parse_field_failures_total",
+                               "Question fields an AI response left missing or unusable", ("format", "field"))
+PARSE_REPAIRS = counter("smartprep_parse_repairs_total", "Malformed AI responses repaired instead of discarded",
+                        ("format", "repair"))
+QUESTIONS_SERVED = counter("smartprep_questions_served_total", "Questions shown to students", ("path", "source"))
+RESPONSE_CACHE_TOTAL = counter("smartprep_response_cache_total", "Prompt-level response cache lookups",
+                               ("outcome",))
+FALLBACK_TOTAL = counter("smartprep_fallback_total", "AI requests that ended on the past-question bank",
+                         ("reason",))
+RENDER_SECONDS = histogram("smartprep_render_seconds", "Script run time per page", ("stage",))
+gauge("smartprep_parse_failure_ratio", "Share of AI questions that failed to parse",
+      fn=ratio(lambda: PARSE_TOTAL.total(outcome="failed"), PARSE_TOTAL.total))
+gauge("smartprep_fallback_ratio", "Share of served questions that were AI fallbacks",
+      fn=ratio(FALLBACK_TOTAL.total, QUESTIONS_SERVED.total))
+
+
+def note_parse(report, expected=1):
+    """Count a response's good and unusable questions, failed fields and repairs from its ``ParseReport``."""
+    fmt, parsed = report.format, report.parsed
+    PARSE_TOTAL.inc(parsed, format=fmt, outcome="ok")
+    if expected > parsed:
+        PARSE_TOTAL.inc(expected - parsed, format=fmt, outcome="failed")
+    for field, n in report.failures.items():
+        PARSE_FIELD_FAILURES.inc(n, format=fmt, field=field)
+    for repair, n in report.repairs.items():
+        PARSE_REPAIRS.inc(n, format=fmt, repair=repair)
+
+
+def note_served(path, q):
+    if q:
+        QUESTIONS_SERVED.inc(path=path, source=q.get("source", "ai"))
+
+
+@st.cache_resource
+def start_metrics_export():
+    """Expose metrics on ``METRICS_PORT`` and/or dump them to ``METRICS_FILE`` if configured."""
+    port = get_setting("METRICS_PORT", None)
+    if port:
+        try:
+            REGISTRY.serve(int(port))
+        except OSError:
+            pass   # another server process already owns the port
+    path = get_setting("METRICS_FILE", None)
+    if path:
+        REGISTRY.dump_every(path, float(get_setting("METRICS_DUMP_INTERVAL", 15)))
+    return True
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # QUESTION GENERATION
 # ──────────────────────────────────────────────────────────────────────────────
@@ -316,9 +508,26 @@ def pick_topic(subject, used_topics):
     return random.choice(available) if available else random.choice(topics)
 
 
-def generate_ai_question(model, subject, topic, difficulty):
-    """Call Gemini to generate a single JAMB-style MCQ."""
-    prompt = f"""You are a JAMB exam question setter for Nigeria's Unified Tertiary Matriculation Examination.
+def question_prompt(subject, topic, difficulty, fmt="line"):
+    """Prompt for a single JAMB-style MCQ, in the line format or (``fmt="json"``) as a JSON object."""
+    if fmt == "json":
+        answer_format = f"""Respond with a JSON object only (no extra text) with:
+"question": the question text,
+"options": an array of exactly 4 option texts without letter prefixes,
+"answer": the letter of the correct option (A, B, C or D),
+"explanation": a detailed explanation,
+"topic": exactly "{topic}"."""
+    else:
+        answer_format = f"""Respond in EXACTLY this format (no extra text):
+Question: <question text>
+A) <option>
+B) <option>
+C) <option>
+D) <option>
+Answer: <letter only, e.g. B>
+Explanation: <detailed explanation>
+Topic: {topic}"""
+    return f"""You are a JAMB exam question setter for Nigeria's Unified Tertiary Matriculation Examination.
 
 Create ONE {difficulty.lower()}-level multiple-choice question for **{subject}** on the topic **{topic}**.
 
@@ -329,178 +538,910 @@ Rules:
 - Distractors should reflect common student misconceptions.
 - Provide a thorough explanation referencing the underlying principle.
 
-Respond in EXACTLY this format (no extra text):
-Question: <question text>
-A) <option>
-B) <option>
-C) <option>
-D) <option>
-Answer: <letter only, e.g. B>
-Explanation: <detailed explanation>
-Topic: {topic}"""
+{answer_format}"""
+
+
+QUESTION_CONFIG = {"response_mime_type": "application/json", "response_schema": QUESTION_SCHEMA}
+# Cache keys hash the prompts as sent: JSON with its schema for single calls and refills, and
+# the line format streamed questions are stored from, so editing either invalidates cached variants
+QUESTION_TEMPLATE = "\n".join((question_prompt("{subject}", "{topic}", "{difficulty}", fmt="json"),
+                                json.dumps(QUESTION_SCHEMA, sort_keys=True),
+                                question_prompt("{subject}", "{topic}", "{difficulty}")))
+
+
+@st.cache_resource
+def get_response_cache():
+    """Process-wide prompt-level response cache (``RESPONSE_CACHE``: memory, disk or off)."""
+    kind = str(get_setting("RESPONSE_CACHE", "memory")).lower()
+    if kind in ("", "off", "none"):
+        return None
+    model, store = get_model(), get_question_store()
+
+    def refill(fields):
+        if model is None:
+            return None
+        q = generate_ai_question(model, *fields)
+        if q and store is not None:
+            subject, _, difficulty = fields
+            store.add(subject, difficulty, q)
+        return q
 
     try:
-        resp = model.generate_content(prompt)
-        return parse_ai_response(resp.text.strip(), topic)
+        return open_cache(kind, path=get_setting("RESPONSE_CACHE_PATH", RESPONSE_CACHE_PATH),
+                          variants=int(get_setting("RESPONSE_CACHE_VARIANTS", RESPONSE_CACHE_VARIANTS)),
+                          ttl=float(get_setting("RESPONSE_CACHE_TTL_HOURS", 168)) * 3600,
+                          max_keys=int(get_setting("RESPONSE_CACHE_MAX_KEYS", RESPONSE_CACHE_MAX_KEYS)),
+                          refill=refill, executor=get_prefetch_pool())
     except Exception:
         return None
 
 
-def parse_ai_response(text, fallback_topic="General"):
-    """Parse the structured AI response into a dict."""
-    lines = [l.strip() for l in text.split("\n") if l.strip()]
-    q, opts, ans, expl, topic = "", [], "", "", fallback_topic
-    for line in lines:
-        if line.lower().startswith("question:"):
-            q = line.split(":", 1)[1].strip()
-        elif line[:2] in ("A)", "B)", "C)", "D)"):
-            opts.append(line)
-        elif line.lower().startswith("answer:"):
-            ans = line.split(":", 1)[1].strip()[:1]
-        elif line.lower().startswith("explanation:"):
-            expl = line.split(":", 1)[1].strip()
-        elif line.lower().startswith("topic:"):
-            topic = line.split(":", 1)[1].strip()
-    if q and len(opts) >= 4 and ans and expl:
-        return {"question": q, "options": opts[:4], "answer": ans,
-                "explanation": expl, "topic": topic, "source": "ai"}
-    return None
+def cached_question(cache, subject, topic, difficulty, exclude):
+    """A cached response to the single-question prompt, rotated among students; None on a miss."""
+    if cache is None:
+        return None
+    q = cache.get(prompt_key(QUESTION_TEMPLATE, subject, topic, difficulty), exclude, (subject, topic, difficulty))
+    RESPONSE_CACHE_TOTAL.inc(outcome="hit" if q else "miss")
+    return q
+
+
+def cache_question(cache, subject, topic, difficulty, q):
+    if cache is not None and q:
+        cache.put(prompt_key(QUESTION_TEMPLATE, subject, topic, difficulty), q)
+        RESPONSE_CACHE_TOTAL.inc(outcome="store")
+
+
+def generate_ai_question(model, subject, topic, difficulty, priority=PREFETCH):
+    """Call Gemini to generate a single JAMB-style MCQ as schema-constrained JSON."""
+    start = time.perf_counter()
+    try:
+        resp = model.generate_content(question_prompt(subject, topic, difficulty, fmt="json"),
+                                      generation_config=QUESTION_CONFIG, priority=priority)
+        text = resp.text
+    except Exception:
+        GENERATION_SECONDS.observe(time.perf_counter() - start, kind="single", outcome="error")
+        return None
+    GENERATION_SECONDS.observe(time.perf_counter() - start, kind="single", outcome="ok")
+    q, report = parse_question(text, topic)
+    note_parse(report)
+    return q
+
+
+class StreamedQuestion:
+    """A question streaming in from Gemini.
+
+    ``head`` is set as soon as the question, options and answer have arrived;
+    a daemon thread keeps reading the stream and sets ``done`` once the
+    explanation is complete (``result`` then holds the fully parsed question).
+    """
+
+    def __init__(self, resp, topic, on_complete=None):
+        self.topic = topic
+        self.on_complete = on_complete
+        self.question = None
+        self.result = None
+        self.head = threading.Event()
+        self.done = threading.Event()
+        self._start = time.perf_counter()
+        threading.Thread(target=self._consume, args=(resp,), name="question-stream", daemon=True).start()
+
+    def _consume(self, resp):
+        parser = LineParser(self.topic)
+        try:
+            for chunk in resp:
+                parser.feed(chunk.text)
+                if not self.head.is_set():
+                    self.question = parser.head()
+                    if self.question:
+                        FIRST_QUESTION_SECONDS.observe(time.perf_counter() - self._start)
+                        self.head.set()
+            self.result = parser.close()
+            note_parse(parser.report)
+            if self.question is None and self.result:
+                self.question = dict(self.result, explanation="")
+        except Exception:
+            pass
+        finally:
+            # Hands a routed stream's scheduler slot back even if reading stopped early
+            close = getattr(resp, "close", None)
+            if close is not None:
+                close()
+            GENERATION_SECONDS.observe(time.perf_counter() - self._start, kind="stream",
+                                       outcome="ok" if self.result else "error")
+            self.done.set()
+            self.head.set()
+        if self.result and self.on_complete:
+            self.on_complete(self.result)
+
+
+def generate_ai_question_stream(model, subject, topic, difficulty, on_complete=None, timeout=60):
+    """Stream a single MCQ; returns as soon as the question itself can be shown.
+
+    The returned dict has an empty explanation and a ``_stream`` handle; its
+    session record resolves it in ``explanation_for`` once the rest of the
+    response has arrived.
+    """
+    try:
+        resp = model.generate_content(question_prompt(subject, topic, difficulty), stream=True, priority=INTERACTIVE)
+    except Exception:
+        return None
+    gen = StreamedQuestion(resp, topic, on_complete)
+    gen.head.wait(timeout)
+    if gen.done.is_set():
+        return gen.result
+    if gen.question is None:
+        return None
+    q = dict(gen.question)
+    q["_stream"] = gen
+    return q
+
+
+def explanation_for(q, timeout=30):
+    """The explanation of session question ``q``, waiting for a streamed one to finish arriving."""
+    gen = q.stream
+    if gen is not None:
+        if not gen.done.is_set():
+            with st.spinner("💡 Finishing the explanation..."):
+                gen.done.wait(timeout)
+        if not gen.done.is_set():
+            return "The explanation is still being written. Check the results review for it."
+        q.stream = None
+        q.explanation = gen.result["explanation"] if gen.result else "No explanation is available for this question."
+    return q.explanation
+
+
+GEN_BATCH_SIZE = 10   # questions requested per batched Gemini call
+BATCH_CONFIG = {"response_mime_type": "application/json", "response_schema": BATCH_SCHEMA}
+
+
+def batch_prompt(subject, topics, difficulty):
+    """Prompt for ``len(topics)`` JAMB-style MCQs as the JSON array ``parse_batch`` reads."""
+    topic_lines = "\n".join(f"{i}. {t}" for i, t in enumerate(topics, 1))
+    return f"""You are a JAMB exam question setter for Nigeria's Unified Tertiary Matriculation Examination.
+
+Create {len(topics)} {difficulty.lower()}-level multiple-choice questions for **{subject}**, one for each topic below, in this order:
+{topic_lines}
+
+Rules:
+- Follow the official JAMB/WAEC curriculum for Senior Secondary School.
+- Use Nigerian context where appropriate (examples, names, geography).
+- Test understanding, not rote memorisation.
+- Distractors should reflect common student misconceptions.
+- Provide a thorough explanation referencing the underlying principle.
+- Every question must be different from the others.
+
+Respond with a JSON array only (no extra text). Each element must be an object with:
+"question": the question text,
+"options": an array of exactly 4 option texts without letter prefixes,
+"answer": the letter of the correct option (A, B, C or D),
+"explanation": a detailed explanation,
+"topic": the topic from the list above."""
+
+
+def generate_ai_batch(model, subject, topics, difficulty, priority=PREFETCH):
+    """Call Gemini once for ``len(topics)`` JAMB-style MCQs, one per topic."""
+    start = time.perf_counter()
+    try:
+        resp = model.generate_content(batch_prompt(subject, topics, difficulty),
+                                      generation_config=BATCH_CONFIG,
+                                      priority=priority)
+        text = resp.text
+    except Exception:
+        GENERATION_SECONDS.observe(time.perf_counter() - start, kind="batch", outcome="error")
+        return []
+    GENERATION_SECONDS.observe(time.perf_counter() - start, kind="batch", outcome="ok")
+    qs, report = parse_batch(text, topics)
+    note_parse(report, len(topics))
+    return qs
+
+
+BANK_PATH = os.path.join(".smartprep", "jamb_bank.spqb")
+BANK_CHECK_SECONDS = 30   # how often the bank's sources are checked for changes
+
+
+class BankCursors:
+    """Per-session pseudo-random walk over each bank key.
+
+    Each key's record range is visited in an affine permutation order
+    (``first + (a * i + b) % n``), so a cursor costs O(1) memory however large
+    the bank is, and a draw costs O(1) amortised: an entry is skipped at most
+    once per pass. Seen entries are skipped by record id, so only the body of
+    the entry actually drawn is decoded. ``version`` is the bank version the
+    cursors walk; a reopened bank needs new cursors.
+    """
+
+    def __init__(self, version=0):
+        self.version = version
+        self._cursors = {}   # key -> [a, b, steps taken]
+
+    @staticmethod
+    def _permutation(n):
+        a = random.randrange(1, n) if n > 1 else 1
+        while math.gcd(a, n) != 1:
+            a = random.randrange(1, n)
+        return [a, random.randrange(n), 0]
+
+    def draw(self, bank, key, used_ids):
+        positions = bank.positions(key)
+        n = len(positions)
+        if not n:
+            return None
+        cur = self._cursors.get(key)
+        if cur is None:
+            cur = self._cursors[key] = self._permutation(n)
+        for _ in range(2):  # finish this pass, then reshuffle once
+            while cur[2] < n:
+                pos = positions[(cur[0] * cur[2] + cur[1]) % n]
+                cur[2] += 1
+                if bank.meta(pos)[3] not in used_ids:
+                    q = bank.load(pos)
+                    q["source"] = "bank"
+                    return q
+            cur[:] = self._permutation(n)
+        return None
+
 
+def build_bank_index():
+    """Open the served bank file, rebuilding it first when one of its sources is newer.
+
+    The default file holds the ``bank_seed`` questions (or those of a custom
+    ``BANK_PATH`` file) plus what ``pregen.py`` wrote to ``PREGEN_BANK_PATH``,
+    so neither a seed change nor a pre-generation run loses the other. A
+    custom bank without pre-generated questions is opened as is.
+    """
+    source = get_setting("BANK_PATH", BANK_PATH)
+    overlay = get_setting("PREGEN_BANK_PATH", PREGEN_BANK_PATH)
+    has_overlay = os.path.exists(overlay)
+    if source != BANK_PATH and not has_overlay:
+        return BankFile(source)
+    seed = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_seed.py")
+    inputs = [seed if source == BANK_PATH else source] + ([overlay] if has_overlay else [])
+    if os.path.exists(BANK_PATH) and os.path.getmtime(BANK_PATH) >= max(map(os.path.getmtime, inputs)):
+        try:
+            return BankFile(BANK_PATH)
+        except ValueError:
+            pass
+    if source == BANK_PATH:
+        from bank_seed import JAMB_QUESTION_BANK
+        bank = {subject: list(qs) for subject, qs in JAMB_QUESTION_BANK.items()}
+    else:
+        bf = BankFile(source)
+        bank = bf.to_dict()
+        bf.close()
+    if has_overlay:
+        bf = BankFile(overlay)
+        for subject, qs in bf.to_dict().items():
+            bank.setdefault(subject, []).extend(qs)
+        bf.close()
+    # Written aside and swapped in: sessions still drawing from the previous file keep their mapping
+    tmp = f"{BANK_PATH}.{os.getpid()}.tmp"
+    write_bank(tmp, bank)
+    os.replace(tmp, BANK_PATH)
+    return BankFile(BANK_PATH)
+
+
+class ServedBank:
+    """The open bank file, reopened when its sources change, e.g. after a ``pregen.py`` run.
+
+    A replaced file stays open until the next reopen, so a reader that
+    fetched it just before the swap can finish with it; it is closed then.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bank = None
+        self._retired = None
+        self.version = 0
+        self.indexed = None   # the bank the item index was last built from
+        self._stamp = None
+        self._checked = 0.0
+
+    @staticmethod
+    def stamp():
+        paths = (os.path.join(os.path.dirname(os.path.abspath(__file__)), "bank_seed.py"),
+                 get_setting("BANK_PATH", BANK_PATH), get_setting("PREGEN_BANK_PATH", PREGEN_BANK_PATH))
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+    def current(self):
+        now = time.time()
+        if now - self._checked >= BANK_CHECK_SECONDS:
+            with self.lock:
+                if now - self._checked >= BANK_CHECK_SECONDS:
+                    stamp = self.stamp()
+                    if stamp != self._stamp or self.bank is None:
+                        bank = build_bank_index()
+                        if self._retired is not None:
+                            self._retired.close()
+                        self._retired, self.bank = self.bank, bank
+                        self.version += 1
+                        self._stamp = stamp
+                    self._checked = now
+        return self.bank
 
-def get_bank_question(subject, difficulty, used_hashes):
-    """Pull a question from the built-in bank that hasn't been shown yet."""
-    bank = JAMB_QUESTION_BANK.get(subject, [])
-    candidates = [q for q in bank
-                  if q.get("difficulty", "Medium") == difficulty
-                  and hash(q["question"]) not in used_hashes]
-    if not candidates:
-        candidates = [q for q in bank if hash(q["question"]) not in used_hashes]
-    if not candidates:
-        candidates = bank
-    if candidates:
-        chosen = random.choice(candidates)
-        chosen["source"] = "bank"
-        return chosen
+
+@st.cache_resource
+def get_served_bank():
+    return ServedBank()
+
+
+def get_bank_index():
+    """The question bank file, picking up a rebuilt one within ``BANK_CHECK_SECONDS``."""
+    return get_served_bank().current()
+
+
+def get_bank_cursors():
+    """This session's bank cursors, created on first use and renewed when the bank is reopened."""
+    served = get_served_bank()
+    served.current()
+    cursors = st.session_state.get("bank_cursors")
+    if cursors is None or cursors.version != served.version:
+        cursors = st.session_state.bank_cursors = BankCursors(served.version)
+    return cursors
+
+
+def get_bank_question(subject, difficulty, used_ids, cursors=None, topic=None, bank=None):
+    """Pull a question from the bank file that hasn't been shown yet."""
+    bank = bank or get_bank_index()
+    cursors = cursors or BankCursors()
+    keys = [(subject, difficulty, None), (subject, None, None)]
+    if topic:
+        keys.insert(0, (subject, difficulty, topic))
+    for key in keys:
+        q = cursors.draw(bank, key, used_ids)
+        if q:
+            return q
+    # Everything has been shown this quiz: repeat rather than stall
+    positions = bank.positions((subject, None, None))
+    if positions:
+        q = bank.load(random.choice(positions))
+        q["source"] = "bank"
+        return q
     return None
 
 
-def get_question(model, subject, difficulty, used_topics, used_hashes):
-    """Get a question: try AI first, fall back to bank."""
+@st.cache_resource
+def open_item_index():
+    try:
+        return ItemIndex(get_setting("ITEMS_PATH", ITEMS_PATH))
+    except Exception:
+        return None
+
+
+def get_item_index():
+    """Difficulty estimates shared by all students, with every bank question filed by band."""
+    items = open_item_index()
+    served = get_served_bank()
+    bank = served.current()
+    if items is not None and served.indexed is not bank:
+        with served.lock:
+            if served.indexed is not bank:
+                entries = []
+                for pos in range(bank.count):
+                    subject, difficulty, topic, qid = bank.meta(pos)
+                    entries.append((qid, subject, topic, difficulty, pos))
+                items.reindex(entries)
+                items.prune()
+                served.indexed = bank
+    return items
+
+
+def get_adaptive_question(subject, theta, used_ids, topic=None):
+    """The unseen bank question most informative about a student of ability ``theta``."""
+    items = get_item_index()
+    if items is None:
+        return None
+    pos = items.pick(subject, theta, used_ids, topic) if topic else None
+    if pos is None:
+        pos = items.pick(subject, theta, used_ids)
+    if pos is None:
+        return None
+    q = get_bank_index().load(pos)
+    q["source"] = "bank"
+    return q
+
+
+def review_question(ref):
+    """The full question for a review card's ``ref``: from the bank, else the question store."""
+    items = get_item_index()
+    pos = items.ref(ref["id"]) if items is not None else None
+    if pos is not None:
+        q = get_bank_index().load(pos)
+        q["source"] = "bank"
+        return q
+    store = get_question_store()
+    return store.get(ref["id"]) if store is not None else None
+
+
+def draw_stored(store, subject, difficulty, topic, used_ids):
+    """Serve an unseen stored question for the key, or None while its pool is thin."""
+    if store is None or store.count(subject, difficulty, topic) < store.min_pool:
+        return None
+    qs = store.candidates(subject, difficulty, topic, exclude=used_ids)
+    if not qs:
+        return None
+    store.mark_served(qs[0]["id"])
+    return qs[0]
+
+
+def get_question(model, subject, difficulty, used_topics, used_ids, store=None, cursors=None, stream=False,
+                 broker=None, cache=None):
+    """Get a question: try the question store, then AI, then fall back to bank.
+
+    With ``stream`` the AI question is returned as soon as it can be shown and
+    its explanation keeps arriving in the background. A ``broker`` serves a
+    spare from its hot pool first; otherwise non-streamed requests wait on its
+    shared batches instead of making their own call. A ``cache`` answers the
+    single-question prompt from earlier responses before the model is asked.
+    """
     topic = pick_topic(subject, used_topics)
 
-    if model:
-        q = generate_ai_question(model, subject, topic, difficulty)
-        if q and hash(q["question"]) not in used_hashes:
+    q = draw_stored(store, subject, difficulty, topic, used_ids)
+    if q:
+        return q
+
+    if broker is not None:
+        q = broker.take(subject, difficulty, topic, used_ids)
+        if q:
+            return q
+
+    q = cached_question(cache, subject, topic, difficulty, used_ids)
+    if q:
+        return q
+
+    if model and stream:
+        def save(full):
+            if store is not None:
+                store.add(subject, difficulty, full)
+            cache_question(cache, subject, topic, difficulty, full)
+        q = generate_ai_question_stream(model, subject, topic, difficulty, on_complete=save)
+        if q and q["id"] not in used_ids:
+            return q
+    elif broker is not None:
+        try:
+            q = broker.request(subject, difficulty, topic, used_ids).result(timeout=BROKER_TIMEOUT)
+        except Exception:
+            q = None
+        if q:
+            return q
+    elif model:
+        q = generate_ai_question(model, subject, topic, difficulty, priority=INTERACTIVE)
+        if q and store is not None:
+            store.add(subject, difficulty, q)
+        cache_question(cache, subject, topic, difficulty, q)
+        if q and q["id"] not in used_ids:
             return q
 
-    return get_bank_question(subject, difficulty, used_hashes)
+    q = get_bank_question(subject, difficulty, used_ids, cursors, topic)
+    if q and model:
+        # Say why a past question was served instead of a fresh one
+        model.scheduler.record_fallback(INTERACTIVE)
+        reason = "quota" if model.quota_limited() else "generation_failed"
+        FALLBACK_TOTAL.inc(reason=reason)
+        if reason == "quota":
+            q["_fallback"] = reason
+    return q
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# GAMIFICATION HELPERS
+# BACKGROUND PREFETCH
 # ──────────────────────────────────────────────────────────────────────────────
-def calc_xp(score, total, difficulty, time_efficiency=1.0):
-    base = 50
-    score_xp = int((score / max(total, 1)) * 200)
-    time_bonus = int(time_efficiency * 50)
-    mult = {"Easy": 1.0, "Medium": 1.25, "Hard": 1.5}.get(difficulty, 1.0)
-    return int((base + score_xp + time_bonus) * mult)
+PREFETCH_DEPTH = 3      # questions kept generating ahead of the student
+PREFETCH_WORKERS = 8    # shared by every session in this process
+NEAR_DUP_THRESHOLD = 0.8  # MinHash similarity above which a question counts as a repeat; 0 disables
 
 
-def level_from_xp(xp):
-    return 1 + xp // 500
+BROKER_TIMEOUT = 90     # seconds a session waits on a shared batch
 
 
-def xp_progress_pct(xp):
-    lvl = level_from_xp(xp)
-    lo = (lvl - 1) * 500
-    hi = lvl * 500
-    return int(((xp - lo) / (hi - lo)) * 100)
+@st.cache_resource
+def get_prefetch_pool():
+    """Process-wide worker pool for background question generation."""
+    return ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
 
 
-def update_streak(last_date_str, current_streak):
-    today = datetime.now().date()
-    if not last_date_str:
-        return 1, today.isoformat()
-    if isinstance(last_date_str, str):
-        last = datetime.strptime(last_date_str, "%Y-%m-%d").date()
-    else:
-        last = last_date_str
-    diff = (today - last).days
-    if diff == 0:
-        return current_streak, last_date_str
-    elif diff == 1:
-        return current_streak + 1, today.isoformat()
-    else:
-        return 1, today.isoformat()
-
-
-ACHIEVEMENTS_DEF = [
-    ("first_quiz", "🎯", "First Steps", "Complete your first quiz", lambda d: d["quizzes"] >= 1),
-    ("five_quizzes", "🏅", "Quiz Enthusiast", "Complete 5 quizzes", lambda d: d["quizzes"] >= 5),
-    ("twenty_quizzes", "🏆", "Quiz Master", "Complete 20 quizzes", lambda d: d["quizzes"] >= 20),
-    ("first_perfect", "💯", "Perfect Start", "Score 100% on a quiz", lambda d: d["perfects"] >= 1),
-    ("five_perfect", "🌟", "Excellence", "Score 100% on 5 quizzes", lambda d: d["perfects"] >= 5),
-    ("streak_3", "🔥", "On Fire", "3-day study streak", lambda d: d["streak"] >= 3),
-    ("streak_7", "🔥🔥", "Weekly Warrior", "7-day study streak", lambda d: d["streak"] >= 7),
-    ("streak_30", "🔥🔥🔥", "Dedication", "30-day study streak", lambda d: d["streak"] >= 30),
-    ("multi_subj", "📚", "Renaissance Learner", "Practice 3+ subjects", lambda d: d["subjects_tried"] >= 3),
-    ("speed_demon", "⚡", "Speed Demon", "Finish a quiz with >80% time left", lambda d: d.get("fast_finish", False)),
-]
+@st.cache_resource
+def get_broker():
+    """Process-wide broker that batches generation for every session; None without a model."""
+    model = get_model()
+    if model is None:
+        return None
+    store = get_question_store()
+
+    def generate(subject, topics, difficulty):
+        qs = generate_ai_batch(model, subject, topics, difficulty)
+        if qs and store is not None:
+            store.add_many(subject, difficulty, qs)
+        return qs
+
+    return GenerationBroker(generate, max_batch=GEN_BATCH_SIZE,
+                            hot_size=int(get_setting("HOT_POOL_SIZE", HOT_POOL_SIZE)))
+
+
+class QuestionPrefetcher:
+    """Per-session buffer of questions generated while the student answers.
+
+    Worker threads never touch ``st.session_state``: the quiz plan is captured
+    here and finished questions land in a per-subject buffer that the script
+    thread drains with ``take``.
+    """
+
+    def __init__(self, model, difficulty, total, subjects, per_subject, default_subject,
+                 depth=PREFETCH_DEPTH, store=None, near_dup_threshold=None, broker=None, cache=None):
+        self.model = model
+        self.store = store
+        self.broker = broker
+        self.cache = cache
+        self.difficulty = difficulty
+        self.total = total
+        self.subjects = list(subjects)
+        self.per_subject = per_subject
+        self.default_subject = default_subject
+        self.depth = max(0, int(depth))
+        self._lock = threading.Lock()
+        self._ready = {}        # subject -> deque of generated questions
+        self._inflight = {}     # subject -> number of running jobs
+        self._futures = set()
+        self._used_topics = []
+        self._seen = set()      # ids shown or already buffered this quiz
+        self._similar = NearDuplicateFilter(near_dup_threshold) if near_dup_threshold else None
+        self._cancelled = False
+
+    def schedule(self, next_idx, shown):
+        """Keep questions ``next_idx .. next_idx + depth - 1`` generated or generating.
+
+        A subject that runs short is topped up with one batched call covering up
+        to ``GEN_BATCH_SIZE`` of its remaining questions, not one call per question.
+        """
+        if (self.model is None and self.store is None) or self.depth == 0:
+            return
+        needed, remaining = {}, {}
+        for i in range(next_idx, self.total):
+            subj = subject_for_index(i, self.subjects, self.per_subject, self.default_subject)
+            remaining[subj] = remaining.get(subj, 0) + 1
+            if i < next_idx + self.depth:
+                needed[subj] = needed.get(subj, 0) + 1
+
+        pool = get_prefetch_pool()
+        with self._lock:
+            if self._cancelled:
+                return
+            self._note_shown(shown)
+            for subj, count in needed.items():
+                have = len(self._ready.get(subj, ())) + self._inflight.get(subj, 0)
+                if have >= count:
+                    continue
+                n = min(max(count - have, GEN_BATCH_SIZE), remaining[subj] - have)
+                fut = pool.submit(self._generate, subj, self._claim(subj, n))
+                self._futures.add(fut)
+                fut.add_done_callback(self._futures.discard)
+
+    def reserve(self, next_idx, shown):
+        """Claim topics for every question from ``next_idx`` on, as ``{subject: [topic, ...]}``.
+
+        The caller generates them itself and hands each batch back with ``deliver``;
+        until then ``schedule`` counts them as in flight.
+        """
+        remaining = {}
+        for i in range(next_idx, self.total):
+            subj = subject_for_index(i, self.subjects, self.per_subject, self.default_subject)
+            remaining[subj] = remaining.get(subj, 0) + 1
+        with self._lock:
+            if self._cancelled:
+                return {}
+            self._note_shown(shown)
+            plan = {}
+            for subj, n in remaining.items():
+                n -= len(self._ready.get(subj, ())) + self._inflight.get(subj, 0)
+                if n > 0:
+                    plan[subj] = self._claim(subj, n)
+            return plan
+
+    def _note_shown(self, shown):
+        for q in shown:
+            t = q.get("topic", "")
+            if t not in self._used_topics:
+                self._used_topics.append(t)
+            self._seen.add(q["id"])
+            if self._similar is not None:
+                self._similar.add(q)
+
+    def _claim(self, subj, n):
+        topics = []
+        for _ in range(n):
+            topic = pick_topic(subj, self._used_topics)
+            self._used_topics.append(topic)
+            topics.append(topic)
+        self._inflight[subj] = self._inflight.get(subj, 0) + n
+        return topics
+
+    def from_store(self, subj, topics):
+        """Split ``topics`` into unseen stored questions and the topics still to generate."""
+        qs, missing = [], []
+        for topic in topics:
+            if self._cancelled:
+                break
+            with self._lock:
+                seen = list(self._seen)
+            q = draw_stored(self.store, subj, self.difficulty, topic, seen)
+            if q:
+                with self._lock:
+                    self._seen.add(q["id"])
+                qs.append(q)
+            else:
+                missing.append(topic)
+        return qs, missing
+
+    def deliver(self, subj, n_claimed, qs):
+        """Hand back the questions for ``n_claimed`` claimed topics; some may have failed."""
+        with self._lock:
+            self._inflight[subj] = self._inflight.get(subj, n_claimed) - n_claimed
+            if not self._cancelled:
+                self._ready.setdefault(subj, deque()).extend(qs)
+
+    def _generate(self, subj, topics):
+        qs = []
+        try:
+            qs, missing = self.from_store(subj, topics)
+            generated = []
+            if self._cancelled or self.model is None or not missing:
+                pass
+            elif self.broker is not None:
+                # Shared batches are already written to the store by the broker
+                with self._lock:
+                    seen = set(self._seen)
+                for fut in self.broker.request_many(subj, self.difficulty, missing, seen):
+                    try:
+                        q = fut.result(timeout=BROKER_TIMEOUT)
+                    except Exception:
+                        q = None
+                    if q:
+                        qs.append(q)
+            elif len(missing) == 1:
+                with self._lock:
+                    seen = set(self._seen)
+                q = cached_question(self.cache, subj, missing[0], self.difficulty, seen)
+                if q is None:
+                    q = generate_ai_question(self.model, subj, missing[0], self.difficulty)
+                    cache_question(self.cache, subj, missing[0], self.difficulty, q)
+                generated = [q] if q else []
+            else:
+                generated = generate_ai_batch(self.model, subj, missing, self.difficulty)
+            if generated and self.store is not None:
+                self.store.add_many(subj, self.difficulty, generated)
+            qs += generated
+        finally:
+            self.deliver(subj, len(topics), qs)
+
+    def take(self, subject, used_ids):
+        """Pop a ready, unseen question for ``subject``; None if the buffer is empty.
+
+        Questions that merely reword one already shown this quiz are dropped too.
+        """
+        with self._lock:
+            buf = self._ready.get(subject)
+            while buf:
+                q = buf.popleft()
+                if q["id"] in used_ids:
+                    continue
+                if self._similar is not None and not self._similar.check_and_add(q):
+                    continue
+                return q
+        return None
+
+    @property
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """Stop scheduling, drop queued jobs and discard anything already buffered."""
+        with self._lock:
+            self._cancelled = True
+            for fut in list(self._futures):
+                fut.cancel()
+            self._ready.clear()
+
+
+def start_prefetch(model, quiz):
+    """Attach a prefetcher for the quiz that was just launched."""
+    pf = QuestionPrefetcher(
+        model,
+        quiz.level_for(quiz.subject, st.session_state.profile),
+        quiz.total_qs,
+        quiz.cbt_subjects,
+        quiz.per_subject,
+        quiz.subject,
+        depth=get_setting("PREFETCH_DEPTH", PREFETCH_DEPTH),
+        store=get_question_store(),
+        near_dup_threshold=float(get_setting("NEAR_DUP_THRESHOLD", NEAR_DUP_THRESHOLD)),
+        broker=get_broker(),
+        cache=get_response_cache(),
+    )
+    st.session_state.prefetcher = pf
+    if model is not None and quiz.cbt_subjects:
+        warm_up_cbt(pf, quiz)
+    pf.schedule(1, quiz.questions)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# CBT WARM-UP
+# ──────────────────────────────────────────────────────────────────────────────
+WARMUP_CONCURRENCY = 6   # batched calls in flight at once
+WARMUP_TIMEOUT = 30      # seconds allowed per call
+WARMUP_RETRIES = 3       # extra attempts after a rate limit or timeout
+WARMUP_BACKOFF = 1.0     # first wait after a rate limit, doubled on each retry
+WARMUP_DEADLINE = 20     # seconds before the exam starts anyway; unfinished batches keep filling the buffer
 
 
-def get_unlocked(data):
-    return [a for a in ACHIEVEMENTS_DEF if a[4](data)]
+@st.cache_resource
+def get_event_loop():
+    """Process-wide asyncio loop on a daemon thread.
+
+    Async Gemini clients are bound to the loop that created them, so every
+    warm-up shares this one instead of calling ``asyncio.run`` per session.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="warmup-loop", daemon=True).start()
+    return loop
+
+
+async def generate_ai_batch_async(model, sem, subject, topics, difficulty):
+    """``generate_ai_batch`` with a concurrency slot, a timeout and rate-limit backoff."""
+    for attempt in range(WARMUP_RETRIES + 1):
+        async with sem:
+            start = time.perf_counter()
+            try:
+                resp = await asyncio.wait_for(
+                    model.generate_content_async(batch_prompt(subject, topics, difficulty),
+                                                 generation_config=BATCH_CONFIG,
+                                                 priority=WARMUP),
+                    WARMUP_TIMEOUT)
+                text = resp.text
+            except asyncio.TimeoutError:
+                GENERATION_SECONDS.observe(time.perf_counter() - start, kind="warmup", outcome="timeout")
+                delay = 0.0
+            except Exception as e:
+                GENERATION_SECONDS.observe(time.perf_counter() - start, kind="warmup", outcome="error")
+                if not is_rate_limited(e):
+                    return []
+                delay = WARMUP_BACKOFF * 2 ** attempt * (1 + random.random())
+            else:
+                GENERATION_SECONDS.observe(time.perf_counter() - start, kind="warmup", outcome="ok")
+                qs, report = parse_batch(text, topics)
+                note_parse(report, len(topics))
+                return qs
+        # Wait outside the semaphore so other subjects keep their slots
+        await asyncio.sleep(delay)
+    return []
+
+
+async def warm_up(pf, plan, progress):
+    """Generate every claimed topic in ``plan``, all subjects concurrently.
+
+    Each batch is delivered to the prefetcher as soon as it is ready, and
+    ``progress[subject][0]`` counts the topics handled so far.
+    """
+    sem = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+    async def run(subj, topics):
+        qs = []
+        try:
+            qs, missing = pf.from_store(subj, topics)
+            if missing and not pf.cancelled:
+                generated = await generate_ai_batch_async(pf.model, sem, subj, missing, pf.difficulty)
+                if generated and pf.store is not None:
+                    pf.store.add_many(subj, pf.difficulty, generated)
+                qs += generated
+        finally:
+            pf.deliver(subj, len(topics), qs)
+            progress[subj][0] += len(topics)
+
+    jobs = [run(subj, topics[i:i + GEN_BATCH_SIZE])
+            for subj, topics in plan.items()
+            for i in range(0, len(topics), GEN_BATCH_SIZE)]
+    await asyncio.gather(*jobs)
+
+
+def warm_up_cbt(pf, quiz):
+    """Fill the prefetch buffers for a whole CBT exam before it starts, with a bar per subject."""
+    plan = pf.reserve(1, quiz.questions)
+    if not plan:
+        return
+    progress = {subj: [0, len(topics)] for subj, topics in plan.items()}
+    st.markdown("**Preparing your exam papers...**")
+    bars = {subj: st.progress(0.0, text=f"{JAMB_SUBJECTS[subj]['icon']} {subj}") for subj in plan}
+    fut = asyncio.run_coroutine_threadsafe(warm_up(pf, plan, progress), get_event_loop())
+    deadline = time.time() + float(get_setting("WARMUP_DEADLINE", WARMUP_DEADLINE))
+    while True:
+        for subj, (done, wanted) in progress.items():
+            bars[subj].progress(done / wanted, text=f"{JAMB_SUBJECTS[subj]['icon']} {subj} · {done}/{wanted}")
+        if fut.done() or time.time() >= deadline:
+            break
+        time.sleep(0.1)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # SESSION STATE INIT
 # ──────────────────────────────────────────────────────────────────────────────
+# Quiz and student state live in ``quiz_engine`` objects; the rest is page state
 DEFAULTS = {
     "stage": "home",
     "mode": "quick",
-    "subject": "Mathematics",
-    "difficulty": "Medium",
-    "time_per_q": 120,
-    "total_qs": 10,
-    "questions": [],
-    "answers": [],
-    "current_idx": 0,
-    "show_feedback": False,
-    "timer_start": None,
-    "total_time": 0.0,
-    "timer_expired": False,
+    "quiz": None,
+    "profile": None,
     "confirm_home": False,
-    "xp": 0,
-    "quizzes_done": 0,
-    "perfects": 0,
-    "streak": 1,
-    "last_date": datetime.now().date().isoformat(),
-    "history": {},
-    "unlocked_ids": [],
-    "cbt_subjects": [],
-    "cbt_per_subject": 10,
+    "student_id": "",
+    "prefetcher": None,
+    "bank_cursors": None,
 }
 
 
 def init_state():
     for k, v in DEFAULTS.items():
         if k not in st.session_state:
-            st.session_state[k] = v
+            # Copy so sessions never share the mutable defaults
+            st.session_state[k] = copy.deepcopy(v)
+    if st.session_state.profile is None:
+        st.session_state.profile = Profile()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# PERSISTENT PROGRESS
+# ──────────────────────────────────────────────────────────────────────────────
+@st.cache_resource
+def get_progress_store():
+    """Shared write-behind progress store, or None if it can't be opened here."""
+    try:
+        return open_store("sqlite", path=get_setting("PROGRESS_STORE_PATH", PROGRESS_STORE_PATH))
+    except Exception:
+        return None
+
+
+def load_progress(student_id):
+    """Attach this session to ``student_id`` and restore their saved state."""
+    st.session_state.student_id = student_id
+    store = get_progress_store()
+    data = store.load(student_id) if store is not None else None
+    if data:
+        st.session_state.profile.load(data)
+
+
+def save_progress():
+    """Queue the student's current state; the store writes it in the background."""
+    store = get_progress_store()
+    if store is None or not st.session_state.student_id:
+        return
+    store.save(st.session_state.student_id, st.session_state.profile.to_dict())
+
+
+def student_panel():
+    if st.session_state.student_id:
+        st.caption(f"👤 Signed in as **{st.session_state.student_id}** · progress is saved automatically")
+        return
+    c1, c2 = st.columns([3, 1])
+    with c1:
+        sid = st.text_input("👤 Your name or student ID", key="student_input",
+                            placeholder="Enter it to keep your progress between visits")
+    with c2:
+        st.markdown("<div style='height:1.8rem'></div>", unsafe_allow_html=True)
+        if st.button("Continue", key="student_go", use_container_width=True) and sid.strip():
+            sid = sid.strip().lower()
+            load_progress(sid)
+            st.query_params["student"] = sid
+            st.rerun()
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # UI HELPERS
 # ──────────────────────────────────────────────────────────────────────────────
 def nav_bar():
-    lvl = level_from_xp(st.session_state.xp)
+    p = st.session_state.profile
     st.markdown(f"""<div class="nav-bar">
         <div class="nav-title">📘 SmartPrep AI</div>
         <div class="nav-stats">
-            <span>Lvl {lvl}</span>
-            <span>{st.session_state.xp} XP</span>
-            <span>🔥 {st.session_state.streak}</span>
-            <span>📊 {st.session_state.quizzes_done}</span>
+            <span>Lvl {p.level}</span>
+            <span>{p.xp} XP</span>
+            <span>🔥 {p.streak}</span>
+            <span>📊 {p.quizzes_done}</span>
         </div>
     </div>""", unsafe_allow_html=True)
 
@@ -528,23 +1469,19 @@ def handle_home_confirm():
 
 
 def reset_quiz():
-    for k in ["questions", "answers", "current_idx", "show_feedback",
-              "timer_start", "total_time", "timer_expired", "confirm_home",
-              "cbt_subjects"]:
+    pf = st.session_state.get("prefetcher")
+    if pf is not None:
+        pf.cancel()
+    for k in ["quiz", "prefetcher", "confirm_home"]:
         st.session_state[k] = DEFAULTS[k]
 
 
-def fmt_time(s):
-    m, s = divmod(int(s), 60)
-    return f"{m:02d}:{s:02d}"
-
-
-def timer_cls(secs):
-    if secs < 30:
-        return "timer timer-danger"
-    if secs < 60:
-        return "timer timer-warn"
-    return "timer"
+def rerun_fragment():
+    """Rerun only the running fragment, or the whole page when it ran as part of one."""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -562,13 +1499,15 @@ def show_home():
                     'To enable AI questions, add <code>GEMINI_API_KEY</code> in Streamlit secrets.</div>',
                     unsafe_allow_html=True)
 
-    if st.session_state.quizzes_done > 0:
+    student_panel()
+
+    if st.session_state.profile.quizzes_done > 0:
         show_stats_summary()
 
     st.markdown("---")
     st.markdown("### 🎮 Choose Your Study Mode")
 
-    mode_cols = st.columns(3)
+    mode_cols = st.columns(4)
     with mode_cols[0]:
         st.markdown('<div class="quiz-box" style="text-align:center">', unsafe_allow_html=True)
         st.markdown("#### ⚡ Quick Quiz")
@@ -593,23 +1532,37 @@ def show_home():
             st.session_state.mode = "topic"
         st.markdown("</div>", unsafe_allow_html=True)
 
+    with mode_cols[3]:
+        st.markdown('<div class="quiz-box" style="text-align:center">', unsafe_allow_html=True)
+        st.markdown("#### 🔁 Review")
+        st.markdown("Missed questions · Spaced repetition")
+        if st.button("Start Review", key="mode_review", use_container_width=True):
+            st.session_state.mode = "review"
+        st.markdown("</div>", unsafe_allow_html=True)
+
     st.markdown("---")
 
     mode = st.session_state.mode
-    mode_labels = {"quick": "Quick Quiz", "cbt": "CBT Simulation", "topic": "Topic Focus"}
+    mode_labels = {"quick": "Quick Quiz", "cbt": "CBT Simulation", "topic": "Topic Focus", "review": "Review"}
     st.markdown(f"### ⚙️ Configure: **{mode_labels[mode]}**")
 
     if mode == "quick":
         configure_quick()
     elif mode == "cbt":
         configure_cbt()
+    elif mode == "review":
+        configure_review()
     else:
         configure_topic()
 
-    if st.session_state.history:
+    if st.session_state.profile.mastery:
         show_recommendations()
 
 
+DIFFICULTY_CHOICES = ["Easy", "Medium", "Hard", ADAPTIVE]
+ADAPTIVE_HELP = "Adaptive picks each question to match how you are doing in the subject."
+
+
 def configure_quick():
     c1, c2 = st.columns(2)
     with c1:
@@ -617,18 +1570,14 @@ def configure_quick():
                             format_func=lambda s: f"{JAMB_SUBJECTS[s]['icon']} {s}", key="sel_subj")
         st.markdown(f'<div class="msg-info">{JAMB_SUBJECTS[subj]["desc"]}</div>', unsafe_allow_html=True)
     with c2:
-        diff = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"], index=1, key="sel_diff")
+        diff = st.selectbox("Difficulty", DIFFICULTY_CHOICES, index=1, key="sel_diff", help=ADAPTIVE_HELP)
         time_opt = st.selectbox("Time per question",
                                 ["60s", "90s", "2 min (recommended)", "3 min", "No limit"],
                                 index=2, key="sel_time")
     time_map = {"60s": 60, "90s": 90, "2 min (recommended)": 120, "3 min": 180, "No limit": None}
 
     if st.button("🚀 Begin Quiz", type="primary", use_container_width=True, key="start_quick"):
-        st.session_state.subject = subj
-        st.session_state.difficulty = diff
-        st.session_state.time_per_q = time_map[time_opt]
-        st.session_state.total_qs = 10
-        launch_quiz([subj])
+        launch_quiz(QuizSession([subj], diff, total_qs=10, time_per_q=time_map[time_opt], mode="quick"))
 
 
 def configure_cbt():
@@ -637,7 +1586,7 @@ def configure_cbt():
     chosen = st.multiselect("Subjects", all_subjs,
                             default=["English Language", "Mathematics"],
                             max_selections=4, key="cbt_pick")
-    diff = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"], index=1, key="cbt_diff")
+    diff = st.selectbox("Difficulty", DIFFICULTY_CHOICES, index=1, key="cbt_diff", help=ADAPTIVE_HELP)
     qs_per = st.slider("Questions per subject", 5, 60, 15, 5, key="cbt_qs")
 
     if len(chosen) < 2:
@@ -647,12 +1596,7 @@ def configure_cbt():
         total_time = total * 1.5
         st.markdown(f"**Total: {total} questions · ~{int(total_time)} min**")
         if st.button("🚀 Begin CBT Simulation", type="primary", use_container_width=True, key="start_cbt"):
-            st.session_state.difficulty = diff
-            st.session_state.time_per_q = 90
-            st.session_state.total_qs = total
-            st.session_state.cbt_subjects = chosen
-            st.session_state.cbt_per_subject = qs_per
-            launch_quiz(chosen)
+            launch_quiz(QuizSession(chosen, diff, total_qs=total, time_per_q=90, per_subject=qs_per, mode="cbt"))
 
 
 def configure_topic():
@@ -660,42 +1604,66 @@ def configure_topic():
                         format_func=lambda s: f"{JAMB_SUBJECTS[s]['icon']} {s}", key="tp_subj")
     topics = JAMB_SUBJECTS[subj]["topics"]
     topic = st.selectbox("Topic", topics, key="tp_topic")
-    diff = st.selectbox("Difficulty", ["Easy", "Medium", "Hard"], index=1, key="tp_diff")
+    diff = st.selectbox("Difficulty", DIFFICULTY_CHOICES, index=1, key="tp_diff", help=ADAPTIVE_HELP)
     n_qs = st.slider("Number of questions", 5, 20, 10, key="tp_nqs")
 
     if st.button("🚀 Begin Topic Drill", type="primary", use_container_width=True, key="start_topic"):
-        st.session_state.subject = subj
-        st.session_state.difficulty = diff
-        st.session_state.time_per_q = None
-        st.session_state.total_qs = n_qs
-        st.session_state._forced_topic = topic
-        launch_quiz([subj])
+        launch_quiz(QuizSession([subj], diff, total_qs=n_qs, topic=topic, mode="topic"))
 
 
-def launch_quiz(subjects):
+REVIEW_LENGTH = 10   # questions per review session
+
+
+def configure_review():
+    reviews = st.session_state.profile.reviews
+    due = reviews.due_count()
+    if not due:
+        nxt = reviews.peek()
+        if nxt is None:
+            st.info("Questions you miss are scheduled here for review. Take a quiz to get started.")
+        else:
+            wait = max(1, int((nxt.due - time.time()) / 60))
+            when = f"in {wait} min" if wait < 120 else f"in {wait // 60} h" if wait < 2880 else f"in {wait // 1440} days"
+            st.info(f"Nothing is due yet. {len(reviews)} question(s) scheduled; the next one is due {when}.")
+        return
+    # Sized from the cards that can be served, not just the ones due
+    n = len(reviews.drawable(review_question, limit=REVIEW_LENGTH))
+    if not n:
+        st.info(f"{due} question(s) due, but none can be loaded right now. Try again shortly.")
+        return
+    st.markdown(f"**{due} question(s) due · reviewing {n} · No time limit**")
+    if st.button("🚀 Begin Review", type="primary", use_container_width=True, key="start_review"):
+        launch_quiz(QuizSession(reviews.due_subjects(), "Medium", total_qs=n, mode="review"))
+
+
+def launch_quiz(quiz):
     """Generate the first question and transition to quiz stage."""
     reset_quiz()
     model = get_model()
-    subj = subjects[0] if len(subjects) == 1 else random.choice(subjects)
-    forced_topic = st.session_state.get("_forced_topic", None)
-
-    if forced_topic:
-        topic = forced_topic
-    else:
-        topic = pick_topic(subj, [])
-
-    st.session_state.subject = subj
-
-    with st.spinner("🔄 Generating your first question..."):
-        q = get_question(model, subj, st.session_state.difficulty, [topic], set())
-
+    # CBT runs its subjects in order, so the first question comes from the first block
+    subj = quiz.subject
+    topic = quiz.topic or pick_topic(subj, [])
+    level = quiz.level_for(subj, st.session_state.profile)
+
+    q = None
+    if quiz.mode == "review":
+        q = st.session_state.profile.reviews.draw(review_question)
+    elif quiz.adaptive:
+        q = get_adaptive_question(subj, st.session_state.profile.ability.theta(subj), set(), quiz.topic)
+    if q is None and quiz.mode != "review":
+        with st.spinner("🔄 Generating your first question..."):
+            q = get_question(model, subj, level, [topic], set(),
+                             get_question_store(), get_bank_cursors(), stream=True, broker=get_broker(),
+                             cache=get_response_cache())
+
+    note_served("first", q)
     if q:
-        q["_subject"] = subj
-        st.session_state.questions = [q]
-        st.session_state.answers = [None]
-        st.session_state.current_idx = 0
-        st.session_state.timer_start = time.time() if st.session_state.time_per_q else None
+        q.setdefault("difficulty", level)
+        quiz.start(q)
+        st.session_state.quiz = quiz
         st.session_state.stage = "quiz"
+        if quiz.mode != "review":
+            start_prefetch(model, quiz)
         st.rerun()
     else:
         st.error("Could not generate a question. Please check your internet connection or try another subject.")
@@ -704,70 +1672,73 @@ def launch_quiz(subjects):
 # ──────────────────────────────────────────────────────────────────────────────
 # QUIZ SCREEN
 # ──────────────────────────────────────────────────────────────────────────────
+@st.fragment
 def show_quiz():
+    """The question screen, as a fragment: answering and moving on rerun only this part of the page."""
+    # A fragment rerun can still arrive (say, a late timer event) after the quiz has ended
+    if st.session_state.stage != "quiz" or st.session_state.quiz is None:
+        return
+    with RENDER_SECONDS.time(stage="quiz_fragment"):
+        quiz_panel()
+
+
+def quiz_panel():
     model = get_model()
-    idx = st.session_state.current_idx
-    total = st.session_state.total_qs
-    q = st.session_state.questions[idx]
-
-    # Timer
-    if st.session_state.time_per_q and st.session_state.timer_start and not st.session_state.show_feedback:
-        elapsed = time.time() - st.session_state.timer_start
-        left = max(0, st.session_state.time_per_q - elapsed)
-        cls = timer_cls(left)
-        st.markdown(f'<div class="{cls}">⏱️ {fmt_time(left)}</div>', unsafe_allow_html=True)
-        if left <= 0 and not st.session_state.timer_expired:
-            st.session_state.timer_expired = True
-            st.session_state.show_feedback = True
-            st.session_state.answers[idx] = "__EXPIRED__"
-            record_answer(q, False)
-            st.rerun()
+    quiz = st.session_state.quiz
+    idx = quiz.current_idx
+    total = quiz.total_qs
+    q = quiz.current
+
+    # Timer: counts down in the browser, which reports expiry once; the server check is a backstop
+    left = quiz.time_left()
+    if left is not None:
+        expired = countdown(left, token=repr(quiz.timer_start), key=f"timer_{idx}")
+        if (expired or left <= 0) and not quiz.timer_expired:
+            persist_answer(quiz.expire(st.session_state.profile, items=get_item_index()))
+            rerun_fragment()
 
     # Progress
-    answered_count = sum(1 for a in st.session_state.answers if a is not None)
-    score = sum(1 for i, a in enumerate(st.session_state.answers)
-                if a and a != "__EXPIRED__" and a.startswith(st.session_state.questions[i]["answer"]))
+    sb = quiz.scoreboard
     pct = (idx + 1) / total
     st.progress(pct)
-    subj_display = q.get("_subject", st.session_state.subject)
+    subj_display = quiz.subject_for(idx)
     st.markdown(f'<span class="badge">{subj_display}</span> '
                 f'<span class="question-num-indicator">Question {idx+1} of {total} · '
-                f'Score: {score}/{answered_count}</span>',
+                f'Score: {sb.correct}/{sb.answered}</span>',
                 unsafe_allow_html=True)
 
+    if quiz.fallbacks.get(idx) == "quota":
+        st.caption("⚠️ The AI is at its request limit right now, so this one is a past JAMB question.")
+
     # Question
     st.markdown('<div class="quiz-box">', unsafe_allow_html=True)
-    st.markdown(f"**Topic:** {q.get('topic', 'General')} · **Difficulty:** {st.session_state.difficulty}")
-    st.markdown(f"### {q['question']}")
+    level = f"{quiz.level_of(idx)} (adaptive)" if quiz.adaptive else quiz.level_of(idx)
+    st.markdown(f"**Topic:** {q.topic} · **Difficulty:** {level}")
+    st.markdown(f"### {q.question}")
 
-    if not st.session_state.show_feedback:
-        choice = st.radio("Select your answer:", q["options"], key=f"choice_{idx}")
+    if not quiz.show_feedback:
+        choice = st.radio("Select your answer:", q.options, key=f"choice_{idx}")
         if st.button("✅ Submit Answer", type="primary", use_container_width=True, key=f"submit_{idx}"):
-            st.session_state.answers[idx] = choice
-            if st.session_state.timer_start:
-                st.session_state.total_time += time.time() - st.session_state.timer_start
-            is_correct = choice.startswith(q["answer"])
-            record_answer(q, is_correct)
-            st.session_state.show_feedback = True
-            st.rerun()
+            persist_answer(quiz.submit(choice, st.session_state.profile, items=get_item_index()))
+            rerun_fragment()
     else:
-        user_ans = st.session_state.answers[idx]
-        correct_letter = q["answer"]
+        outcome = sb.outcomes.get(idx)
+        correct_letter = q.answer
 
-        if user_ans == "__EXPIRED__":
+        if outcome == "expired":
             st.markdown(f'<div class="msg-error">⏰ Time expired! Correct answer: <b>{correct_letter}</b></div>',
                         unsafe_allow_html=True)
-        elif user_ans and user_ans.startswith(correct_letter):
+        elif outcome is True:
             st.markdown('<div class="msg-success">✅ Correct! Well done! 🎉</div>', unsafe_allow_html=True)
         else:
             st.markdown(f'<div class="msg-error">❌ Incorrect. Correct answer: <b>{correct_letter}</b></div>',
                         unsafe_allow_html=True)
 
         st.markdown("#### 💡 Explanation")
-        st.markdown(f'<div class="msg-info">{q["explanation"]}</div>', unsafe_allow_html=True)
+        st.markdown(f'<div class="msg-info">{explanation_for(q)}</div>', unsafe_allow_html=True)
 
         # Navigation
-        if idx + 1 >= total:
+        if quiz.is_last:
             if st.button("🎯 View Results", type="primary", use_container_width=True, key="to_results"):
                 st.session_state.stage = "results"
                 st.rerun()
@@ -778,46 +1749,54 @@ def show_quiz():
     st.markdown("</div>", unsafe_allow_html=True)
 
 
-def record_answer(q, is_correct):
-    """Record to subject history."""
-    subj = q.get("_subject", st.session_state.subject)
-    if subj not in st.session_state.history:
-        st.session_state.history[subj] = []
-    st.session_state.history[subj].append({
-        "topic": q.get("topic", "General"),
-        "correct": is_correct,
-        "difficulty": st.session_state.difficulty,
-        "date": datetime.now().isoformat(),
-    })
+def persist_answer(event):
+    """Append an answer event from the engine to the student's saved history."""
+    store = get_progress_store()
+    if event is None or store is None or not st.session_state.student_id:
+        return
+    store.append_event(st.session_state.student_id, *event)
+    save_progress()
 
 
 def advance_question(model):
     """Generate and load the next question."""
-    idx = st.session_state.current_idx + 1
-    used_topics = [q.get("topic", "") for q in st.session_state.questions]
-    used_hashes = {hash(q["question"]) for q in st.session_state.questions}
-
-    # For CBT mode, cycle through subjects
-    if st.session_state.cbt_subjects:
-        subjs = st.session_state.cbt_subjects
-        per = st.session_state.cbt_per_subject
-        subj_idx = idx // per if per > 0 else 0
-        subj_idx = min(subj_idx, len(subjs) - 1)
-        subj = subjs[subj_idx]
-    else:
-        subj = st.session_state.subject
-
-    with st.spinner("🔄 Generating next question..."):
-        q = get_question(model, subj, st.session_state.difficulty, used_topics, used_hashes)
+    quiz = st.session_state.quiz
+    pf = st.session_state.get("prefetcher")
+
+    def synchronous(subj, difficulty, used_topics, used_ids):
+        # Subjects without past questions still need the model, synchronously
+        with st.spinner("🔄 Generating next question..."):
+            return get_question(model, subj, difficulty, used_topics, used_ids,
+                                get_question_store(), get_bank_cursors(), stream=True, broker=get_broker(),
+                                cache=get_response_cache())
+
+    # Prefer a question generated in the background over a blocking model call
+    sources = [("bank", lambda subj, difficulty, _, used_ids:
+                get_bank_question(subj, difficulty, used_ids, get_bank_cursors())),
+               ("sync", synchronous)]
+    if pf is not None:
+        sources.insert(0, ("prefetch", lambda subj, _, __, used_ids: pf.take(subj, used_ids)))
+    profile = st.session_state.profile
+    if quiz.mode == "review":
+        # Due cards only: the quiz's length was set from how many were due
+        sources = [("review", lambda _, __, ___, used_ids:
+                    profile.reviews.draw(review_question, exclude=used_ids))]
+    elif quiz.adaptive:
+        # Calibrated bank questions pinpoint ability best; generated ones stand in when the bank runs dry
+        sources.insert(0, ("adaptive", lambda subj, _, __, used_ids:
+                           get_adaptive_question(subj, profile.ability.theta(subj), used_ids, quiz.topic)))
+    q, path = next_question(quiz, sources, profile)
+    note_served(path or "sync", q)
 
     if q:
-        q["_subject"] = subj
-        st.session_state.questions.append(q)
-        st.session_state.answers.append(None)
-        st.session_state.current_idx = idx
-        st.session_state.show_feedback = False
-        st.session_state.timer_expired = False
-        st.session_state.timer_start = time.time() if st.session_state.time_per_q else None
+        quiz.add_question(q)
+        if pf is not None:
+            pf.schedule(quiz.current_idx + 1, quiz.questions)
+        rerun_fragment()
+    elif quiz.mode == "review":
+        # A card that could be served when the review started no longer can: end with what was asked
+        quiz.total_qs = len(quiz.questions)
+        st.session_state.stage = "results"
         st.rerun()
     else:
         st.error("Failed to generate next question. Please try again.")
@@ -827,29 +1806,22 @@ def advance_question(model):
 # RESULTS SCREEN
 # ──────────────────────────────────────────────────────────────────────────────
 def show_results():
-    st.balloons()
-    qs = st.session_state.questions
-    ans = st.session_state.answers
-    total = len(qs)
-    score = sum(1 for i in range(total)
-                if ans[i] and ans[i] != "__EXPIRED__" and ans[i].startswith(qs[i]["answer"]))
-    pct = (score / max(total, 1)) * 100
-
-    # XP
-    time_eff = max(0, 1 - (st.session_state.total_time / max(total * 120, 1))) if st.session_state.total_time > 0 else 1
-    xp_earned = calc_xp(score, total, st.session_state.difficulty, time_eff)
-    old_lvl = level_from_xp(st.session_state.xp)
-    st.session_state.xp += xp_earned
-    st.session_state.quizzes_done += 1
-    if score == total:
-        st.session_state.perfects += 1
-    new_lvl = level_from_xp(st.session_state.xp)
-    st.session_state.streak, st.session_state.last_date = update_streak(
-        st.session_state.last_date, st.session_state.streak)
+    quiz = st.session_state.quiz
+    profile = st.session_state.profile
+    first_view = quiz.result is None
+    # Awarded once: reruns of this page (e.g. a button click) show the same result
+    res = quiz.finish(profile)
+    if first_view:
+        save_progress()
+        st.balloons()
+    qs = quiz.questions
+    sb = quiz.scoreboard
+    score, total, pct = res.score, res.total, res.pct
+    new_lvl = res.new_level
 
     st.markdown('<div class="quiz-box">', unsafe_allow_html=True)
 
-    if new_lvl > old_lvl:
+    if res.levelled_up:
         st.markdown(f'<div class="msg-success">🎉 LEVEL UP! You reached Level {new_lvl}! 🚀</div>',
                     unsafe_allow_html=True)
 
@@ -860,12 +1832,12 @@ def show_results():
     with c1:
         st.metric("Score", f"{score}/{total}", f"{pct:.0f}%")
     with c2:
-        if st.session_state.total_time > 0:
-            st.metric("Time", f"{st.session_state.total_time/60:.1f} min")
+        if quiz.total_time > 0:
+            st.metric("Time", f"{quiz.total_time/60:.1f} min")
         else:
             st.metric("Time", "Untimed")
     with c3:
-        st.metric("XP Earned", f"+{xp_earned}")
+        st.metric("XP Earned", f"+{res.xp_earned}")
     with c4:
         st.metric("Level", new_lvl)
 
@@ -882,56 +1854,39 @@ def show_results():
         st.markdown('<div class="msg-warn">📚 Focus on the explanations and study the weak topics. You\'ve got this!</div>', unsafe_allow_html=True)
 
     # XP bar
-    prog = xp_progress_pct(st.session_state.xp)
-    st.markdown(f'<span class="level-circle">{new_lvl}</span> **Level {new_lvl}** — {st.session_state.xp} XP total',
+    prog = xp_progress_pct(profile.xp)
+    st.markdown(f'<span class="level-circle">{new_lvl}</span> **Level {new_lvl}** — {profile.xp} XP total',
                 unsafe_allow_html=True)
     st.markdown(f'<div class="xp-bar"><div class="xp-fill" style="width:{prog}%"></div></div>', unsafe_allow_html=True)
     st.markdown(f"**{prog}%** to Level {new_lvl + 1}")
 
     # Achievements
-    ach_data = {
-        "quizzes": st.session_state.quizzes_done,
-        "perfects": st.session_state.perfects,
-        "streak": st.session_state.streak,
-        "subjects_tried": len(st.session_state.history),
-        "fast_finish": time_eff > 0.8,
-    }
-    newly_unlocked = [a for a in get_unlocked(ach_data) if a[0] not in st.session_state.unlocked_ids]
-    if newly_unlocked:
+    if res.new_achievements:
         st.markdown("### 🏆 New Achievements!")
-        for aid, icon, title, desc, _ in newly_unlocked:
+        for _, icon, title, desc in res.new_achievements:
             st.markdown(f'<div class="achievement"><span style="font-size:1.8rem">{icon}</span>'
                         f'<div><b>{title}</b><br>{desc}</div></div>', unsafe_allow_html=True)
-            st.session_state.unlocked_ids.append(aid)
 
     # Detailed question review
     st.markdown("---")
     st.markdown("### 📋 Question-by-Question Review")
-    for i, (q, a) in enumerate(zip(qs, ans)):
-        subj_label = q.get("_subject", st.session_state.subject)
-        is_correct = a and a != "__EXPIRED__" and a.startswith(q["answer"])
-        icon = "✅" if is_correct else ("⏰" if a == "__EXPIRED__" else "❌")
-        with st.expander(f"{icon} Q{i+1}: {q['question'][:80]}... ({subj_label} — {q.get('topic','')})"):
-            if a == "__EXPIRED__":
+    for i, q in enumerate(qs):
+        subj_label = quiz.subject_for(i)
+        outcome = sb.outcomes.get(i)
+        icon = "✅" if outcome is True else ("⏰" if outcome == "expired" else "❌")
+        with st.expander(f"{icon} Q{i+1}: {q.question[:80]}... ({subj_label} — {q.topic})"):
+            a = quiz.answer_text(i)
+            if a == EXPIRED:
                 st.markdown("**Your answer:** Time expired")
             else:
                 st.markdown(f"**Your answer:** {a}")
-            st.markdown(f"**Correct answer:** {q['answer']}")
-            st.markdown(f"**Explanation:** {q['explanation']}")
+            st.markdown(f"**Correct answer:** {q.answer}")
+            st.markdown(f"**Explanation:** {explanation_for(q)}")
 
     # Topic mastery breakdown
     st.markdown("---")
     st.markdown("### 📈 Topic Performance This Quiz")
-    topic_stats = {}
-    for i, q in enumerate(qs):
-        t = q.get("topic", "General")
-        if t not in topic_stats:
-            topic_stats[t] = {"correct": 0, "total": 0}
-        topic_stats[t]["total"] += 1
-        if ans[i] and ans[i] != "__EXPIRED__" and ans[i].startswith(q["answer"]):
-            topic_stats[t]["correct"] += 1
-
-    for topic, data in sorted(topic_stats.items(), key=lambda x: x[1]["correct"] / max(x[1]["total"], 1)):
+    for topic, data in sorted(sb.by_topic.items(), key=lambda x: x[1]["correct"] / max(x[1]["total"], 1)):
         m = int((data["correct"] / max(data["total"], 1)) * 100)
         if m >= 70:
             colour = "#059669"
@@ -954,58 +1909,48 @@ def show_results():
             st.rerun()
     with c2:
         if st.button("🔁 Retry Same Subject", use_container_width=True, key="retry"):
-            launch_quiz([st.session_state.subject])
+            launch_quiz(quiz.retry())
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # STATS & RECOMMENDATIONS
 # ──────────────────────────────────────────────────────────────────────────────
 def show_stats_summary():
-    lvl = level_from_xp(st.session_state.xp)
-    prog = xp_progress_pct(st.session_state.xp)
+    p = st.session_state.profile
+    lvl = level_from_xp(p.xp)
+    prog = xp_progress_pct(p.xp)
     c1, c2, c3 = st.columns(3)
     with c1:
         st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        st.markdown(f'<span class="level-circle">{lvl}</span> **Level {lvl}** · {st.session_state.xp} XP',
+        st.markdown(f'<span class="level-circle">{lvl}</span> **Level {lvl}** · {p.xp} XP',
                     unsafe_allow_html=True)
         st.markdown(f'<div class="xp-bar"><div class="xp-fill" style="width:{prog}%"></div></div>',
                     unsafe_allow_html=True)
         st.markdown("</div>", unsafe_allow_html=True)
     with c2:
         st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        st.markdown(f"**📊 Quizzes:** {st.session_state.quizzes_done} · "
-                    f"**💯 Perfects:** {st.session_state.perfects}")
+        st.markdown(f"**📊 Quizzes:** {p.quizzes_done} · "
+                    f"**💯 Perfects:** {p.perfects}")
         st.markdown("</div>", unsafe_allow_html=True)
     with c3:
         st.markdown('<div class="stat-card">', unsafe_allow_html=True)
-        streak_label = "days" if st.session_state.streak != 1 else "day"
-        st.markdown(f"**🔥 Streak:** {st.session_state.streak} {streak_label}")
+        streak_label = "days" if p.streak != 1 else "day"
+        st.markdown(f"**🔥 Streak:** {p.streak} {streak_label}")
         st.markdown("</div>", unsafe_allow_html=True)
 
 
 def show_recommendations():
-    """Identify weak topics and suggest study focus."""
-    weak = []
-    for subj, entries in st.session_state.history.items():
-        topic_map = {}
-        for e in entries:
-            t = e["topic"]
-            if t not in topic_map:
-                topic_map[t] = {"c": 0, "t": 0}
-            topic_map[t]["t"] += 1
-            if e["correct"]:
-                topic_map[t]["c"] += 1
-        for t, d in topic_map.items():
-            mastery = d["c"] / max(d["t"], 1)
-            if mastery < 0.5 and d["t"] >= 2:
-                weak.append((subj, t, int(mastery * 100), d["t"]))
-
+    """Suggest study focus from the running mastery aggregates and the review queue."""
+    due = st.session_state.profile.reviews.due_count()
+    if due:
+        st.markdown(f'<div class="msg-info">🔁 {due} missed question(s) are due for review. '
+                    f'Open <b>Review</b> to go over them.</div>', unsafe_allow_html=True)
+    weak = st.session_state.profile.mastery.weak_topics(5)
     if weak:
-        weak.sort(key=lambda x: x[2])
         st.markdown("### 🎯 Recommended Focus Areas")
         st.markdown('<div class="msg-warn">These topics need more practice based on your history:</div>',
                     unsafe_allow_html=True)
-        for subj, topic, mastery, attempts in weak[:5]:
+        for subj, topic, mastery, attempts in weak:
             st.markdown(f"- **{subj} → {topic}** — {mastery}% mastery ({attempts} attempts)")
 
 
@@ -1013,19 +1958,28 @@ def show_recommendations():
 # MAIN
 # ──────────────────────────────────────────────────────────────────────────────
 def main():
+    start_metrics_export()
     init_state()
-
-    if st.session_state.stage != "home":
-        nav_bar()
-        home_btn()
-        handle_home_confirm()
-
-    if st.session_state.stage == "home":
-        show_home()
-    elif st.session_state.stage == "quiz":
-        show_quiz()
-    elif st.session_state.stage == "results":
-        show_results()
+    # A reconnecting student is recognised from the URL and restored in one read
+    if not st.session_state.student_id and st.query_params.get("student"):
+        load_progress(st.query_params["student"])
+
+    if st.session_state.quiz is None:
+        st.session_state.stage = "home"
+
+    # Timed per stage the run started on; a run cut short by st.rerun() still counts
+    with RENDER_SECONDS.time(stage=st.session_state.stage):
+        if st.session_state.stage != "home":
+            nav_bar()
+            home_btn()
+            handle_home_confirm()
+
+        if st.session_state.stage == "home":
+            show_home()
+        elif st.session_state.stage == "quiz":
+            show_quiz()
+        elif st.session_state.stage == "results":
+            show_results()
 
 
 if __name__ == "__main__":
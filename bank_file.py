@@ -0,0 +1,192 @@
+"""Compact on-disk question bank, read through mmap.
+
+Layout (little-endian):
+
+    header   magic "SPQB", version, record count, section offsets
+    strings  subject / difficulty / topic names, referenced by number
+    keys     one (subject, difficulty, topic, first record, count) row per key
+    records  fixed-size rows: key numbers, content id, body offset and length
+    bodies   UTF-8 JSON of question, options, answer and explanation
+
+Records are sorted by (subject, difficulty, topic), so every bank key — and
+every (subject, difficulty) or subject prefix — is one contiguous range of
+record numbers. Opening a bank reads the header, strings and keys only; a
+question body is decoded when that question is drawn.
+
+    python bank_file.py convert --out .smartprep/jamb_bank.spqb
+    python bank_file.py convert --input past_papers.jsonl --out bank.spqb
+    python bank_file.py info .smartprep/jamb_bank.spqb
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+
+from fingerprint import fingerprint
+
+MAGIC = b"SPQB"
+VERSION = 2                             # 2: ids are normalised fingerprints
+HEADER = struct.Struct("<4sHHIIQQQQ")   # magic, version, pad, records, keys, strings/keys/records/bodies offsets
+KEY = struct.Struct("<HHHHII")          # subject, difficulty, topic, pad, first record, count
+RECORD = struct.Struct("<HHHH20sQI")    # subject, difficulty, topic, pad, id, body offset, body length
+BODY_FIELDS = ("question", "options", "answer", "explanation")
+
+
+def write_bank(path, bank):
+    """Write ``{subject: [question, ...]}`` to ``path``; returns the record count.
+
+    Identical questions (same fingerprint) are stored once.
+    """
+    strings, string_ids = [], {}
+
+    def sid(s):
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s)
+        return string_ids[s]
+
+    rows, seen = [], set()
+    for subject, questions in bank.items():
+        for q in questions:
+            qid = q.get("id") or fingerprint(q)
+            if qid in seen:
+                continue
+            seen.add(qid)
+            body = json.dumps({k: q[k] for k in BODY_FIELDS}, ensure_ascii=False).encode("utf-8")
+            rows.append((subject, q.get("difficulty", "Medium"), q.get("topic", "General"), qid, body))
+    rows.sort(key=lambda r: r[:3])
+
+    keys = []
+    for i, (subject, difficulty, topic, _, _) in enumerate(rows):
+        k = (sid(subject), sid(difficulty), sid(topic))
+        if keys and keys[-1][0] == k:
+            keys[-1][2] += 1
+        else:
+            keys.append([k, i, 1])
+
+    string_blob = b"".join(struct.pack("<H", len(b)) + b for b in (s.encode("utf-8") for s in strings))
+    strings_off = HEADER.size
+    keys_off = strings_off + 4 + len(string_blob)
+    records_off = keys_off + KEY.size * len(keys)
+    bodies_off = records_off + RECORD.size * len(rows)
+
+    tmp = path + ".tmp"
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(rows), len(keys),
+                            strings_off, keys_off, records_off, bodies_off))
+        f.write(struct.pack("<I", len(strings)) + string_blob)
+        for (s, d, t), first, count in keys:
+            f.write(KEY.pack(s, d, t, 0, first, count))
+        offset = 0
+        for subject, difficulty, topic, qid, body in rows:
+            f.write(RECORD.pack(string_ids[subject], string_ids[difficulty], string_ids[topic], 0,
+                                qid.encode("ascii"), offset, len(body)))
+            offset += len(body)
+        for row in rows:
+            f.write(row[4])
+    os.replace(tmp, path)
+    return len(rows)
+
+
+class BankFile:
+    """Read-only view of a bank file; bodies are decoded on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.count, n_keys,
+         strings_off, keys_off, self._records_off, self._bodies_off) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} SmartPrep bank file")
+
+        (n_strings,) = struct.unpack_from("<I", self._mm, strings_off)
+        self.strings, off = [], strings_off + 4
+        for _ in range(n_strings):
+            (n,) = struct.unpack_from("<H", self._mm, off)
+            self.strings.append(self._mm[off + 2:off + 2 + n].decode("utf-8"))
+            off += 2 + n
+
+        # Every key and key prefix maps to one contiguous range of records
+        self._ranges = {}
+        for i in range(n_keys):
+            s, d, t, _, first, count = KEY.unpack_from(self._mm, keys_off + i * KEY.size)
+            subject, difficulty, topic = self.strings[s], self.strings[d], self.strings[t]
+            for key in ((subject, difficulty, topic), (subject, difficulty, None), (subject, None, None)):
+                lo, hi = self._ranges.get(key, (first, first))
+                self._ranges[key] = (min(lo, first), max(hi, first + count))
+
+    def keys(self):
+        return [k for k in self._ranges if k[2] is not None]
+
+    def positions(self, key):
+        """Record numbers listed under ``key``, as a range."""
+        lo, hi = self._ranges.get(key, (0, 0))
+        return range(lo, hi)
+
+    def meta(self, pos):
+        """(subject, difficulty, topic, id) of record ``pos`` without touching its body."""
+        s, d, t, _, qid, _, _ = RECORD.unpack_from(self._mm, self._records_off + pos * RECORD.size)
+        return self.strings[s], self.strings[d], self.strings[t], qid.decode("ascii")
+
+    def load(self, pos):
+        """Decode the full question stored at record ``pos``."""
+        s, d, t, _, qid, off, n = RECORD.unpack_from(self._mm, self._records_off + pos * RECORD.size)
+        start = self._bodies_off + off
+        q = json.loads(self._mm[start:start + n].decode("utf-8"))
+        q["topic"] = self.strings[t]
+        q["difficulty"] = self.strings[d]
+        q["id"] = qid.decode("ascii")
+        return q
+
+    def to_dict(self):
+        """The whole bank as ``{subject: [question, ...]}``; used when rebuilding a file."""
+        bank = {}
+        for pos in range(self.count):
+            bank.setdefault(self.meta(pos)[0], []).append(self.load(pos))
+        return bank
+
+    def close(self):
+        self._mm.close()
+
+
+def read_jsonl(path):
+    """Load ``{subject: [question, ...]}`` from a JSON Lines file with a ``subject`` field."""
+    bank = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                q = json.loads(line)
+                bank.setdefault(q.pop("subject"), []).append(q)
+    return bank
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect SmartPrep bank files.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="write a bank file from the built-in bank or a JSONL file")
+    c.add_argument("--input", help="JSONL file of questions with a subject field (default: bank_seed.py)")
+    c.add_argument("--out", default=os.path.join(".smartprep", "jamb_bank.spqb"))
+    i = sub.add_parser("info", help="summarise a bank file")
+    i.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "convert":
+        if args.input:
+            bank = read_jsonl(args.input)
+        else:
+            from bank_seed import JAMB_QUESTION_BANK as bank
+        print(f"Wrote {write_bank(args.out, bank)} questions to {args.out}")
+    else:
+        bf = BankFile(args.path)
+        print(f"{bf.count} questions, {len(bf.keys())} keys, {os.path.getsize(args.path)} bytes")
+        for subject, difficulty, topic in sorted(bf.keys()):
+            print(f"  {subject} / {difficulty} / {topic}: {len(bf.positions((subject, difficulty, topic)))}")
+        bf.close()
+
+
+if __name__ == "__main__":
+    main()
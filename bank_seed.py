@@ -0,0 +1,73 @@
+"""Built-in JAMB past questions: the source for the compact bank file.
+
+Nothing reads this at import time: ``bank_file.py convert`` (run by the app
+when the bank file is missing or older than this module) turns it into the
+compact, mmap-friendly bank file that questions are actually drawn from.
+"""
+
+JAMB_QUESTION_BANK = {
+    "Mathematics": [
+        {"question": "If log₁₀2 = 0.3010, find log₁₀8.", "options": ["A) 0.6020", "B) 0.9030", "C) 2.4030", "D) 1.2040"], "answer": "B", "explanation": "8 = 2³, so log₁₀8 = 3 × log₁₀2 = 3 × 0.3010 = 0.9030.", "topic": "Algebra and Equations", "difficulty": "Medium"},
+        {"question": "Convert 101101₂ to base 10.", "options": ["A) 45", "B) 53", "C) 44", "D) 46"], "answer": "A", "explanation": "1×2⁵+0×2⁴+1×2³+1×2²+0×2¹+1×2⁰ = 32+0+8+4+0+1 = 45.", "topic": "Number Bases", "difficulty": "Easy"},
+        {"question": "Solve 2x² + 5x − 3 = 0.", "options": ["A) x = ½ or x = −3", "B) x = −½ or x = 3", "C) x = 1 or x = −3", "D) x = 3 or x = ½"], "answer": "A", "explanation": "Factoring: (2x − 1)(x + 3) = 0 ⇒ x = ½ or x = −3.", "topic": "Algebra and Equations", "difficulty": "Medium"},
+        {"question": "A fair die is thrown twice. What is the probability of getting a sum of 7?", "options": ["A) 1/12", "B) 1/6", "C) 5/36", "D) 7/36"], "answer": "B", "explanation": "Favourable outcomes: (1,6),(2,5),(3,4),(4,3),(5,2),(6,1) = 6 out of 36. P = 6/36 = 1/6.", "topic": "Statistics and Probability", "difficulty": "Medium"},
+        {"question": "Find dy/dx if y = 3x³ − 2x² + x − 5.", "options": ["A) 9x² − 4x + 1", "B) 9x² − 4x − 1", "C) 9x² + 4x + 1", "D) 3x² − 2x + 1"], "answer": "A", "explanation": "Differentiating term by term: dy/dx = 9x² − 4x + 1.", "topic": "Calculus", "difficulty": "Medium"},
+        {"question": "If A = {1,2,3,4,5} and B = {3,4,5,6,7}, find A ∩ B.", "options": ["A) {1,2}", "B) {3,4,5}", "C) {6,7}", "D) {1,2,3,4,5,6,7}"], "answer": "B", "explanation": "The intersection contains elements common to both sets: {3, 4, 5}.", "topic": "Sets and Logic", "difficulty": "Easy"},
+        {"question": "Simplify (√50 − √32) / √2.", "options": ["A) 1", "B) √2", "C) 3", "D) 2"], "answer": "A", "explanation": "√50 = 5√2, √32 = 4√2. So (5√2 − 4√2)/√2 = √2/√2 = 1.", "topic": "Algebra and Equations", "difficulty": "Medium"},
+        {"question": "Find the determinant of the matrix [[2, 3],[4, 1]].", "options": ["A) −10", "B) 10", "C) −14", "D) 14"], "answer": "A", "explanation": "det = (2×1) − (3×4) = 2 − 12 = −10.", "topic": "Matrices", "difficulty": "Medium"},
+        {"question": "The 3rd term of a G.P. is 18 and the 6th term is 486. Find the first term.", "options": ["A) 2", "B) 3", "C) 6", "D) 9"], "answer": "A", "explanation": "ar² = 18, ar⁵ = 486. Dividing: r³ = 27, r = 3. Then a(9) = 18, a = 2.", "topic": "Algebra and Equations", "difficulty": "Hard"},
+        {"question": "Find the distance between points P(3, −2) and Q(−1, 1).", "options": ["A) 5", "B) 4", "C) 7", "D) √13"], "answer": "A", "explanation": "d = √[(3−(−1))² + (−2−1)²] = √[16+9] = √25 = 5.", "topic": "Geometry and Trigonometry", "difficulty": "Easy"},
+    ],
+    "English Language": [
+        {"question": "Choose the word that best completes the sentence: The teacher asked the students to ______ their essays before submission.", "options": ["A) revise", "B) devise", "C) advise", "D) supervise"], "answer": "A", "explanation": "'Revise' means to re-examine and make corrections, which is what students do to essays before submission.", "topic": "Lexis and Structure", "difficulty": "Easy"},
+        {"question": "Select the option that best explains the idiom: 'to bury the hatchet'.", "options": ["A) To start a fight", "B) To make peace", "C) To hide a weapon", "D) To dig a grave"], "answer": "B", "explanation": "'Bury the hatchet' is an idiom meaning to end a conflict and make peace.", "topic": "Figurative Expressions", "difficulty": "Medium"},
+        {"question": "Identify the figure of speech in: 'The wind howled through the night.'", "options": ["A) Simile", "B) Metaphor", "C) Personification", "D) Hyperbole"], "answer": "C", "explanation": "Attributing the human action of 'howling' to wind is personification.", "topic": "Literary Devices", "difficulty": "Easy"},
+        {"question": "Choose the correct option: Neither the students nor the teacher ______ present.", "options": ["A) were", "B) was", "C) are", "D) have been"], "answer": "B", "explanation": "With 'neither…nor', the verb agrees with the nearest subject ('teacher' = singular), so 'was'.", "topic": "Grammatical Structures", "difficulty": "Medium"},
+        {"question": "Which of these words is a synonym of 'benevolent'?", "options": ["A) Malicious", "B) Kind", "C) Wealthy", "D) Intelligent"], "answer": "B", "explanation": "'Benevolent' means well-meaning and kindly, synonymous with 'kind'.", "topic": "Synonyms and Antonyms", "difficulty": "Easy"},
+        {"question": "The expression 'a red herring' means:", "options": ["A) A type of fish", "B) A misleading clue", "C) A dangerous situation", "D) An embarrassing moment"], "answer": "B", "explanation": "A 'red herring' is something that misleads or distracts from a relevant issue.", "topic": "Figurative Expressions", "difficulty": "Medium"},
+        {"question": "Choose the word with the correct stress pattern (capitalised syllable): PHOTOGRAPH", "options": ["A) phoTOgraph", "B) PHOtograph", "C) photoGRAPH", "D) phoTOGraph"], "answer": "B", "explanation": "The stress in 'photograph' falls on the first syllable: PHO-to-graph.", "topic": "Oral Forms", "difficulty": "Medium"},
+        {"question": "Identify the sentence with correct punctuation:", "options": ["A) Its a beautiful day isnt it?", "B) It's a beautiful day, isn't it?", "C) Its a beautiful day, isn't it?", "D) It's a beautiful day isnt it."], "answer": "B", "explanation": "'It's' (contraction) and 'isn't it?' (tag question) both need apostrophes, and a comma separates the tag.", "topic": "Grammatical Structures", "difficulty": "Easy"},
+    ],
+    "Physics": [
+        {"question": "A body of mass 5 kg is moving with a velocity of 10 m/s. What is its kinetic energy?", "options": ["A) 50 J", "B) 100 J", "C) 250 J", "D) 500 J"], "answer": "C", "explanation": "KE = ½mv² = ½ × 5 × 10² = ½ × 5 × 100 = 250 J.", "topic": "Mechanics", "difficulty": "Easy"},
+        {"question": "A wire of resistance 6Ω is drawn out so that its length is doubled. What is the new resistance?", "options": ["A) 3Ω", "B) 6Ω", "C) 12Ω", "D) 24Ω"], "answer": "D", "explanation": "When length doubles, area halves (volume constant). R = ρL/A → new R = ρ(2L)/(A/2) = 4ρL/A = 4×6 = 24Ω.", "topic": "Electricity and Magnetism", "difficulty": "Hard"},
+        {"question": "Which of the following is a vector quantity?", "options": ["A) Speed", "B) Temperature", "C) Momentum", "D) Energy"], "answer": "C", "explanation": "Momentum has both magnitude and direction, making it a vector. Speed, temperature, and energy are scalars.", "topic": "Mechanics", "difficulty": "Easy"},
+        {"question": "The image formed by a plane mirror is:", "options": ["A) Real and inverted", "B) Virtual and erect", "C) Real and erect", "D) Virtual and inverted"], "answer": "B", "explanation": "A plane mirror always produces a virtual, erect, and laterally inverted image of the same size.", "topic": "Optics", "difficulty": "Easy"},
+        {"question": "A sound wave has a frequency of 340 Hz and travels at 340 m/s. What is its wavelength?", "options": ["A) 0.5 m", "B) 1.0 m", "C) 2.0 m", "D) 340 m"], "answer": "B", "explanation": "λ = v/f = 340/340 = 1.0 m.", "topic": "Waves", "difficulty": "Medium"},
+        {"question": "The half-life of a radioactive substance is 4 days. What fraction remains after 12 days?", "options": ["A) 1/4", "B) 1/8", "C) 1/16", "D) 1/2"], "answer": "B", "explanation": "12 days = 3 half-lives. Fraction remaining = (½)³ = 1/8.", "topic": "Nuclear Physics", "difficulty": "Medium"},
+        {"question": "An object is thrown vertically upward with a velocity of 20 m/s. What is the maximum height reached? (g = 10 m/s²)", "options": ["A) 10 m", "B) 20 m", "C) 40 m", "D) 80 m"], "answer": "B", "explanation": "At max height v = 0. Using v² = u² − 2gh: 0 = 400 − 20h → h = 20 m.", "topic": "Mechanics", "difficulty": "Medium"},
+    ],
+    "Chemistry": [
+        {"question": "What is the IUPAC name of CH₃CH₂OH?", "options": ["A) Methanol", "B) Ethanol", "C) Propanol", "D) Butanol"], "answer": "B", "explanation": "CH₃CH₂OH has 2 carbon atoms with an -OH group, making it ethanol.", "topic": "Organic Chemistry", "difficulty": "Easy"},
+        {"question": "Which of the following is a strong electrolyte?", "options": ["A) CH₃COOH", "B) NH₃", "C) NaCl", "D) C₂H₅OH"], "answer": "C", "explanation": "NaCl (sodium chloride) completely dissociates in water, making it a strong electrolyte.", "topic": "Electrochemistry", "difficulty": "Medium"},
+        {"question": "In the periodic table, elements in the same group have the same:", "options": ["A) Atomic mass", "B) Number of electron shells", "C) Number of valence electrons", "D) Atomic number"], "answer": "C", "explanation": "Elements in the same group have the same number of valence (outermost) electrons, giving them similar chemical properties.", "topic": "Atomic Structure", "difficulty": "Easy"},
+        {"question": "The pH of a neutral solution at 25°C is:", "options": ["A) 0", "B) 1", "C) 7", "D) 14"], "answer": "C", "explanation": "At 25°C, a neutral solution has equal concentrations of H⁺ and OH⁻, giving pH = 7.", "topic": "Acids and Bases", "difficulty": "Easy"},
+        {"question": "What type of bond is formed between Na and Cl in NaCl?", "options": ["A) Covalent", "B) Metallic", "C) Ionic", "D) Van der Waals"], "answer": "C", "explanation": "Na donates an electron to Cl, forming Na⁺ and Cl⁻ ions held together by electrostatic (ionic) bonding.", "topic": "Chemical Bonding", "difficulty": "Easy"},
+        {"question": "Which gas is produced when dilute HCl reacts with Na₂CO₃?", "options": ["A) Hydrogen", "B) Oxygen", "C) Carbon dioxide", "D) Chlorine"], "answer": "C", "explanation": "Na₂CO₃ + 2HCl → 2NaCl + H₂O + CO₂. Carbon dioxide gas is liberated.", "topic": "Chemical Reactions", "difficulty": "Medium"},
+        {"question": "Le Chatelier's principle states that when a system at equilibrium is disturbed, it:", "options": ["A) Stops reacting", "B) Shifts to oppose the change", "C) Shifts to reinforce the change", "D) Reaches a new equilibrium immediately"], "answer": "B", "explanation": "Le Chatelier's principle: a system at equilibrium shifts in the direction that tends to counteract the imposed change.", "topic": "Physical Chemistry", "difficulty": "Medium"},
+    ],
+    "Biology": [
+        {"question": "The organelle responsible for protein synthesis in a cell is the:", "options": ["A) Mitochondrion", "B) Ribosome", "C) Golgi apparatus", "D) Lysosome"], "answer": "B", "explanation": "Ribosomes are the sites of protein synthesis, translating mRNA into polypeptide chains.", "topic": "Cell Biology", "difficulty": "Easy"},
+        {"question": "In Mendel's experiment, if Tt is crossed with Tt, what is the phenotypic ratio?", "options": ["A) 1:1", "B) 1:2:1", "C) 3:1", "D) 2:1"], "answer": "C", "explanation": "Tt × Tt gives TT:Tt:tt = 1:2:1 genotypically, but 3 tall : 1 short phenotypically (3:1).", "topic": "Genetics", "difficulty": "Medium"},
+        {"question": "Malaria is caused by:", "options": ["A) Virus", "B) Bacteria", "C) Plasmodium", "D) Trypanosoma"], "answer": "C", "explanation": "Malaria is caused by Plasmodium parasites (P. falciparum, P. vivax, etc.) transmitted by female Anopheles mosquitoes.", "topic": "Microbiology", "difficulty": "Easy"},
+        {"question": "The part of the flower that develops into a fruit after fertilisation is the:", "options": ["A) Sepal", "B) Petal", "C) Ovary", "D) Anther"], "answer": "C", "explanation": "After fertilisation, the ovary of the flower develops into the fruit, enclosing the seeds.", "topic": "Plant Biology", "difficulty": "Easy"},
+        {"question": "Which blood group is the universal donor?", "options": ["A) A", "B) B", "C) AB", "D) O"], "answer": "D", "explanation": "Blood group O has no A or B antigens on red blood cells, so it can be donated to all ABO groups (universal donor).", "topic": "Human Anatomy and Physiology", "difficulty": "Easy"},
+        {"question": "The process by which green plants manufacture food using sunlight is called:", "options": ["A) Respiration", "B) Transpiration", "C) Photosynthesis", "D) Osmosis"], "answer": "C", "explanation": "Photosynthesis is the process by which plants use light energy, CO₂, and water to produce glucose and oxygen.", "topic": "Plant Biology", "difficulty": "Easy"},
+        {"question": "In an ecosystem, organisms that feed on dead organic matter are called:", "options": ["A) Producers", "B) Primary consumers", "C) Decomposers", "D) Tertiary consumers"], "answer": "C", "explanation": "Decomposers (e.g., bacteria and fungi) break down dead organic matter and recycle nutrients.", "topic": "Ecology", "difficulty": "Easy"},
+        {"question": "Sickle cell anaemia is caused by a mutation in the gene coding for:", "options": ["A) Insulin", "B) Haemoglobin", "C) Keratin", "D) Collagen"], "answer": "B", "explanation": "Sickle cell anaemia results from a point mutation in the haemoglobin gene (HBB), producing abnormal haemoglobin S.", "topic": "Genetics", "difficulty": "Medium"},
+    ],
+    "Government": [
+        {"question": "The 1999 Constitution of Nigeria provides for a:", "options": ["A) Parliamentary system", "B) Confederate system", "C) Presidential system", "D) Monarchical system"], "answer": "C", "explanation": "Nigeria's 1999 Constitution establishes a presidential system with separation of powers among the executive, legislature, and judiciary.", "topic": "Nigerian Constitution", "difficulty": "Easy"},
+        {"question": "The principle of separation of powers was advocated by:", "options": ["A) John Locke", "B) Montesquieu", "C) Jean-Jacques Rousseau", "D) Thomas Hobbes"], "answer": "B", "explanation": "Baron de Montesquieu articulated the doctrine of separation of powers into executive, legislative, and judicial branches.", "topic": "Political Parties", "difficulty": "Medium"},
+        {"question": "INEC stands for:", "options": ["A) Independent National Electoral Council", "B) Independent National Electoral Commission", "C) Internal National Electoral Commission", "D) Independent Nigerian Electoral Committee"], "answer": "B", "explanation": "INEC is the Independent National Electoral Commission, responsible for conducting elections in Nigeria.", "topic": "Electoral Systems", "difficulty": "Easy"},
+        {"question": "How many geo-political zones does Nigeria have?", "options": ["A) 4", "B) 5", "C) 6", "D) 7"], "answer": "C", "explanation": "Nigeria has 6 geo-political zones: North-Central, North-East, North-West, South-East, South-South, and South-West.", "topic": "Nigerian Federalism", "difficulty": "Easy"},
+        {"question": "The highest court in Nigeria is the:", "options": ["A) Court of Appeal", "B) Federal High Court", "C) Supreme Court", "D) High Court"], "answer": "C", "explanation": "The Supreme Court is the apex court in Nigeria and the final court of appeal.", "topic": "Nigerian Political System", "difficulty": "Easy"},
+    ],
+    "Economics": [
+        {"question": "The law of demand states that, ceteris paribus, as price increases:", "options": ["A) Quantity demanded increases", "B) Quantity demanded decreases", "C) Supply increases", "D) Supply decreases"], "answer": "B", "explanation": "The law of demand: price and quantity demanded are inversely related, all other factors held constant.", "topic": "Microeconomics", "difficulty": "Easy"},
+        {"question": "GDP stands for:", "options": ["A) General Domestic Price", "B) Gross Domestic Product", "C) General Development Plan", "D) Gross Development Product"], "answer": "B", "explanation": "GDP (Gross Domestic Product) is the total monetary value of all finished goods and services produced within a country's borders.", "topic": "Macroeconomics", "difficulty": "Easy"},
+        {"question": "An increase in supply, with demand unchanged, leads to:", "options": ["A) Higher equilibrium price", "B) Lower equilibrium price", "C) No change in price", "D) Higher demand"], "answer": "B", "explanation": "When supply increases (shifts right) with constant demand, the equilibrium price falls and quantity rises.", "topic": "Microeconomics", "difficulty": "Medium"},
+        {"question": "Which of the following is NOT a function of the Central Bank of Nigeria?", "options": ["A) Issuing currency", "B) Banker to commercial banks", "C) Accepting deposits from individuals", "D) Controlling monetary policy"], "answer": "C", "explanation": "The CBN does not accept deposits from the general public; that is the role of commercial banks.", "topic": "Monetary Economics", "difficulty": "Medium"},
+        {"question": "Inflation is best described as:", "options": ["A) A fall in the general price level", "B) A persistent rise in the general price level", "C) An increase in the value of money", "D) A decrease in production"], "answer": "B", "explanation": "Inflation is a sustained increase in the general level of prices for goods and services over time.", "topic": "Macroeconomics", "difficulty": "Easy"},
+    ],
+}
@@ -0,0 +1,403 @@
+"""Reproducible benchmarks for the question pipeline.
+
+Every benchmark runs offline against ``stub_model.StubModel`` and a synthetic
+bank file, inside a scratch directory, with a fixed seed. Each reports
+throughput, p50/p95/p99 latency per operation and peak Python memory, and the
+whole run can be written to JSON and compared with an earlier run:
+
+    python benchmark.py --bank-size 100000 --out bench.json
+    python benchmark.py --latency 0.05 --error-rate 0.1 --only get_question
+    python benchmark.py --compare bench.json       # exit status 1 on a regression
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BENCHMARKS = {}
+QUIZ_LENGTH = 40          # questions per simulated session
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+
+
+def benchmark(name):
+    """Register ``setup(cfg) -> op(i)`` as the benchmark ``name``."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def load_app():
+    """Import app.py outside ``streamlit run``; its page calls become no-ops."""
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    import app
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    return app
+
+
+def synthetic_bank(size, subjects, seed=0):
+    """``{subject: [question, ...]}`` with ``size`` distinct questions spread over every key."""
+    from stub_model import StubModel
+
+    rng = random.Random(seed)
+    stub = StubModel("bank", seed=seed)
+    bank = {s: [] for s in subjects}
+    names = list(subjects)
+    for _ in range(size):
+        subject = rng.choice(names)
+        q = stub.question(subject, rng.choice(subjects[subject]["topics"]))
+        q["difficulty"] = rng.choice(DIFFICULTIES)
+        bank[subject].append(q)
+    return bank
+
+
+def stub_router(app, cfg):
+    """A ``ModelRouter`` over two stub models, with the scheduler's quotas out of the way."""
+    from scheduler import CallScheduler
+    from stub_model import stub_factory
+
+    factory = stub_factory(latency=cfg.latency, spread=cfg.spread, dist=cfg.dist, error_rate=cfg.error_rate,
+                           rate_limit_rate=cfg.rate_limit_rate, malformed_rate=cfg.malformed_rate, seed=cfg.seed)
+    return app.ModelRouter(["stub-primary", "stub-fallback"], factory,
+                           CallScheduler(default_rpm=10 ** 9, max_concurrency=10 ** 6))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# BENCHMARKS
+# ──────────────────────────────────────────────────────────────────────────────
+@benchmark("parse_ai_response")
+def bench_parse(cfg):
+    from response_parser import parse_question
+    from stub_model import StubModel
+
+    app = load_app()
+    rng = random.Random(cfg.seed)
+    stub = StubModel("parse", seed=cfg.seed)
+    prompts = [app.question_prompt(s, t, "Medium")
+               for s in app.JAMB_SUBJECTS for t in app.JAMB_SUBJECTS[s]["topics"]]
+    texts = [stub.render(prompts[i % len(prompts)], rng.random() < cfg.malformed_rate) for i in range(cfg.ops)]
+    return lambda i: parse_question(texts[i])
+
+
+@benchmark("parse_ai_stream")
+def bench_parse_stream(cfg):
+    """The streamed path: a response fed to the incremental parser in small chunks, head checked after each."""
+    from response_parser import LineParser
+    from stub_model import StubModel
+
+    app = load_app()
+    stub = StubModel("parse", seed=cfg.seed)
+    prompts = [app.question_prompt(s, t, "Medium")
+               for s in app.JAMB_SUBJECTS for t in app.JAMB_SUBJECTS[s]["topics"]]
+    texts = [stub.render(prompts[i % len(prompts)]) for i in range(cfg.ops)]
+
+    def op(i):
+        parser, text, head = LineParser(), texts[i], None
+        for start in range(0, len(text), 16):
+            parser.feed(text[start:start + 16])
+            head = head or parser.head()
+        return parser.close()
+
+    return op
+
+
+@benchmark("parse_ai_batch")
+def bench_parse_batch(cfg):
+    from response_parser import parse_batch
+    from stub_model import StubModel
+
+    app = load_app()
+    rng = random.Random(cfg.seed)
+    stub = StubModel("parse", seed=cfg.seed)
+    topics = app.JAMB_SUBJECTS["Physics"]["topics"][:app.GEN_BATCH_SIZE]
+    prompt = app.batch_prompt("Physics", topics, "Medium")
+    texts = [stub.render(prompt, rng.random() < cfg.malformed_rate) for _ in range(cfg.ops)]
+    return lambda i: parse_batch(texts[i], topics)
+
+
+@benchmark("get_bank_question")
+def bench_bank(cfg):
+    from bank_file import BankFile, write_bank
+
+    app = load_app()
+    path = os.path.join(cfg.workdir, f"bench_{cfg.bank_size}.spqb")
+    if not os.path.exists(path):
+        write_bank(path, synthetic_bank(cfg.bank_size, app.JAMB_SUBJECTS, cfg.seed))
+    bank = BankFile(path)
+    rng = random.Random(cfg.seed)
+    subjects = list(app.JAMB_SUBJECTS)
+    session = {}
+
+    def op(i):
+        if i % QUIZ_LENGTH == 0:
+            session.update(cursors=app.BankCursors(), used=set(), subject=rng.choice(subjects),
+                           difficulty=rng.choice(DIFFICULTIES))
+        q = app.get_bank_question(session["subject"], session["difficulty"], session["used"],
+                                  session["cursors"], bank=bank)
+        session["used"].add(q["id"])
+    return op
+
+
+@benchmark("adaptive_pick")
+def bench_adaptive(cfg):
+    """Adaptive sessions: pick by ability from the banded index, answer, update both estimates."""
+    from adaptive import Ability, ItemIndex, p_correct
+    from bank_file import BankFile, write_bank
+
+    app = load_app()
+    path = os.path.join(cfg.workdir, f"bench_{cfg.bank_size}.spqb")
+    if not os.path.exists(path):
+        write_bank(path, synthetic_bank(cfg.bank_size, app.JAMB_SUBJECTS, cfg.seed))
+    bank = BankFile(path)
+    items = ItemIndex()
+    for pos in range(bank.count):
+        subject, difficulty, topic, qid = bank.meta(pos)
+        items.add(qid, subject, topic, difficulty, pos)
+    rng = random.Random(cfg.seed)
+    subjects = list(app.JAMB_SUBJECTS)
+    session = {}
+
+    def op(i):
+        if i % QUIZ_LENGTH == 0:
+            session.update(ability=Ability(), used=set(), subject=rng.choice(subjects), true=rng.gauss(0, 1))
+        subject, ability = session["subject"], session["ability"]
+        pos = items.pick(subject, ability.theta(subject), session["used"])
+        qid = bank.meta(pos)[3]
+        session["used"].add(qid)
+        rating = items.rating(qid)
+        correct = rng.random() < p_correct(session["true"], rating)
+        items.record(qid, None, ability.record(subject, rating, correct), correct)
+    return op
+
+
+@benchmark("get_question")
+def bench_get_question(cfg):
+    app = load_app()
+    model = stub_router(app, cfg)
+    rng = random.Random(cfg.seed)
+    subjects = list(app.JAMB_SUBJECTS)
+    session = {}
+
+    def op(i):
+        if i % QUIZ_LENGTH == 0:
+            session.update(cursors=app.BankCursors(), used=set(), topics=[], subject=rng.choice(subjects))
+        q = app.get_question(model, session["subject"], "Medium", session["topics"], session["used"],
+                             cursors=session["cursors"])
+        if q:   # None when the model failed and the bank has nothing for the subject
+            session["used"].add(q["id"])
+            session["topics"].append(q.get("topic", ""))
+    return op
+
+
+@benchmark("recommendations")
+def bench_recommendations(cfg):
+    """One answer recorded into a long history, then the home page's weak-topic query."""
+    from mastery import MasteryTracker
+
+    app = load_app()
+    rng = random.Random(cfg.seed)
+    keys = [(s, t) for s in app.JAMB_SUBJECTS for t in app.JAMB_SUBJECTS[s]["topics"]]
+    tracker = MasteryTracker()
+    now = time.time()
+    for n in range(cfg.history):
+        s, t = rng.choice(keys)
+        tracker.record(s, t, rng.random() < 0.6, now - (cfg.history - n) * 60)
+    answers = [(*rng.choice(keys), rng.random() < 0.6) for _ in range(cfg.ops)]
+
+    def op(i):
+        s, t, ok = answers[i]
+        tracker.record(s, t, ok)
+        return tracker.weak_topics(5)
+    return op
+
+
+@benchmark("score_quiz")
+def bench_score(cfg):
+    """Answer a whole quiz through the engine and award its result, without Streamlit."""
+    from quiz_engine import Profile, QuizSession
+    from stub_model import StubModel
+
+    rng = random.Random(cfg.seed)
+    stub = StubModel("quiz", seed=cfg.seed)
+    quizzes = []
+    for _ in range(min(cfg.ops, 1000)):
+        qs = [stub.question(rng.choice(("Mathematics", "Physics")), f"Topic {rng.randrange(8)}")
+              for _ in range(QUIZ_LENGTH)]
+        for n, q in enumerate(qs):
+            q["id"] = n
+            q["options"] = [f"{letter}) {o}" for letter, o in zip("ABCD", q["options"])]
+        quizzes.append([(q, q["options"][rng.randrange(4)]) for q in qs])
+
+    def op(i):
+        profile = Profile()
+        quiz = QuizSession(["Mathematics", "Physics"], total_qs=QUIZ_LENGTH, time_per_q=90,
+                           per_subject=QUIZ_LENGTH // 2, mode="cbt")
+        for n, (q, choice) in enumerate(quizzes[i % len(quizzes)]):
+            (quiz.add_question if n else quiz.start)(dict(q))
+            quiz.submit(choice, profile)
+        return quiz.finish(profile)
+    return op
+
+
+@benchmark("quiz_sessions")
+def bench_sessions(cfg):
+    """Concurrent sessions kept alive, each a whole answered quiz of bank-decoded questions.
+
+    Peak memory divided by ``--ops`` approximates the state each live session holds.
+    """
+    from quiz_engine import QuizSession
+    from stub_model import StubModel
+
+    rng = random.Random(cfg.seed)
+    stub = StubModel("bank", seed=cfg.seed)
+    bodies = []
+    for n in range(2000):
+        q = stub.question("Physics", f"Topic {rng.randrange(8)}")
+        q.update(id=f"q{n}", options=[f"{letter}) {o}" for letter, o in zip("ABCD", q["options"])])
+        bodies.append(json.dumps(q))
+    live = []
+
+    def op(i):
+        quiz = QuizSession(["Physics"], total_qs=QUIZ_LENGTH, time_per_q=120)
+        for n in range(QUIZ_LENGTH):
+            # Every draw decodes a fresh dict, as the bank file and question store do
+            q = json.loads(bodies[rng.randrange(len(bodies))])
+            (quiz.add_question if n else quiz.start)(q)
+            quiz.submit(q["options"][rng.randrange(4)])
+        live.append(quiz)
+        return quiz
+    return op
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# HARNESS
+# ──────────────────────────────────────────────────────────────────────────────
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run_one(name, cfg):
+    """Time ``cfg.ops`` operations, then repeat setup and workload under tracemalloc for peak memory."""
+    random.seed(cfg.seed)
+    op = BENCHMARKS[name](cfg)
+    timings = []
+    start = time.perf_counter()
+    for i in range(cfg.ops):
+        t = time.perf_counter()
+        op(i)
+        timings.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    result = {
+        "ops": cfg.ops,
+        "seconds": round(elapsed, 6),
+        "throughput_per_s": round(cfg.ops / elapsed, 2) if elapsed else None,
+        **{f"p{int(q * 100)}_ms": round(percentile(timings, q) * 1000, 4) for q in (0.5, 0.95, 0.99)},
+        "max_ms": round(timings[-1] * 1000, 4) if timings else 0.0,
+    }
+    if cfg.memory:
+        random.seed(cfg.seed)
+        tracemalloc.start()
+        try:
+            op = BENCHMARKS[name](cfg)
+            for i in range(cfg.ops):
+                op(i)
+            result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Benchmarks whose p50 latency or peak memory grew by more than ``tolerance`` (a fraction)."""
+    regressions = []
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for field in ("p50_ms", "p95_ms", "peak_memory_bytes"):
+            if before.get(field) and now.get(field) and now[field] > before[field] * (1 + tolerance):
+                regressions.append(f"{name}.{field}: {before[field]} -> {now[field]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SmartPrep question pipeline offline.")
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="benchmarks to run (default: all)")
+    parser.add_argument("--ops", type=int, default=2000, help="operations per benchmark")
+    parser.add_argument("--bank-size", type=int, default=10_000, help="questions in the synthetic bank")
+    parser.add_argument("--history", type=int, default=50_000, help="answers already recorded per student")
+    parser.add_argument("--latency", type=float, default=0.0, help="median stub model latency in seconds")
+    parser.add_argument("--spread", type=float, default=0.5, help="stub latency spread (see --dist)")
+    parser.add_argument("--dist", default="lognormal", choices=("fixed", "uniform", "lognormal"))
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of stub calls that fail")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of stub calls that return 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.05, help="share of unparseable stub responses")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before --compare fails")
+    cfg = parser.parse_args(argv)
+
+    out = os.path.abspath(cfg.out) if cfg.out else None
+    baseline = None
+    if cfg.compare:
+        with open(cfg.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = {
+        "meta": {"git": git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+                 "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "config": {k: v for k, v in vars(cfg).items() if k not in ("out", "compare")}},
+        "results": {},
+    }
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="smartprep-bench-") as workdir:
+        # The app keeps its default bank and stores under ./.smartprep; keep them out of the checkout
+        os.chdir(workdir)
+        cfg.workdir = workdir
+        try:
+            for name in cfg.only or list(BENCHMARKS):
+                res = report["results"][name] = run_one(name, cfg)
+                mem = f"{res['peak_memory_bytes'] / 1e6:8.2f} MB" if "peak_memory_bytes" in res else ""
+                print(f"{name:20} {res['throughput_per_s']:>12,.1f} ops/s  p50 {res['p50_ms']:9.4f} ms  "
+                      f"p95 {res['p95_ms']:9.4f} ms  p99 {res['p99_ms']:9.4f} ms  {mem}")
+        finally:
+            os.chdir(cwd)
+
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if baseline is not None:
+        regressions = compare(report, baseline, cfg.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Process-wide generation broker shared by every session.
+
+Sessions ask the broker for questions instead of calling Gemini themselves.
+Requests for the same (subject, difficulty) that arrive within a short
+window are coalesced into one batched call, and each (subject, difficulty,
+topic) key keeps a small hot pool of spare questions, so the next request for
+a popular key is usually answered without waiting on the model. Each question
+is handed to one session only, and never to a session that has already seen it.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+HOT_POOL_SIZE = 2     # spare questions kept per (subject, difficulty, topic)
+LINGER = 0.05         # seconds a batch waits for more requests to join it
+
+
+class GenerationBroker:
+    """Coalesces question requests into shared batches.
+
+    ``generate_batch(subject, topics, difficulty)`` returns a list of
+    questions, ideally one per topic. It runs on the broker's own workers, so
+    threads from other pools can block on the returned futures safely.
+    """
+
+    def __init__(self, generate_batch, max_batch=10, hot_size=HOT_POOL_SIZE, linger=LINGER, workers=4):
+        self.generate_batch = generate_batch
+        self.max_batch = max_batch
+        self.hot_size = hot_size
+        self.linger = linger
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="broker")
+        self._lock = threading.Lock()
+        self._pools = {}      # (subject, difficulty, topic) -> deque of spare questions
+        self._waiters = {}    # (subject, difficulty) -> [(topic, used_ids, future)]
+        self._refill = {}     # (subject, difficulty) -> {topic: spares wanted}
+        self._running = set()  # (subject, difficulty) whose batch loop is active
+        self.requests = 0
+        self.pool_hits = 0
+        self.calls = 0
+        self.generated = 0
+
+    def take(self, subject, difficulty, topic, used_ids=()):
+        """A spare question for the key if one is ready, without waiting; None otherwise."""
+        with self._lock:
+            q = self._pop((subject, difficulty, topic), used_ids)
+            if q is not None:
+                self.requests += 1
+                self.pool_hits += 1
+                self._kick(subject, difficulty)
+            return q
+
+    def request(self, subject, difficulty, topic, used_ids=()):
+        """Future resolving to a question unseen in ``used_ids``, or None if generation failed."""
+        fut = Future()
+        with self._lock:
+            self.requests += 1
+            q = self._pop((subject, difficulty, topic), used_ids)
+            if q is not None:
+                self.pool_hits += 1
+                fut.set_result(q)
+            else:
+                self._waiters.setdefault((subject, difficulty), []).append((topic, set(used_ids), fut))
+                self._want_spares((subject, difficulty, topic))
+            self._kick(subject, difficulty)
+        return fut
+
+    def request_many(self, subject, difficulty, topics, used_ids=()):
+        return [self.request(subject, difficulty, t, used_ids) for t in topics]
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "pool_hits": self.pool_hits, "calls": self.calls,
+                    "generated": self.generated,
+                    "pooled": sum(len(p) for p in self._pools.values()),
+                    "waiting": sum(len(w) for w in self._waiters.values())}
+
+    def _pop(self, key, used_ids):
+        pool = self._pools.get(key)
+        if not pool:
+            return None
+        for i, q in enumerate(pool):
+            if q["id"] not in used_ids:
+                del pool[i]
+                self._want_spares(key)
+                return dict(q)
+        return None
+
+    def _want_spares(self, key):
+        """Note that ``key``'s hot pool should be topped back up."""
+        missing = self.hot_size - len(self._pools.get(key, ()))
+        if missing > 0:
+            subject, difficulty, topic = key
+            self._refill.setdefault((subject, difficulty), {})[topic] = missing
+
+    def _kick(self, subject, difficulty):
+        """Start the batch loop for (subject, difficulty) unless it is already running."""
+        sd = (subject, difficulty)
+        if sd in self._running or not (self._waiters.get(sd) or self._refill.get(sd)):
+            return
+        self._running.add(sd)
+        self._executor.submit(self._run, subject, difficulty)
+
+    def _next_batch(self, sd):
+        """Up to ``max_batch`` waiting requests plus spares, as (topics, waiters)."""
+        waiters = self._waiters.pop(sd, [])
+        batch, rest = waiters[:self.max_batch], waiters[self.max_batch:]
+        if rest:
+            self._waiters[sd] = rest
+        topics = [t for t, _, _ in batch]
+        refill = self._refill.get(sd, {})
+        for topic in list(refill):
+            room = self.max_batch - len(topics)
+            if room <= 0:
+                break
+            n = min(refill.pop(topic), room)
+            topics += [topic] * n
+        if not refill:
+            self._refill.pop(sd, None)
+        return topics, batch
+
+    def _run(self, subject, difficulty):
+        sd = (subject, difficulty)
+        time.sleep(self.linger)
+        while True:
+            with self._lock:
+                topics, batch = self._next_batch(sd)
+                if not topics:
+                    self._running.discard(sd)
+                    return
+            try:
+                qs = self.generate_batch(subject, topics, difficulty) or []
+            except Exception:
+                qs = []
+            with self._lock:
+                self.calls += 1
+                self.generated += len(qs)
+                for q in qs:
+                    self._pools.setdefault((subject, difficulty, q.get("topic", "General")), deque()).append(q)
+                for topic, used_ids, fut in batch:
+                    if not fut.cancelled():
+                        fut.set_result(self._serve(subject, difficulty, topic, used_ids))
+                if not qs:
+                    # Don't retry a failing batch forever; the next request will
+                    self._refill.pop(sd, None)
+
+    def _serve(self, subject, difficulty, topic, used_ids):
+        """A question for one waiter: its own topic if possible, else any spare of the subject."""
+        q = self._pop((subject, difficulty, topic), used_ids)
+        if q is not None:
+            return q
+        for key in list(self._pools):
+            if key[:2] == (subject, difficulty):
+                q = self._pop(key, used_ids)
+                if q is not None:
+                    return q
+        return None
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
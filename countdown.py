@@ -0,0 +1,23 @@
+"""Client-side countdown for timed questions.
+
+The browser counts down on its own and sends a single event when time runs
+out, so a ticking timer costs the server nothing between answers:
+
+    if countdown(quiz.time_left(), token=str(quiz.timer_start), key=f"timer_{idx}"):
+        ...  # expired
+"""
+import os
+
+import streamlit.components.v1 as components
+
+_FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "countdown")
+_component = components.declare_component("countdown", path=_FRONTEND)
+
+
+def countdown(seconds_left, token, key):
+    """Show the timer; True once the browser reports that this ``token``'s time has run out.
+
+    ``token`` identifies one question's countdown, so an expiry reported for
+    an earlier question (or quiz) under the same ``key`` is ignored.
+    """
+    return _component(seconds_left=seconds_left, token=token, key=key, default=None) == token
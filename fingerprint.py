@@ -0,0 +1,111 @@
+"""Question identity: normalised content fingerprints and near-duplicate detection.
+
+``fingerprint`` is the one id used for a question everywhere (session dedup,
+question store, bank file). It is stable across processes, unlike ``hash()``,
+and ignores differences in case, whitespace, option lettering and option order.
+
+``NearDuplicateFilter`` catches rewordings the fingerprint can't: it keeps a
+MinHash signature of each question's word shingles and uses LSH banding, so
+checking a new question only compares it against the few that share a band.
+"""
+import hashlib
+import random
+import re
+import struct
+import unicodedata
+
+_OPTION_PREFIX = re.compile(r"^\(?[A-Da-d]\s*[).:]\s*")
+_NON_WORD = re.compile(r"[^\w\s]")
+_SPACE = re.compile(r"\s+")
+
+NUM_PERM = 32
+BANDS = 8            # NUM_PERM // BANDS rows per band
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(_MERSENNE)) for _ in range(NUM_PERM)]
+
+
+def canonical(text):
+    """Case-, width- and whitespace-insensitive form of ``text``."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _SPACE.sub(" ", text).strip()
+
+
+def canonical_option(opt):
+    return canonical(_OPTION_PREFIX.sub("", opt.strip()))
+
+
+def fingerprint(q):
+    """Stable 20-hex-digit id of a question's text and (unordered) options."""
+    h = hashlib.sha1(canonical(q["question"]).encode("utf-8"))
+    for opt in sorted(canonical_option(o) for o in q.get("options", [])):
+        h.update(b"\x1f")
+        h.update(opt.encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def shingles(text, k=2):
+    """Word ``k``-grams of the canonical text (the whole text if it is shorter)."""
+    words = _NON_WORD.sub(" ", canonical(text)).split()
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(q):
+    """MinHash signature of a question's text and options."""
+    text = q["question"] + " " + " ".join(sorted(canonical_option(o) for o in q.get("options", [])))
+    hashes = [struct.unpack("<Q", hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest())[0]
+              for s in shingles(text)]
+    return tuple(min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMS)
+
+
+class NearDuplicateFilter:
+    """LSH index of MinHash signatures; flags questions too similar to one already added."""
+
+    def __init__(self, threshold=0.8):
+        self.threshold = threshold
+        self._rows = NUM_PERM // BANDS
+        self._buckets = {}   # (band, band signature) -> fingerprints
+        self._sigs = {}      # fingerprint -> signature
+
+    def __len__(self):
+        return len(self._sigs)
+
+    def _bands(self, sig):
+        r = self._rows
+        return [(b, sig[b * r:(b + 1) * r]) for b in range(BANDS)]
+
+    def similar(self, q, sig=None):
+        """Fingerprint of an added question at least ``threshold`` similar to ``q``, or None."""
+        sig = sig or minhash(q)
+        seen = set()
+        for band in self._bands(sig):
+            for fp in self._buckets.get(band, ()):
+                if fp in seen:
+                    continue
+                seen.add(fp)
+                other = self._sigs[fp]
+                if sum(x == y for x, y in zip(sig, other)) / NUM_PERM >= self.threshold:
+                    return fp
+        return None
+
+    def add(self, q, fp=None, sig=None):
+        fp = fp or q.get("id") or fingerprint(q)
+        if fp in self._sigs:
+            return
+        sig = sig or minhash(q)
+        self._sigs[fp] = sig
+        for band in self._bands(sig):
+            self._buckets.setdefault(band, []).append(fp)
+
+    def check_and_add(self, q):
+        """Add ``q`` unless it near-duplicates an earlier question; returns True if added."""
+        fp = q.get("id") or fingerprint(q)
+        if fp in self._sigs:
+            return False
+        sig = minhash(q)
+        if self.similar(q, sig):
+            return False
+        self.add(q, fp, sig)
+        return True
@@ -0,0 +1,252 @@
+"""Headless load test: many virtual students using one app process at once.
+
+Each virtual student drives the real app.py through Streamlit's AppTest,
+from the home page through a whole Quick, CBT or Topic quiz to the results
+page, against offline stub models. All students share one process, and with
+it the question store, bank, prefetch pool and broker, as on a single pod.
+
+AppTest swaps in a process-wide mock runtime for every script run, so runs
+are serialised here; model calls, prefetch, warm-up and think time still
+overlap across students, and step latencies include the wait for a turn:
+
+    python loadtest.py --students 40 --concurrency 20 --latency 0.8
+    python loadtest.py --students 200 --concurrency 100 --think 5 --out load.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark import percentile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "app.py")
+MODES = ("quick", "cbt", "topic")
+
+_run_lock = threading.Lock()
+
+
+def rss_bytes():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryMonitor:
+    """Samples RSS in the background and tracks the peak."""
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.baseline = rss_bytes()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-monitor", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+class Recorder:
+    """Thread-safe latency samples, in seconds, per (mode, step)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.active = 0
+        self.max_active = 0
+
+    def add(self, mode, step, seconds):
+        with self._lock:
+            self.samples.setdefault((mode, step), []).append(seconds)
+
+    def timed(self, mode, step, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.add(mode, step, time.perf_counter() - start)
+        return result
+
+    def enter(self):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+
+
+def new_session(cfg):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=cfg.timeout)
+    at.secrets["STUB_MODEL"] = cfg.stub
+    at.secrets["MODEL_DEFAULT_RPM"] = cfg.rpm
+    return at
+
+
+def run(target):
+    """Rerun the script for an AppTest or one of its (just changed) widgets; raise on app errors."""
+    with _run_lock:
+        at = target.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+def run_student(n, mode, cfg, rec):
+    """One student: sign in, configure and take a quiz in ``mode``, open the results, go home."""
+    rng = random.Random(cfg.seed + n)
+    rec.enter()
+    try:
+        at = new_session(cfg)
+        rec.timed(mode, "home", lambda: run(at))
+        if not cfg.anonymous:
+            at.text_input(key="student_input").input(f"load-{n}")
+            rec.timed(mode, "sign_in", lambda: run(at.button(key="student_go").click()))
+        run(at.button(key=f"mode_{mode}").click())
+
+        if mode == "quick":
+            at.selectbox(key="sel_subj").set_value(rng.choice(cfg.subjects))
+            start = "start_quick"
+        elif mode == "cbt":
+            at.multiselect(key="cbt_pick").set_value(rng.sample(cfg.subjects, min(4, len(cfg.subjects))))
+            at.slider(key="cbt_qs").set_value(cfg.cbt_per_subject)
+            start = "start_cbt"
+        else:
+            subject = rng.choice(cfg.subjects)
+            at.selectbox(key="tp_subj").set_value(subject)
+            run(at)
+            at.slider(key="tp_nqs").set_value(cfg.topic_questions)
+            start = "start_topic"
+        rec.timed(mode, "first_question", lambda: run(at.button(key=start).click()))
+        if at.session_state.stage != "quiz":
+            raise RuntimeError("quiz did not start")
+
+        total = at.session_state.quiz.total_qs
+        for i in range(total):
+            if cfg.think:
+                time.sleep(rng.expovariate(1 / cfg.think))
+            radio = at.radio(key=f"choice_{i}")
+            radio.set_value(rng.choice(radio.options))
+            rec.timed(mode, "submit", lambda: run(at.button(key=f"submit_{i}").click()))
+            if i + 1 < total:
+                rec.timed(mode, "next_question", lambda: run(at.button(key="next_q").click()))
+        rec.timed(mode, "results", lambda: run(at.button(key="to_results").click()))
+        run(at.button(key="new_quiz").click())
+        return total
+    finally:
+        rec.leave()
+
+
+def summarise(samples):
+    out = {}
+    for (mode, step), values in sorted(samples.items()):
+        values = sorted(values)
+        out.setdefault(mode, {})[step] = {
+            "count": len(values),
+            **{f"p{int(q * 100)}_ms": round(percentile(values, q) * 1000, 2) for q in (0.5, 0.95, 0.99)},
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent students against one app process.")
+    parser.add_argument("--students", type=int, default=20, help="virtual students in total")
+    parser.add_argument("--concurrency", type=int, default=10, help="students active at the same time")
+    parser.add_argument("--modes", nargs="*", default=list(MODES), choices=MODES,
+                        help="quiz modes, assigned round-robin")
+    parser.add_argument("--subjects", nargs="*", default=["Mathematics", "English Language", "Physics",
+                                                          "Chemistry", "Biology", "Economics"])
+    parser.add_argument("--cbt-per-subject", type=int, default=5)
+    parser.add_argument("--topic-questions", type=int, default=5)
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a student thinks per answer")
+    parser.add_argument("--latency", type=float, default=0.5, help="median stub model latency in seconds")
+    parser.add_argument("--spread", type=float, default=0.4)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=100_000, help="per-model request quota the scheduler enforces")
+    parser.add_argument("--anonymous", action="store_true", help="skip signing in, so nothing is persisted")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per script run")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="write the report as JSON to this file")
+    cfg = parser.parse_args(argv)
+    cfg.stub = (f"latency={cfg.latency},spread={cfg.spread},error_rate={cfg.error_rate},"
+                f"rate_limit_rate={cfg.rate_limit_rate},seed={cfg.seed}")
+
+    out = os.path.abspath(cfg.out) if cfg.out else None
+    from streamlit.logger import set_log_level
+    set_log_level(logging.ERROR)
+    rec = Recorder()
+    errors, questions = [], 0
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="smartprep-load-") as workdir:
+        # Stores, bank and progress go to ./.smartprep: keep them out of the checkout
+        os.chdir(workdir)
+        try:
+            with MemoryMonitor() as mem, ThreadPoolExecutor(max_workers=cfg.concurrency) as pool:
+                start = time.perf_counter()
+                futures = {pool.submit(run_student, n, cfg.modes[n % len(cfg.modes)], cfg, rec): n
+                           for n in range(cfg.students)}
+                for fut, n in futures.items():
+                    try:
+                        questions += fut.result()
+                    except Exception as e:
+                        errors.append(f"student {n}: {type(e).__name__}: {e}")
+                elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    done = cfg.students - len(errors)
+    report = {
+        "config": {k: v for k, v in vars(cfg).items() if k != "out"},
+        "seconds": round(elapsed, 3),
+        "sessions_completed": done,
+        "sessions_failed": len(errors),
+        "sessions_per_s": round(done / elapsed, 3) if elapsed else None,
+        "questions_per_s": round(questions / elapsed, 3) if elapsed else None,
+        "max_concurrent_sessions": rec.max_active,
+        "rss_baseline_bytes": mem.baseline,
+        "rss_peak_bytes": mem.peak,
+        "rss_per_session_bytes": (mem.peak - mem.baseline) // max(rec.max_active, 1),
+        "latency": summarise(rec.samples),
+        "errors": errors[:20],
+    }
+    print(f"{done}/{cfg.students} sessions in {elapsed:.1f}s · {report['sessions_per_s']} sessions/s · "
+          f"{report['questions_per_s']} questions/s · "
+          f"~{report['rss_per_session_bytes'] / 1e6:.1f} MB per concurrent session")
+    for mode, steps in report["latency"].items():
+        for step, s in steps.items():
+            print(f"  {mode:6} {step:15} n={s['count']:5}  p50 {s['p50_ms']:9.1f} ms  "
+                  f"p95 {s['p95_ms']:9.1f} ms  p99 {s['p99_ms']:9.1f} ms")
+    for line in errors[:5]:
+        print(f"  ! {line}")
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Per-student answer history as rolling aggregates.
+
+``MasteryTracker`` is updated in O(1) per answer and is all the home page
+needs for recommendations. The raw answers go to the progress store's
+events table.
+"""
+import time
+
+HALF_LIFE_DAYS = 14      # weight of an answer halves every two weeks
+WEAK_BELOW = 0.5         # mastery under this flags a topic for review ...
+WEAK_MIN_ATTEMPTS = 2    # ... once it has been attempted this many times
+
+
+class TopicStats:
+    """Counters for one (subject, topic)."""
+
+    __slots__ = ("attempts", "correct", "w_correct", "w_total", "last_seen")
+
+    def __init__(self):
+        self.attempts = 0
+        self.correct = 0
+        self.w_correct = 0.0   # time-decayed correct count
+        self.w_total = 0.0     # time-decayed attempt count
+        self.last_seen = 0.0
+
+    @property
+    def mastery(self):
+        """Recency-weighted share of correct answers."""
+        return self.w_correct / self.w_total if self.w_total else 0.0
+
+    def update(self, correct, ts):
+        if self.last_seen:
+            decay = 0.5 ** (max(0.0, ts - self.last_seen) / (HALF_LIFE_DAYS * 86400))
+            self.w_correct *= decay
+            self.w_total *= decay
+        self.attempts += 1
+        self.w_total += 1.0
+        if correct:
+            self.correct += 1
+            self.w_correct += 1.0
+        self.last_seen = max(self.last_seen, ts)
+
+
+class MasteryTracker:
+    """Rolling per-subject / per-topic aggregates with an always-current weak-topic set.
+
+    Decay scales both weighted counters equally, so a topic's mastery only
+    changes when it is answered; that keeps the weak set exact with O(1) work
+    per answer instead of a rescan on every page load.
+    """
+
+    def __init__(self):
+        self.topics = {}     # (subject, topic) -> TopicStats
+        self.subjects = {}   # subject -> [attempts, correct]
+        self._weak = set()
+
+    def __bool__(self):
+        return bool(self.topics)
+
+    def record(self, subject, topic, correct, ts=None):
+        ts = ts or time.time()
+        key = (subject, topic)
+        stats = self.topics.get(key)
+        if stats is None:
+            stats = self.topics[key] = TopicStats()
+        stats.update(correct, ts)
+        subj = self.subjects.setdefault(subject, [0, 0])
+        subj[0] += 1
+        subj[1] += int(bool(correct))
+        if stats.attempts >= WEAK_MIN_ATTEMPTS and stats.mastery < WEAK_BELOW:
+            self._weak.add(key)
+        else:
+            self._weak.discard(key)
+
+    @property
+    def subjects_tried(self):
+        return len(self.subjects)
+
+    def weak_topics(self, limit=5):
+        """[(subject, topic, mastery %, attempts)] weakest first."""
+        weak = [(s, t, int(self.topics[(s, t)].mastery * 100), self.topics[(s, t)].attempts)
+                for s, t in self._weak]
+        weak.sort(key=lambda x: x[2])
+        return weak[:limit]
+
+    def to_dict(self):
+        return {"topics": [[s, t, v.attempts, v.correct, v.w_correct, v.w_total, v.last_seen]
+                           for (s, t), v in self.topics.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        tracker = cls()
+        for s, t, attempts, correct, w_correct, w_total, last_seen in data.get("topics", []):
+            stats = tracker.topics[(s, t)] = TopicStats()
+            stats.attempts, stats.correct = attempts, correct
+            stats.w_correct, stats.w_total, stats.last_seen = w_correct, w_total, last_seen
+            subj = tracker.subjects.setdefault(s, [0, 0])
+            subj[0] += attempts
+            subj[1] += correct
+            if attempts >= WEAK_MIN_ATTEMPTS and stats.mastery < WEAK_BELOW:
+                tracker._weak.add((s, t))
+        return tracker
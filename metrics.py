@@ -0,0 +1,250 @@
+"""In-process counters and latency histograms with Prometheus text export.
+
+Metrics live in one process-wide ``REGISTRY``. Creating a metric that
+already exists returns the existing one, so app.py can declare its metrics
+at module level and keep their values across Streamlit reruns. Read them
+from a local endpoint or a periodically rewritten file:
+
+    METRICS_PORT = 9464                  # curl http://127.0.0.1:9464/metrics
+    METRICS_FILE = ".smartprep/metrics.prom"
+"""
+import atexit
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a cached draw (milliseconds) up to a slow batched generation
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _matching(self, match):
+        idx = [(self.labelnames.index(k), str(v)) for k, v in match.items()]
+        return [(key, v) for key, v in self._values.items() if all(key[i] == want for i, want in idx)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._render_samples()
+        return lines
+
+    def _render_samples(self):
+        return [f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(v)}"
+                for key, v in sorted(self._values.items())]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self, **match):
+        """Sum over every label set matching ``match``."""
+        with self._lock:
+            return sum(v for _, v in self._matching(match))
+
+
+class Gauge(Metric):
+    """A value that is set directly, or computed by ``fn`` at export time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _render_samples(self):
+        if self.fn is not None:
+            return [f"{self.name} {_fmt_value(float(self.fn()))}"]
+        return super()._render_samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][bisect.bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the ``with`` block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **match):
+        with self._lock:
+            return sum(state[2] for _, state in self._matching(match))
+
+    def percentile(self, q, **match):
+        """Estimate the ``q`` quantile (0-1) by interpolating within buckets; None without data."""
+        with self._lock:
+            states = [state for _, state in self._matching(match)]
+        counts = [sum(s[0][i] for s in states) for i in range(len(self.buckets) + 1)]
+        n = sum(counts)
+        if not n:
+            return None
+        rank, seen = q * n, 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lo = self.buckets[i - 1] if i else 0.0
+                hi = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lo + (hi - lo) * (rank - seen) / c
+            seen += c
+        return self.buckets[-1]
+
+    def _render_samples(self):
+        lines = []
+        for key, (counts, total, n) in sorted(self._values.items()):
+            cum = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', _fmt_value(le))])} {cum}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=(), fn=None):
+        gauge = self._get(Gauge, name, help, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for m in metrics:
+            lines += m.render()
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        """Atomically write the current metrics to ``path``."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+    def dump_every(self, path, interval=15.0):
+        """Rewrite ``path`` every ``interval`` seconds and once more at exit."""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.dump(path)
+
+        threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+        atexit.register(self.dump, path)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve ``/metrics`` from a daemon thread; returns the server."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+def ratio(numerator, denominator):
+    """``numerator / denominator`` for zero-argument callables, 0 while the denominator is 0."""
+    def fn():
+        d = denominator()
+        return numerator() / d if d else 0.0
+    return fn
@@ -0,0 +1,259 @@
+"""Offline bulk pre-generation of questions for the past-question bank.
+
+Walks every subject x topic x difficulty key and asks the model for questions
+until each key holds ``--per-key`` (counting what the bank already has). The
+questions go to their own bank file, ``.smartprep/pregen_bank.spqb``; the app
+merges it into the bank that ``get_bank_question`` and the adaptive index
+draw from, and picks up a new run without a restart. Run it overnight before
+a busy period:
+
+    python pregen.py --per-key 20 --workers 8
+    python pregen.py --per-key 20 --subjects Physics Chemistry --difficulties Hard
+    python pregen.py --per-key 5 --stub latency=0.05      # offline, against stub models
+
+Every accepted question is appended to a JSON Lines checkpoint as soon as
+it is generated, so an interrupted run picks up where it stopped: rerun the
+same command. The checkpoint is removed once its questions are in the output
+file; later runs add to that file. Questions are checked before they are
+kept; exact and near duplicates of the bank, earlier runs or earlier
+questions of this run are dropped.
+"""
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from bank_file import BankFile, write_bank
+from fingerprint import NearDuplicateFilter, fingerprint
+from scheduler import WARMUP
+
+DEFAULT_OUT = os.path.join(".smartprep", "pregen_bank.spqb")
+DEFAULT_CHECKPOINT = os.path.join(".smartprep", "pregen.jsonl")
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+MIN_EXPLANATION = 20   # characters; shorter explanations are not worth keeping in the bank
+
+
+def acceptable(q):
+    """Bank-worthy beyond parsing: four distinct options and a real explanation."""
+    texts = {o[3:].strip().casefold() for o in q["options"]}
+    return len(texts) == 4 and len(q["explanation"]) >= MIN_EXPLANATION and q["question"] not in texts
+
+
+def read_checkpoint(path):
+    """Questions accepted by earlier runs, each with its ``subject``."""
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                pass   # a line cut short by the interruption
+    return out
+
+
+def load_bank(path=None):
+    """``{subject: [question, ...]}`` from a bank file, or from the built-in seed without one."""
+    if path:
+        bf = BankFile(path)
+        bank = bf.to_dict()
+        bf.close()
+        return bank
+    from bank_seed import JAMB_QUESTION_BANK
+
+    return {s: [dict(q, id=q.get("id") or fingerprint(q)) for q in qs] for s, qs in JAMB_QUESTION_BANK.items()}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# RUN
+# ──────────────────────────────────────────────────────────────────────────────
+class Pregen:
+    """One pre-generation run: the key grid, what each key still needs, and the checkpoint.
+
+    ``bank`` is what the app serves besides pre-generated questions, and
+    ``generated`` the output file's questions from earlier runs; both count
+    towards each key. Workers only call the model; validation, dedup and the
+    checkpoint are handled on the calling thread as their results come in.
+    """
+
+    def __init__(self, bank, generated, checkpoint, near_dup_threshold=0.8, log=print):
+        self.log = log
+        self.checkpoint = checkpoint
+        self.counts = Counter()   # (subject, difficulty, topic) -> questions held
+        self.seen = set()
+        self.similar = {}         # subject -> NearDuplicateFilter
+        self.threshold = near_dup_threshold
+        self.added = {}           # subject -> questions for the output file
+        self.new = 0              # of which not in the output file yet
+        self.rejected = Counter()
+        for subject, qs in generated.items():
+            for q in qs:
+                self._add(subject, q)
+        for q in read_checkpoint(checkpoint):
+            subject = q.pop("subject")
+            if q["id"] not in self.seen:
+                self._add(subject, q)
+                self.new += 1
+        if self.new:
+            log(f"Resuming: {self.new} questions from {checkpoint}")
+        for subject, qs in bank.items():
+            for q in qs:
+                if q["id"] not in self.seen:
+                    self._keep(subject, q)
+        if os.path.dirname(checkpoint):
+            os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+        self._out = open(checkpoint, "a", encoding="utf-8")
+
+    def _add(self, subject, q):
+        self._keep(subject, q)
+        self.added.setdefault(subject, []).append(q)
+
+    def _keep(self, subject, q):
+        self.counts[(subject, q.get("difficulty", "Medium"), q.get("topic", "General"))] += 1
+        self.seen.add(q["id"])
+        if self.threshold:
+            if subject not in self.similar:
+                self.similar[subject] = NearDuplicateFilter(self.threshold)
+            self.similar[subject].add(q)
+
+    def missing(self, subjects, difficulties, per_key):
+        """``(subject, difficulty, topic, n)`` for every key short of ``per_key`` questions."""
+        from app import JAMB_SUBJECTS
+
+        return [(subject, difficulty, topic, per_key - self.counts[(subject, difficulty, topic)])
+                for subject in subjects for difficulty in difficulties
+                for topic in JAMB_SUBJECTS[subject]["topics"]
+                if self.counts[(subject, difficulty, topic)] < per_key]
+
+    def accept(self, subject, difficulty, topic, qs):
+        """Check, dedup and checkpoint one key's new questions; returns how many were kept."""
+        kept = 0
+        for q in qs:
+            if not acceptable(q):
+                self.rejected["invalid"] += 1
+                continue
+            if q["id"] in self.seen:
+                self.rejected["duplicate"] += 1
+                continue
+            if self.threshold and subject in self.similar and self.similar[subject].similar(q):
+                self.rejected["near_duplicate"] += 1
+                continue
+            q = {k: q[k] for k in ("id", "question", "options", "answer", "explanation")}
+            q.update(topic=topic, difficulty=difficulty)
+            self._add(subject, q)
+            self.new += 1
+            self._out.write(json.dumps(dict(q, subject=subject), ensure_ascii=False) + "\n")
+            kept += 1
+        self._out.flush()
+        os.fsync(self._out.fileno())
+        return kept
+
+    def run(self, model, keys, workers, batch_size, attempts):
+        """Fill ``keys`` from ``missing``, retrying short keys up to ``attempts`` calls each."""
+        from app import generate_ai_batch, generate_ai_question
+
+        def generate(subject, difficulty, topic, n):
+            if n == 1:
+                q = generate_ai_question(model, subject, topic, difficulty, priority=WARMUP)
+                return [q] if q else []
+            return generate_ai_batch(model, subject, [topic] * n, difficulty, priority=WARMUP)
+
+        done, total, start = 0, len(keys), time.time()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pregen") as pool:
+            pending = {}
+            for subject, difficulty, topic, n in keys:
+                for i in range(0, n, batch_size):
+                    want = min(batch_size, n - i)
+                    pending[pool.submit(generate, subject, difficulty, topic, want)] = \
+                        (subject, difficulty, topic, want, 1)
+            try:
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        subject, difficulty, topic, want, attempt = pending.pop(fut)
+                        kept = self.accept(subject, difficulty, topic, fut.result())
+                        if kept < want and attempt < attempts:
+                            pending[pool.submit(generate, subject, difficulty, topic, want - kept)] = \
+                                (subject, difficulty, topic, want - kept, attempt + 1)
+                            continue
+                        if not any(k[:3] == (subject, difficulty, topic) for k in pending.values()):
+                            done += 1
+                            self.log(f"[{done}/{total}] {subject} / {difficulty} / {topic}: "
+                                     f"{self.counts[(subject, difficulty, topic)]} questions "
+                                     f"({time.time() - start:.0f}s)")
+            except KeyboardInterrupt:
+                for fut in pending:
+                    fut.cancel()
+                raise
+
+    def write(self, path):
+        """Write every pre-generated question to ``path`` and drop the checkpoint; returns the count."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and swapped in, so the app never opens a half-written file
+        tmp = path + ".tmp"
+        count = write_bank(tmp, self.added)
+        os.replace(tmp, path)
+        self.close()
+        os.remove(self.checkpoint)
+        return count
+
+    def close(self):
+        if not self._out.closed:
+            self._out.close()
+
+
+def main(argv=None):
+    from app import BANK_PATH, JAMB_SUBJECTS, NEAR_DUP_THRESHOLD, get_setting
+
+    parser = argparse.ArgumentParser(description="Pre-generate questions for the SmartPrep bank.")
+    parser.add_argument("--bank", default=get_setting("BANK_PATH", BANK_PATH),
+                        help="bank the questions add to, for counts and dedup (default: BANK_PATH, else bank_seed)")
+    parser.add_argument("--out", default=get_setting("PREGEN_BANK_PATH", DEFAULT_OUT),
+                        help="pre-generated bank file the app merges in (default: %(default)s)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="resume file (default: %(default)s)")
+    parser.add_argument("--subjects", nargs="*", choices=list(JAMB_SUBJECTS), help="default: all")
+    parser.add_argument("--difficulties", nargs="*", choices=DIFFICULTIES, default=list(DIFFICULTIES))
+    parser.add_argument("--per-key", type=int, default=10, help="questions wanted per subject/difficulty/topic")
+    parser.add_argument("--batch-size", type=int, default=5, help="questions asked for per model call")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent model calls")
+    parser.add_argument("--attempts", type=int, default=3, help="calls per batch before a key is left short")
+    parser.add_argument("--near-dup", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="MinHash similarity counted as a repeat; 0 disables (default: %(default)s)")
+    parser.add_argument("--stub", metavar="OPTIONS",
+                        help='use offline stub models, e.g. "latency=0.05" (see stub_model.py)')
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        os.environ["SMARTPREP_STUB_MODEL"] = args.stub
+    from app import get_model
+
+    model = get_model()
+    if model is None:
+        parser.error("no Gemini model available; set GEMINI_API_KEY in .streamlit/secrets.toml or pass --stub")
+
+    # The default bank file is built from bank_seed plus this tool's output, so count against the seed
+    run = Pregen(load_bank(args.bank if args.bank != BANK_PATH else None),
+                 load_bank(args.out) if os.path.exists(args.out) else {}, args.checkpoint, args.near_dup)
+    keys = run.missing(args.subjects or list(JAMB_SUBJECTS), args.difficulties, args.per_key)
+    print(f"{len(keys)} keys need {sum(k[3] for k in keys)} questions")
+    try:
+        run.run(model, keys, max(1, args.workers), max(1, args.batch_size), max(1, args.attempts))
+    except KeyboardInterrupt:
+        run.close()
+        print(f"\nInterrupted; progress is saved in {args.checkpoint}. Run the same command to resume.")
+        return 130
+    short = run.missing(args.subjects or list(JAMB_SUBJECTS), args.difficulties, args.per_key)
+    rejected = ", ".join(f"{n} {why}" for why, n in run.rejected.items()) or "none"
+    print(f"{run.new} new questions (rejected: {rejected}); {len(short)} keys still short")
+    if run.new:
+        print(f"Wrote {run.write(args.out)} pre-generated questions to {args.out}")
+    run.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,162 @@
+"""Durable per-student progress with write-behind persistence.
+
+A student's whole state (XP, streak, achievements, mastery aggregates) is one
+JSON row keyed by student id, so a session loads with a single primary-key
+read. Answer events go to an append-only table. ``WriteBehindStore`` keeps all
+writes off the render path: it coalesces state saves per student, batches
+events, and flushes both in one transaction from a background thread.
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    student_id  TEXT PRIMARY KEY,
+    state       TEXT NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    student_id  TEXT NOT NULL,
+    ts          REAL NOT NULL,
+    subject     TEXT NOT NULL,
+    topic       TEXT NOT NULL,
+    correct     INTEGER NOT NULL,
+    difficulty  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_student ON events (student_id, ts);
+"""
+
+DEFAULT_PATH = os.path.join(".smartprep", "progress.db")
+
+
+class ProgressStore:
+    """Interface every progress backend implements."""
+
+    def load(self, student_id):
+        """The saved state dict for ``student_id``, or None for a new student."""
+        raise NotImplementedError
+
+    def write_batch(self, states, events):
+        """Persist ``{student_id: state}`` and ``[(student_id, ts, subject, topic, correct, difficulty)]``."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLiteProgressStore(ProgressStore):
+    """Local SQLite backend; WAL journaling keeps the file consistent across crashes."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def load(self, student_id):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM students WHERE student_id = ?",
+                                     (student_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write_batch(self, states, events):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO students (student_id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(student_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                [(sid, json.dumps(state), now) for sid, state in states.items()])
+            self._conn.executemany(
+                "INSERT INTO events (student_id, ts, subject, topic, correct, difficulty) "
+                "VALUES (?, ?, ?, ?, ?, ?)", events)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+BACKENDS = {"sqlite": SQLiteProgressStore}
+
+
+class WriteBehindStore:
+    """Buffers writes for ``backend`` and flushes them asynchronously.
+
+    ``save`` and ``append_event`` only touch an in-memory buffer. A daemon
+    thread flushes every ``interval`` seconds, or sooner once ``max_batch``
+    events are waiting; pending writes are also flushed at interpreter exit.
+    """
+
+    def __init__(self, backend, interval=2.0, max_batch=500):
+        self.backend = backend
+        self.interval = interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._states = {}
+        self._events = []
+        self._closed = False
+        self.flushes = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def load(self, student_id):
+        """Read-your-writes: a state still waiting in the buffer wins over the backend."""
+        with self._lock:
+            pending = self._states.get(student_id)
+        return pending if pending is not None else self.backend.load(student_id)
+
+    def save(self, student_id, state):
+        with self._lock:
+            self._states[student_id] = state
+
+    def append_event(self, student_id, ts, subject, topic, correct, difficulty):
+        with self._lock:
+            self._events.append((student_id, ts, subject, topic, int(bool(correct)), difficulty))
+            if len(self._events) >= self.max_batch:
+                self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            states, self._states = self._states, {}
+            events, self._events = self._events, []
+        if not states and not events:
+            return
+        try:
+            self.backend.write_batch(states, events)
+            self.flushes += 1
+        except Exception:
+            # Put the batch back (newer saves win) and retry on the next tick
+            self.errors += 1
+            with self._lock:
+                self._states = {**states, **self._states}
+                self._events = events + self._events
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self.backend.close()
+
+
+def open_store(kind="sqlite", **options):
+    """Write-behind store over the backend registered as ``kind``."""
+    interval = options.pop("interval", 2.0)
+    return WriteBehindStore(BACKENDS[kind](**options), interval=interval)
@@ -0,0 +1,240 @@
+"""On-disk store of AI-generated questions, shared by every session and restart.
+
+Questions are keyed by (subject, difficulty, topic) and identified by their
+content fingerprint, so the same question is only ever stored once. With a
+similarity threshold set, close rewordings of a stored question are refused
+too. Run this file directly to inspect, evict or warm up the store:
+
+    python question_store.py stats
+    python question_store.py evict
+    python question_store.py warm --subjects Mathematics Physics   # up to the serving threshold
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from fingerprint import NearDuplicateFilter, fingerprint
+from scheduler import WARMUP
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id          TEXT PRIMARY KEY,
+    subject     TEXT NOT NULL,
+    difficulty  TEXT NOT NULL,
+    topic       TEXT NOT NULL,
+    body        TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    last_used   REAL NOT NULL,
+    uses        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_questions_key ON questions (subject, difficulty, topic, uses);
+CREATE INDEX IF NOT EXISTS idx_questions_lru ON questions (last_used);
+"""
+
+DEFAULT_PATH = os.path.join(".smartprep", "questions.db")
+DEFAULT_MAX_ROWS = 50_000
+DEFAULT_MAX_AGE_DAYS = 180
+EVICT_EVERY = 200       # inserts between automatic eviction passes
+MIN_POOL = 20           # questions a key holds before sessions are served from it instead of the model
+
+
+class QuestionStore:
+    """Thread-safe SQLite pool of questions with size and age limits.
+
+    A key is served from once it holds ``min_pool`` questions; until then
+    sessions keep generating new ones to fill it.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_rows=DEFAULT_MAX_ROWS, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 near_dup_threshold=None, min_pool=MIN_POOL):
+        self.path = path
+        self.min_pool = min_pool
+        self.max_rows = max_rows
+        self.max_age = max_age_days * 86400
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._inserts = 0
+        self.near_dup_threshold = near_dup_threshold
+        self._similar = {}   # key -> NearDuplicateFilter, loaded on first insert for the key
+
+    def add(self, subject, difficulty, q):
+        """Store ``q``; returns False if it (or a near-duplicate) is already stored."""
+        return self.add_many(subject, difficulty, [q]) == 1
+
+    def add_many(self, subject, difficulty, questions):
+        """Store several questions in one transaction; returns how many were new."""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for q in questions:
+                topic = q.get("topic", "General")
+                if self.near_dup_threshold and not self._filter(subject, difficulty, topic).check_and_add(q):
+                    continue
+                body = {k: v for k, v in q.items() if not k.startswith("_") and k not in ("source", "id")}
+                rows.append((q.get("id") or fingerprint(q), subject, difficulty, topic,
+                             json.dumps(body, ensure_ascii=False), now, now))
+            before = self._conn.total_changes
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO questions "
+                    "(id, subject, difficulty, topic, body, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            added = self._conn.total_changes - before
+            self._inserts += added
+            due = self._inserts >= EVICT_EVERY
+            if due:
+                self._inserts = 0
+        if due:
+            self.evict()
+        return added
+
+    def _filter(self, subject, difficulty, topic):
+        key = (subject, difficulty, topic)
+        flt = self._similar.get(key)
+        if flt is None:
+            flt = self._similar[key] = NearDuplicateFilter(self.near_dup_threshold)
+            for qid, body in self._conn.execute(
+                    "SELECT id, body FROM questions WHERE subject = ? AND difficulty = ? AND topic = ?", key):
+                flt.add(json.loads(body), fp=qid)
+        return flt
+
+    def count(self, subject, difficulty, topic=None):
+        sql = "SELECT COUNT(*) FROM questions WHERE subject = ? AND difficulty = ?"
+        args = [subject, difficulty]
+        if topic is not None:
+            sql += " AND topic = ?"
+            args.append(topic)
+        with self._lock:
+            return self._conn.execute(sql, args).fetchone()[0]
+
+    def get(self, qid):
+        """The stored question with id ``qid``, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM questions WHERE id = ?", (qid,)).fetchone()
+        if row is None:
+            return None
+        q = json.loads(row[0])
+        q["id"] = qid
+        q["source"] = "store"
+        return q
+
+    def candidates(self, subject, difficulty, topic=None, limit=1, exclude=()):
+        """Least-served questions for the key, shuffled within equal use counts."""
+        sql = "SELECT id, body FROM questions WHERE subject = ? AND difficulty = ?"
+        args = [subject, difficulty]
+        if topic is not None:
+            sql += " AND topic = ?"
+            args.append(topic)
+        if exclude:
+            exclude = list(exclude)
+            sql += f" AND id NOT IN ({','.join('?' * len(exclude))})"
+            args += exclude
+        sql += " ORDER BY uses, RANDOM() LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        out = []
+        for qid, body in rows:
+            q = json.loads(body)
+            q["id"] = qid
+            q["source"] = "store"
+            out.append(q)
+        return out
+
+    def mark_served(self, qid):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE questions SET uses = uses + 1, last_used = ? WHERE id = ?",
+                               (time.time(), qid))
+
+    def evict(self):
+        """Drop questions past their age limit, then least-recently used ones over the size limit."""
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM questions WHERE created_at < ?",
+                                         (time.time() - self.max_age,)).rowcount
+            total = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            if total > self.max_rows:
+                removed += self._conn.execute(
+                    "DELETE FROM questions WHERE id IN "
+                    "(SELECT id FROM questions ORDER BY last_used LIMIT ?)",
+                    (total - self.max_rows,)).rowcount
+        return removed
+
+    def stats(self):
+        """Question counts per (subject, difficulty)."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT subject, difficulty, COUNT(*), SUM(uses) FROM questions "
+                "GROUP BY subject, difficulty ORDER BY subject, difficulty").fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# WARM-UP
+# ──────────────────────────────────────────────────────────────────────────────
+def warm(store, model, subjects, difficulties, per_key, batch_size, log=print):
+    """Generate questions until every (subject, difficulty, topic) key holds ``per_key``."""
+    from app import JAMB_SUBJECTS, generate_ai_batch
+
+    added = 0
+    for subject in subjects:
+        for difficulty in difficulties:
+            wanted = []
+            for topic in JAMB_SUBJECTS[subject]["topics"]:
+                wanted += [topic] * max(0, per_key - store.count(subject, difficulty, topic))
+            for i in range(0, len(wanted), batch_size):
+                chunk = wanted[i:i + batch_size]
+                qs = generate_ai_batch(model, subject, chunk, difficulty, priority=WARMUP)
+                got = store.add_many(subject, difficulty, qs)
+                added += got
+                log(f"{subject} / {difficulty}: +{got} ({min(i + batch_size, len(wanted))}/{len(wanted)} requested)")
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the SmartPrep question store.")
+    parser.add_argument("--db", default=DEFAULT_PATH, help="store location (default: %(default)s)")
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_MAX_ROWS)
+    parser.add_argument("--max-age-days", type=int, default=DEFAULT_MAX_AGE_DAYS)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stats", help="show question counts per subject and difficulty")
+    sub.add_parser("evict", help="apply the age and size limits now")
+    w = sub.add_parser("warm", help="pre-generate questions for thin keys")
+    w.add_argument("--subjects", nargs="*", help="subjects to warm (default: all)")
+    w.add_argument("--difficulties", nargs="*", default=["Easy", "Medium", "Hard"])
+    w.add_argument("--per-key", type=int,
+                   help="questions wanted per topic key (default: STORE_MIN_POOL, the count the app serves from)")
+    w.add_argument("--batch-size", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    store = QuestionStore(args.db, args.max_rows, args.max_age_days)
+    if args.cmd == "stats":
+        for subject, difficulty, n, uses in store.stats():
+            print(f"{subject:32} {difficulty:7} {n:7} questions {uses or 0:9} serves")
+    elif args.cmd == "evict":
+        print(f"Evicted {store.evict()} questions")
+    else:
+        from app import JAMB_SUBJECTS, get_model, get_setting
+
+        model = get_model()
+        if model is None:
+            parser.error("no Gemini model available; set GEMINI_API_KEY in .streamlit/secrets.toml")
+        subjects = args.subjects or list(JAMB_SUBJECTS)
+        per_key = args.per_key or int(get_setting("STORE_MIN_POOL", MIN_POOL))
+        added = warm(store, model, subjects, args.difficulties, per_key, args.batch_size)
+        print(f"Added {added} questions")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
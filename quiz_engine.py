@@ -0,0 +1,506 @@
+"""Quiz engine: sessions, scoring, XP, streaks and achievements, with no UI.
+
+app.py is a thin Streamlit adapter over this module: it keeps a ``Profile``
+and the current ``QuizSession`` in session state and only renders them.
+Benchmarks, worker processes and other front-ends drive the same objects
+directly, without a Streamlit rerun per step:
+
+    profile = Profile()
+    quiz = QuizSession(["Physics"], difficulty="Hard", total_qs=10, time_per_q=120)
+    quiz.start(first_question)
+    quiz.submit("B) 9.8 m/s²", profile)
+    quiz.add_question(next_question)
+    ...
+    result = quiz.finish(profile)
+
+With ``difficulty=ADAPTIVE`` each question is asked at the level of the
+student's current ability in its subject; pass an ``ItemIndex`` as
+``items`` to ``submit`` so answers also calibrate the questions.
+
+Both objects are plain Python and pickle cleanly. Sessions keep questions as
+slotted ``Question`` records interned in the process-wide ``POOL``, so many
+students on the same bank or stored questions share one copy of each, and
+answers as option indexes in a byte array.
+"""
+import sys
+import threading
+import time
+import weakref
+from array import array
+from datetime import datetime
+
+from adaptive import ADAPTIVE, Ability, label_for, prior
+from mastery import MasteryTracker
+from review import ReviewQueue, quality
+
+EXPIRED = "__EXPIRED__"   # answer recorded when the timer runs out
+UNANSWERED, TIMED_OUT = -1, -2   # answer codes besides option indexes 0-3
+XP_PER_LEVEL = 500
+PACE_SECONDS = 120        # per question; finishing faster than this earns the time bonus
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# GAMIFICATION
+# ──────────────────────────────────────────────────────────────────────────────
+def calc_xp(score, total, difficulty, time_efficiency=1.0):
+    base = 50
+    score_xp = int((score / max(total, 1)) * 200)
+    time_bonus = int(time_efficiency * 50)
+    mult = {"Easy": 1.0, "Medium": 1.25, "Hard": 1.5}.get(difficulty, 1.0)
+    return int((base + score_xp + time_bonus) * mult)
+
+
+def level_from_xp(xp):
+    return 1 + xp // XP_PER_LEVEL
+
+
+def xp_progress_pct(xp):
+    lvl = level_from_xp(xp)
+    lo = (lvl - 1) * XP_PER_LEVEL
+    hi = lvl * XP_PER_LEVEL
+    return int(((xp - lo) / (hi - lo)) * 100)
+
+
+def update_streak(last_date_str, current_streak, today=None):
+    today = today or datetime.now().date()
+    if not last_date_str:
+        return 1, today.isoformat()
+    if isinstance(last_date_str, str):
+        last = datetime.strptime(last_date_str, "%Y-%m-%d").date()
+    else:
+        last = last_date_str
+    diff = (today - last).days
+    if diff == 0:
+        return current_streak, last_date_str
+    elif diff == 1:
+        return current_streak + 1, today.isoformat()
+    else:
+        return 1, today.isoformat()
+
+
+ACHIEVEMENTS_DEF = [
+    ("first_quiz", "🎯", "First Steps", "Complete your first quiz", lambda d: d["quizzes"] >= 1),
+    ("five_quizzes", "🏅", "Quiz Enthusiast", "Complete 5 quizzes", lambda d: d["quizzes"] >= 5),
+    ("twenty_quizzes", "🏆", "Quiz Master", "Complete 20 quizzes", lambda d: d["quizzes"] >= 20),
+    ("first_perfect", "💯", "Perfect Start", "Score 100% on a quiz", lambda d: d["perfects"] >= 1),
+    ("five_perfect", "🌟", "Excellence", "Score 100% on 5 quizzes", lambda d: d["perfects"] >= 5),
+    ("streak_3", "🔥", "On Fire", "3-day study streak", lambda d: d["streak"] >= 3),
+    ("streak_7", "🔥🔥", "Weekly Warrior", "7-day study streak", lambda d: d["streak"] >= 7),
+    ("streak_30", "🔥🔥🔥", "Dedication", "30-day study streak", lambda d: d["streak"] >= 30),
+    ("multi_subj", "📚", "Renaissance Learner", "Practice 3+ subjects", lambda d: d["subjects_tried"] >= 3),
+    ("speed_demon", "⚡", "Speed Demon", "Finish a quiz with >80% time left", lambda d: d.get("fast_finish", False)),
+]
+
+
+def get_unlocked(data):
+    return [a for a in ACHIEVEMENTS_DEF if a[4](data)]
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# SCORING
+# ──────────────────────────────────────────────────────────────────────────────
+def is_correct(q, choice):
+    """Options are rendered as "A) ...", so the chosen text starts with its letter."""
+    return bool(choice) and choice != EXPIRED and choice.startswith(q["answer"])
+
+
+class Scoreboard:
+    """Running tallies for the current quiz, updated once per submitted answer.
+
+    The quiz and results screens read these instead of rescanning every answer
+    on each rerun.
+    """
+
+    def __init__(self):
+        self.correct = 0
+        self.answered = 0
+        self.outcomes = {}      # question index -> True / False / "expired"
+        self.by_topic = {}      # topic -> {"correct": n, "total": n}
+        self.by_subject = {}    # subject -> {"correct": n, "total": n}
+
+    def record(self, idx, subject, topic, is_correct, expired=False):
+        if idx in self.outcomes:
+            return
+        self.outcomes[idx] = "expired" if expired else bool(is_correct)
+        self.answered += 1
+        self.correct += int(bool(is_correct))
+        for tally in (self.by_topic.setdefault(topic, {"correct": 0, "total": 0}),
+                      self.by_subject.setdefault(subject, {"correct": 0, "total": 0})):
+            tally["total"] += 1
+            tally["correct"] += int(bool(is_correct))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# QUESTION RECORDS
+# ──────────────────────────────────────────────────────────────────────────────
+class Question:
+    """A question as a slotted record; reads like the question dicts it is built from.
+
+    ``q["options"]`` and ``q.get("topic")`` work as before, so code written
+    for dicts (dedup filters, prefetch bookkeeping) takes records unchanged.
+    ``stream`` is the handle of a streamed question whose explanation is
+    still arriving.
+    """
+
+    __slots__ = ("id", "question", "options", "answer", "explanation", "topic", "difficulty", "source",
+                 "stream", "__weakref__")
+    FIELDS = ("id", "question", "options", "answer", "explanation", "topic", "difficulty", "source")
+
+    def __init__(self, id, question, options, answer, explanation="", topic="General", difficulty=None,
+                 source=None, stream=None):
+        self.id = id
+        self.question = question
+        self.options = tuple(options)
+        self.answer = sys.intern(answer)
+        self.explanation = explanation
+        self.topic = sys.intern(topic)
+        self.difficulty = difficulty and sys.intern(difficulty)
+        self.source = source and sys.intern(source)
+        self.stream = stream
+
+    @classmethod
+    def from_dict(cls, q):
+        return cls(q["id"], q["question"], q["options"], q["answer"], q.get("explanation", ""),
+                   q.get("topic") or "General", q.get("difficulty"), q.get("source"), q.get("_stream"))
+
+    def to_dict(self):
+        return {k: list(self.options) if k == "options" else getattr(self, k)
+                for k in self.FIELDS if getattr(self, k) is not None}
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in self.FIELDS else None
+        if value is None:
+            raise KeyError(key)
+        return list(value) if key == "options" else value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __reduce__(self):
+        # Unpickled records join the receiving process's pool; a stream handle can't travel
+        return intern_question, (self.to_dict(),)
+
+
+class QuestionPool:
+    """Process-wide interned question records, keyed by question id.
+
+    Every session holding a given question shares one record, and a record
+    disappears once no session refers to it any more.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self._records)
+
+    def intern(self, q):
+        """The shared record for question dict (or record) ``q``."""
+        if isinstance(q, Question):
+            return q
+        with self._lock:
+            rec = self._records.get(q["id"])
+            if rec is None:
+                rec = self._records[q["id"]] = Question.from_dict(q)
+            elif rec.stream is None and not rec.explanation and q.get("_stream") is not None:
+                rec.stream = q["_stream"]
+            return rec
+
+
+POOL = QuestionPool()
+
+
+def intern_question(q):
+    return POOL.intern(q)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# STUDENT PROFILE
+# ──────────────────────────────────────────────────────────────────────────────
+class Profile:
+    """A student's XP, streak, achievements, topic mastery, ability and review queue, across quizzes."""
+
+    KEYS = ("xp", "quizzes_done", "perfects", "streak", "last_date", "unlocked_ids")
+
+    def __init__(self):
+        self.xp = 0
+        self.quizzes_done = 0
+        self.perfects = 0
+        self.streak = 1
+        self.last_date = datetime.now().date().isoformat()
+        self.unlocked_ids = []
+        self.mastery = MasteryTracker()
+        self.ability = Ability()
+        self.reviews = ReviewQueue()
+
+    @property
+    def level(self):
+        return level_from_xp(self.xp)
+
+    def record_answer(self, subject, topic, correct, difficulty, ts, rating=None):
+        """Record one answer; returns the subject ability before it.
+
+        ``rating`` is the question's estimated difficulty, the prior of its
+        ``difficulty`` label when not given.
+        """
+        self.mastery.record(subject, topic, correct, ts)
+        return self.ability.record(subject, prior(difficulty) if rating is None else rating, correct)
+
+    def to_dict(self):
+        """The state a progress store saves for this student."""
+        state = {k: list(getattr(self, k)) if k == "unlocked_ids" else getattr(self, k) for k in self.KEYS}
+        state["mastery"] = self.mastery.to_dict()
+        state["ability"] = self.ability.to_dict()
+        state["reviews"] = self.reviews.to_dict()
+        return state
+
+    def load(self, data):
+        """Restore saved state from ``to_dict``."""
+        for k in self.KEYS:
+            if k in data:
+                setattr(self, k, data[k])
+        self.mastery = MasteryTracker.from_dict(data.get("mastery", {}))
+        self.ability = Ability.from_dict(data.get("ability", {}))
+        self.reviews = ReviewQueue.from_dict(data.get("reviews", {}))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# QUIZ SESSION
+# ──────────────────────────────────────────────────────────────────────────────
+def subject_for_index(idx, subjects, per_subject, default):
+    """Subject of question ``idx``; CBT runs its subjects in blocks of ``per_subject``."""
+    if not subjects:
+        return default
+    subj_idx = idx // per_subject if per_subject > 0 else 0
+    return subjects[min(subj_idx, len(subjects) - 1)]
+
+
+def next_question(quiz, sources, profile=None):
+    """The quiz's next question from the first of ``sources`` that has one.
+
+    ``sources`` are ``(path, fetch)`` pairs tried in order, where
+    ``fetch(subject, difficulty, used_topics, used_ids)`` returns a question
+    dict or None. Adaptive quizzes ask for the level of ``profile``'s ability.
+    Returns ``(question, path)``, or ``(None, None)``.
+    """
+    subject = quiz.subject_for(len(quiz.questions))
+    difficulty = quiz.level_for(subject, profile)
+    used_topics, used_ids = quiz.used_topics(), quiz.used_ids()
+    for path, fetch in sources:
+        q = fetch(subject, difficulty, used_topics, used_ids)
+        if q is not None:
+            if isinstance(q, dict) and not q.get("difficulty"):
+                q["difficulty"] = difficulty
+            return q, path
+    return None, None
+
+
+class QuizResult:
+    """What finishing a quiz earned."""
+
+    def __init__(self, score, total, time_efficiency, xp_earned, old_level, new_level, new_achievements):
+        self.score = score
+        self.total = total
+        self.pct = (score / max(total, 1)) * 100
+        self.time_efficiency = time_efficiency
+        self.xp_earned = xp_earned
+        self.old_level = old_level
+        self.new_level = new_level
+        self.new_achievements = new_achievements
+
+    @property
+    def levelled_up(self):
+        return self.new_level > self.old_level
+
+
+class QuizSession:
+    """One quiz, from its first question to its result.
+
+    ``subjects`` holds one subject, or the CBT subjects in exam order, each
+    taking a block of ``per_subject`` questions. ``topic`` pins a Topic Focus
+    drill; ``time_per_q`` is None for untimed quizzes. ``difficulty`` is a
+    level or ``ADAPTIVE``. A "review" quiz asks questions drawn from the
+    student's review queue, each counted under its own subject and level;
+    its ``subjects`` are only the ones it was started with cards due in.
+    """
+
+    def __init__(self, subjects, difficulty="Medium", total_qs=10, time_per_q=None, per_subject=None,
+                 topic=None, mode="quick"):
+        self.mode = mode
+        self.subjects = list(subjects)
+        self.subject = self.subjects[0]
+        self.difficulty = difficulty
+        self.total_qs = total_qs
+        self.time_per_q = time_per_q
+        self.per_subject = per_subject or total_qs
+        self.topic = topic
+        self.questions = []             # interned Question records
+        self.answers = array("b")       # option index, UNANSWERED or TIMED_OUT per question
+        self.fallbacks = {}             # question index -> why a past question stood in for an AI one
+        self.asked_subjects = {}        # question index -> subject, for review questions
+        self.current_idx = 0
+        self.show_feedback = False
+        self.timer_start = None
+        self.timer_expired = False
+        self.total_time = 0.0
+        self.scoreboard = Scoreboard()
+        self.result = None
+
+    @property
+    def cbt_subjects(self):
+        """The exam's subjects in order, or [] for a single-subject (or review) quiz."""
+        return self.subjects if len(self.subjects) > 1 and self.mode != "review" else []
+
+    def subject_for(self, idx):
+        subject = self.asked_subjects.get(idx)
+        return subject or subject_for_index(idx, self.cbt_subjects, self.per_subject, self.subject)
+
+    @property
+    def adaptive(self):
+        return self.difficulty == ADAPTIVE
+
+    @property
+    def mixed_levels(self):
+        """True when each question counts at its own level (adaptive and review quizzes)."""
+        return self.adaptive or self.mode == "review"
+
+    def level_for(self, subject, profile=None):
+        """Difficulty level to ask for next in ``subject``."""
+        if not self.adaptive:
+            return self.difficulty
+        return profile.ability.level(subject) if profile is not None else "Medium"
+
+    def level_of(self, idx):
+        """Difficulty level question ``idx`` counts at."""
+        if not self.mixed_levels:
+            return self.difficulty
+        return self.questions[idx].difficulty or "Medium"
+
+    def used_topics(self):
+        return [q.topic for q in self.questions]
+
+    def used_ids(self):
+        return {q.id for q in self.questions}
+
+    def answer_text(self, idx):
+        """The chosen option of question ``idx``, ``EXPIRED``, or None if unanswered."""
+        code = self.answers[idx]
+        if code == TIMED_OUT:
+            return EXPIRED
+        return self.questions[idx].options[code] if code >= 0 else None
+
+    @property
+    def current(self):
+        return self.questions[self.current_idx]
+
+    @property
+    def is_last(self):
+        return self.current_idx + 1 >= self.total_qs
+
+    def start(self, q, now=None):
+        """Begin the quiz on its first question."""
+        self.questions, self.answers, self.fallbacks, self.asked_subjects = [], array("b"), {}, {}
+        self.add_question(q, now)
+
+    def add_question(self, q, now=None):
+        """Append the next question (a dict or record) and move on to it."""
+        if isinstance(q, dict) and q.get("_fallback"):
+            self.fallbacks[len(self.questions)] = q["_fallback"]
+        if isinstance(q, dict) and q.get("_subject"):
+            self.asked_subjects[len(self.questions)] = q["_subject"]
+        self.questions.append(POOL.intern(q))
+        self.answers.append(UNANSWERED)
+        self.current_idx = len(self.questions) - 1
+        self.show_feedback = False
+        self.timer_expired = False
+        self.timer_start = (now or time.time()) if self.time_per_q else None
+
+    def time_left(self, now=None):
+        """Seconds left on the current question, or None when untimed or answered."""
+        if not self.time_per_q or self.timer_start is None or self.show_feedback:
+            return None
+        return max(0.0, self.time_per_q - ((now or time.time()) - self.timer_start))
+
+    def submit(self, choice, profile=None, now=None, items=None):
+        """Answer the current question; returns the answer event, or None if already answered.
+
+        The event is ``(ts, subject, topic, correct, difficulty)``, the argument
+        order of ``ProgressStore.append_event``. With ``items`` (an
+        ``ItemIndex``) the answer also updates the question's difficulty.
+        """
+        if self.show_feedback:
+            return None
+        now = now or time.time()
+        if self.timer_start:
+            self.total_time += now - self.timer_start
+        return self._answer(choice, is_correct(self.current, choice), profile, now, items)
+
+    def expire(self, profile=None, now=None, items=None):
+        """Time ran out on the current question; scored as wrong."""
+        if self.show_feedback:
+            return None
+        self.timer_expired = True
+        return self._answer(EXPIRED, False, profile, now or time.time(), items)
+
+    def _answer(self, choice, correct, profile, now, items=None):
+        q, idx = self.current, self.current_idx
+        subject, topic, level = self.subject_for(idx), q.topic, self.level_of(idx)
+        if choice == EXPIRED:
+            self.answers[idx] = TIMED_OUT
+        else:
+            self.answers[idx] = q.options.index(choice) if choice in q.options else UNANSWERED
+        self.show_feedback = True
+        self.scoreboard.record(idx, subject, topic, correct, expired=choice == EXPIRED)
+        if profile is not None:
+            rating = items.rating(q.id, q.difficulty or level) if items is not None else None
+            theta = profile.record_answer(subject, topic, correct, level, now, rating)
+            if items is not None:
+                items.record(q.id, q.difficulty or level, theta, correct)
+            profile.reviews.record(q, subject, quality(correct, choice == EXPIRED), now)
+        return now, subject, topic, correct, level
+
+    def xp_level(self):
+        """The level XP is paid at: the quiz's, or the average of its questions' when they vary."""
+        if not self.mixed_levels or not self.questions:
+            return self.level_for(self.subject)
+        return label_for(sum(prior(self.level_of(i)) for i in range(len(self.questions))) / len(self.questions))
+
+    def time_efficiency(self):
+        if self.total_time <= 0:
+            return 1
+        return max(0, 1 - (self.total_time / max(len(self.questions) * PACE_SECONDS, 1)))
+
+    def finish(self, profile, today=None):
+        """Award XP, streak and achievements to ``profile`` once; later calls return the same result."""
+        if self.result is not None:
+            return self.result
+        total, score = len(self.questions), self.scoreboard.correct
+        time_eff = self.time_efficiency()
+        xp_earned = calc_xp(score, total, self.xp_level(), time_eff)
+        old_level = profile.level
+        profile.xp += xp_earned
+        profile.quizzes_done += 1
+        if score == total:
+            profile.perfects += 1
+        profile.streak, profile.last_date = update_streak(profile.last_date, profile.streak, today)
+        ach_data = {
+            "quizzes": profile.quizzes_done,
+            "perfects": profile.perfects,
+            "streak": profile.streak,
+            "subjects_tried": profile.mastery.subjects_tried,
+            "fast_finish": time_eff > 0.8,
+        }
+        # (id, icon, title, description), without the unpicklable predicate
+        new = [a[:4] for a in get_unlocked(ach_data) if a[0] not in profile.unlocked_ids]
+        profile.unlocked_ids.extend(a[0] for a in new)
+        self.result = QuizResult(score, total, time_eff, xp_earned, old_level, profile.level, new)
+        return self.result
+
+    def retry(self):
+        """A fresh quiz on this quiz's (first) subject with the same settings."""
+        return QuizSession([self.subject], self.difficulty, self.total_qs, self.time_per_q,
+                           topic=self.topic, mode="quick" if self.mode in ("cbt", "review") else self.mode)
@@ -0,0 +1,286 @@
+"""Prompt-level cache of parsed model responses, with rotating variants.
+
+A single-question prompt is fully determined by (subject, topic, difficulty),
+so identical prompts keep being sent and only the model's randomness makes
+the answers differ. The cache keys each prompt by those fields (normalised)
+plus a hash of the prompt template, and keeps up to ``variants`` different
+responses per key:
+
+- until a key holds all its variants every lookup misses, so the first
+  students to ask pay for a spread of distinct questions;
+- after that, lookups rotate through the variants, least served first,
+  skipping ones the student has already seen;
+- a key that is hit often gets a variant replaced in the background
+  (``refill``), so popular prompts keep producing new questions;
+- variants expire after ``ttl`` seconds and the least recently used keys are
+  dropped beyond ``max_keys``.
+
+Two backends: "memory" (per process) and "disk" (SQLite, shared by every
+process on the host and kept across restarts).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from fingerprint import canonical
+
+DEFAULT_PATH = os.path.join(".smartprep", "responses.db")
+DEFAULT_VARIANTS = 4
+DEFAULT_TTL = 7 * 86400
+DEFAULT_MAX_KEYS = 5000
+REFILL_HIT_RATE = 0.8     # share of recent lookups that were hits before a key is topped up
+REFILL_MIN_LOOKUPS = 10   # lookups a key needs before its hit rate counts
+EVICT_EVERY = 200         # stores between eviction passes
+
+
+def prompt_key(template, subject, topic, difficulty):
+    """Semantic key: the prompt's fields, normalised, under a hash of its template."""
+    version = hashlib.sha1(template.encode("utf-8")).hexdigest()[:8]
+    return "\x1f".join((version, canonical(subject), canonical(topic), canonical(difficulty)))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# BACKENDS
+# ──────────────────────────────────────────────────────────────────────────────
+class CacheBackend:
+    """Interface every response cache backend implements.
+
+    A variant is ``[slot, question, created_at, served]``.
+    """
+
+    def load(self, key):
+        """The key's variants, touching it as recently used."""
+        raise NotImplementedError
+
+    def store(self, key, slot, q, created_at):
+        raise NotImplementedError
+
+    def mark_served(self, key, slot):
+        raise NotImplementedError
+
+    def evict(self, ttl, max_keys):
+        """Drop expired variants, then the least recently used keys beyond ``max_keys``."""
+        raise NotImplementedError
+
+    def keys(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    def __init__(self):
+        self._keys = OrderedDict()   # key -> {slot: variant}, least recently used first
+
+    def load(self, key):
+        slots = self._keys.get(key)
+        if slots is None:
+            return []
+        self._keys.move_to_end(key)
+        return [list(v) for v in slots.values()]
+
+    def store(self, key, slot, q, created_at):
+        self._keys.setdefault(key, {})[slot] = [slot, q, created_at, 0]
+        self._keys.move_to_end(key)
+
+    def mark_served(self, key, slot):
+        variant = self._keys.get(key, {}).get(slot)
+        if variant is not None:
+            variant[3] += 1
+
+    def evict(self, ttl, max_keys):
+        cutoff = time.time() - ttl
+        removed = 0
+        for key in list(self._keys):
+            slots = self._keys[key]
+            for slot in [s for s, v in slots.items() if v[2] < cutoff]:
+                del slots[slot]
+                removed += 1
+            if not slots:
+                del self._keys[key]
+        while len(self._keys) > max_keys:
+            removed += len(self._keys.popitem(last=False)[1])
+        return removed
+
+    def keys(self):
+        return len(self._keys)
+
+
+class DiskBackend(CacheBackend):
+    """SQLite file; WAL lets several app processes on one host share it."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS variants (
+        key         TEXT NOT NULL,
+        slot        INTEGER NOT NULL,
+        body        TEXT NOT NULL,
+        created_at  REAL NOT NULL,
+        served      INTEGER NOT NULL DEFAULT 0,
+        last_used   REAL NOT NULL,
+        PRIMARY KEY (key, slot)
+    );
+    CREATE INDEX IF NOT EXISTS idx_variants_lru ON variants (last_used);
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def load(self, key):
+        with self._conn:
+            rows = self._conn.execute("SELECT slot, body, created_at, served FROM variants WHERE key = ?",
+                                      (key,)).fetchall()
+            if rows:
+                self._conn.execute("UPDATE variants SET last_used = ? WHERE key = ?", (time.time(), key))
+        return [[slot, json.loads(body), created, served] for slot, body, created, served in rows]
+
+    def store(self, key, slot, q, created_at):
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO variants (key, slot, body, created_at, served, last_used) "
+                               "VALUES (?, ?, ?, ?, 0, ?)", (key, slot, json.dumps(q), created_at, time.time()))
+
+    def mark_served(self, key, slot):
+        with self._conn:
+            self._conn.execute("UPDATE variants SET served = served + 1 WHERE key = ? AND slot = ?", (key, slot))
+
+    def evict(self, ttl, max_keys):
+        with self._conn:
+            removed = self._conn.execute("DELETE FROM variants WHERE created_at < ?",
+                                         (time.time() - ttl,)).rowcount
+            total = self._conn.execute("SELECT COUNT(DISTINCT key) FROM variants").fetchone()[0]
+            if total > max_keys:
+                removed += self._conn.execute(
+                    "DELETE FROM variants WHERE key IN (SELECT key FROM variants GROUP BY key "
+                    "ORDER BY MAX(last_used) LIMIT ?)", (total - max_keys,)).rowcount
+        return removed
+
+    def keys(self):
+        return self._conn.execute("SELECT COUNT(DISTINCT key) FROM variants").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+BACKENDS = {"memory": MemoryBackend, "disk": DiskBackend}
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# CACHE
+# ──────────────────────────────────────────────────────────────────────────────
+class ResponseCache:
+    """N-variant slots per prompt key over a backend; thread-safe.
+
+    ``refill(key_fields) -> question or None`` generates a fresh variant
+    bypassing the cache; it runs on ``executor`` when a key's hit rate stays
+    at or above ``refill_hit_rate``.
+    """
+
+    def __init__(self, backend, variants=DEFAULT_VARIANTS, ttl=DEFAULT_TTL, max_keys=DEFAULT_MAX_KEYS,
+                 refill=None, executor=None, refill_hit_rate=REFILL_HIT_RATE):
+        self.backend = backend
+        self.variants = max(1, int(variants))
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.refill = refill
+        self.executor = executor
+        self.refill_hit_rate = refill_hit_rate
+        self._lock = threading.Lock()
+        self._lookups = OrderedDict()   # key -> [lookups, hits] since last refilled; LRU of max_keys
+        self._refilling = set()
+        self._stores = 0
+        self.metrics = {"hits": 0, "misses": 0, "stores": 0, "refills": 0}
+
+    def _fresh(self, key):
+        cutoff = time.time() - self.ttl
+        return [v for v in self.backend.load(key) if v[2] >= cutoff]
+
+    def get(self, key, exclude=(), fields=None):
+        """A cached variant for ``key`` not in ``exclude`` (ids), or None.
+
+        Misses until the key holds all its variants. ``fields`` are what
+        ``refill`` needs to regenerate the key, typically the prompt's arguments.
+        """
+        with self._lock:
+            variants = self._fresh(key)
+            counts = self._lookups.get(key)
+            if counts is None:
+                counts = self._lookups[key] = [0, 0]
+                if len(self._lookups) > self.max_keys:
+                    self._lookups.popitem(last=False)
+            else:
+                self._lookups.move_to_end(key)
+            counts[0] += 1
+            pick = None
+            if len(variants) >= self.variants:
+                unseen = [v for v in variants if v[1].get("id") not in exclude]
+                if unseen:
+                    pick = min(unseen, key=lambda v: (v[3], v[2]))
+            if pick is None:
+                self.metrics["misses"] += 1
+                return None
+            counts[1] += 1
+            self.metrics["hits"] += 1
+            self.backend.mark_served(key, pick[0])
+            refill = (self.refill is not None and self.executor is not None and fields is not None
+                      and key not in self._refilling and counts[0] >= REFILL_MIN_LOOKUPS
+                      and counts[1] / counts[0] >= self.refill_hit_rate)
+            if refill:
+                self._refilling.add(key)
+                counts[:] = [0, 0]
+        if refill:
+            self.executor.submit(self._refill, key, fields)
+        return dict(pick[1])
+
+    def put(self, key, q):
+        """Store a fresh variant: in a free slot, else over the most served (then oldest) one."""
+        if not q:
+            return
+        with self._lock:
+            variants = self._fresh(key)
+            if any(v[1].get("id") == q.get("id") for v in variants):
+                return
+            taken = {v[0] for v in variants}
+            free = [s for s in range(self.variants) if s not in taken]
+            slot = free[0] if free else max(variants, key=lambda v: (v[3], -v[2]))[0]
+            self.backend.store(key, slot, {k: v for k, v in q.items() if not k.startswith("_")}, time.time())
+            self.metrics["stores"] += 1
+            self._stores += 1
+            if self._stores % EVICT_EVERY == 0:
+                self.backend.evict(self.ttl, self.max_keys)
+
+    def _refill(self, key, fields):
+        try:
+            q = self.refill(fields)
+            if q:
+                self.put(key, q)
+                with self._lock:
+                    self.metrics["refills"] += 1
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, "keys": self.backend.keys(), "refilling": len(self._refilling)}
+
+    def close(self):
+        with self._lock:
+            self.backend.close()
+
+
+def open_cache(kind="memory", **options):
+    """``ResponseCache`` over the backend registered as ``kind``; backend options go in ``path``."""
+    backend_options = {"path": options.pop("path")} if kind == "disk" and "path" in options else {}
+    options.pop("path", None)
+    return ResponseCache(BACKENDS[kind](**backend_options), **options)
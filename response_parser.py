@@ -0,0 +1,368 @@
+"""Tolerant parsing of Gemini responses into question dicts.
+
+Non-streamed calls ask for JSON constrained by ``QUESTION_SCHEMA`` /
+``BATCH_SCHEMA``; the streamed single-question call uses the line format,
+because a schema-constrained object may put the explanation before the
+question and the question could then not be shown early. Either way the
+parser accepts what models actually send back and repairs it instead of
+discarding a paid call:
+
+- JSON inside code fences or surrounded by prose, trailing commas, a batch
+  cut off mid-array (the complete items are kept), options given as a
+  ``{"A": ...}`` map, an answer given as option text;
+- line-format labels in any case or wrapped in markdown, options written
+  "A)", "A.", "(A)" or "A:", and questions and explanations over several
+  lines;
+- a response in the other format than the one asked for.
+
+``ParseReport`` records which fields were missing or invalid and which
+repairs were needed, for the app's per-field failure counters.
+``LineParser`` parses the line format incrementally as a stream arrives,
+so each chunk costs only its own new lines.
+"""
+import json
+import re
+from collections import Counter
+
+from fingerprint import fingerprint
+
+OPTION_LETTERS = ("A", "B", "C", "D")
+FIELDS = ("question", "options", "answer", "explanation")
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {"type": "array", "items": {"type": "string"}, "min_items": 4, "max_items": 4},
+        "answer": {"type": "string", "enum": list(OPTION_LETTERS)},
+        "explanation": {"type": "string"},
+        "topic": {"type": "string"},
+    },
+    "required": ["question", "options", "answer", "explanation", "topic"],
+}
+BATCH_SCHEMA = {"type": "array", "items": QUESTION_SCHEMA}
+
+_LABEL = re.compile(r"^[\s*_#>-]*(question|correct answer|answer|explanation|topic)(?:\s*\d+)?[\s*_]*[:\-–][\s*_]*(.*)$",
+                    re.I)
+_OPTION = re.compile(r"^[\s*_]*[(\[]?([A-Da-d])(?:[)\].:]|\s+-)[\s*_]*(.+)$")
+# A bare letter ("C", "(C)", "C)", "**C**") or "Option C"; "A triangle ..." is option text, not a letter
+_ANSWER = re.compile(r"^[\s*_]*(?:option\s+([A-D])\b|[(\[]?([A-D])(?:[)\].:]|[\s*_]*$))", re.I)
+# Any standalone capital letter in a sentence ("B - 4", "The answer is B"), but not the article "A word"
+_ANSWER_ANYWHERE = re.compile(r"(?<![A-Za-z'])(?:A(?!\s+(?!(?:is|was)\b)[a-z])|[B-D])(?![A-Za-z'])")
+_PREFIX = re.compile(r"^[(\[]?[A-Da-d](?:[)\].:]|\s+-)\s*")
+_STRICT = re.compile(r"\s*Question: *([^\n]+)\nA\) *([^\n]+)\nB\) *([^\n]+)\nC\) *([^\n]+)\nD\) *([^\n]+)\n"
+                     r"Answer: *([A-D])\s*\nExplanation: *([^\n]+)(?:\nTopic: *([^\n]*))?\s*$")
+_MARKUP = " \t*_#>-"
+_LABEL_FIRST = frozenset("QqAaEeTtCc")
+_OPTION_FIRST = frozenset("ABCDabcd([")
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+_DANGLING = re.compile(r'(?:,\s*"(?:[^"\\]|\\.)*"\s*:?\s*|,\s*)$')
+
+
+class ParseReport:
+    """What parsing one response took: questions parsed, failed fields, repairs."""
+
+    __slots__ = ("format", "parsed", "failures", "repairs")
+
+    def __init__(self, fmt):
+        self.format = fmt
+        self.parsed = 0
+        self.failures = Counter()
+        self.repairs = Counter()
+
+    def __repr__(self):
+        return (f"ParseReport({self.format!r}, parsed={self.parsed}, failures={dict(self.failures)}, "
+                f"repairs={dict(self.repairs)})")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# VALIDATION
+# ──────────────────────────────────────────────────────────────────────────────
+def _text(value):
+    if isinstance(value, list):
+        value = "\n".join(str(v) for v in value)
+    return str(value or "").strip()
+
+
+def _options(raw, report):
+    if isinstance(raw, dict):
+        report.repairs["options_map"] += 1
+        raw = [raw.get(k, raw.get(k.lower())) for k in OPTION_LETTERS]
+    if not isinstance(raw, list) or len(raw) != 4:
+        return None
+    opts = []
+    for letter, opt in zip(OPTION_LETTERS, raw):
+        opt = _PREFIX.sub("", _text(opt), count=1)
+        if not opt:
+            return None
+        opts.append(f"{letter}) {opt}")
+    return opts
+
+
+def _answer(raw, opts, report):
+    ans = _text(raw)
+    if opts:
+        # Some responses name the option text instead of its letter; checked first, as the
+        # text itself may start with a one-letter word
+        texts = [o[3:].casefold() for o in opts]
+        if ans.casefold() in texts:
+            report.repairs["answer_text"] += 1
+            return OPTION_LETTERS[texts.index(ans.casefold())]
+    m = _ANSWER.match(ans)
+    if m:
+        return (m.group(1) or m.group(2)).upper()
+    letters = set(_ANSWER_ANYWHERE.findall(ans))
+    if len(letters) == 1:
+        report.repairs["answer_letter"] += 1
+        return letters.pop()
+    return ""
+
+
+def validate(item, fallback_topic="General", report=None):
+    """The question dict for one parsed object, or None if a field is unusable.
+
+    Every unusable field is counted in ``report.failures``, not just the first.
+    """
+    report = report if report is not None else ParseReport("json")
+    if not isinstance(item, dict):
+        report.failures.update(FIELDS)
+        return None
+    q = _text(item.get("question"))
+    opts = _options(item.get("options"), report)
+    ans = _answer(item.get("answer"), opts, report)
+    expl = _text(item.get("explanation"))
+    bad = [name for name, value in zip(FIELDS, (q, opts, ans, expl)) if not value]
+    if bad:
+        report.failures.update(bad)
+        return None
+    out = {"question": q, "options": opts, "answer": ans, "explanation": expl,
+           "topic": _text(item.get("topic")) or fallback_topic, "source": "ai"}
+    out["id"] = fingerprint(out)
+    report.parsed += 1
+    return out
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# JSON
+# ──────────────────────────────────────────────────────────────────────────────
+def _close_json(text):
+    """``text`` with a truncated tail closed off: whole array items only, else every open bracket."""
+    stack, in_str, esc, last_item = [], False, False, None
+    for i, ch in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+        elif ch in "]}" and stack:
+            stack.pop()
+            if stack == ["]"]:
+                last_item = i + 1
+    if not stack:
+        return text
+    if stack[0] == "]" and last_item is not None:
+        return text[:last_item] + "]"
+    text += '"' if in_str else ""
+    text = _DANGLING.sub("", text.rstrip())
+    if text.endswith(":"):
+        text += " null"
+    return text + "".join(reversed(stack))
+
+
+def load_json(text, report):
+    """Decode JSON from a response, repairing what it can; None if there is none."""
+    text = text.strip()
+    if text.startswith("```"):
+        report.repairs["fence"] += 1
+        text = text.strip("`").split("\n", 1)[-1].strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    body = text[start:text.rfind("]" if text[start] == "[" else "}") + 1] or text[start:]
+    for repair, fix in ((None, lambda: body),
+                        ("trailing_comma", lambda: _TRAILING_COMMA.sub(r"\1", body)),
+                        ("truncated", lambda: _close_json(_TRAILING_COMMA.sub(r"\1", text[start:])))):
+        try:
+            data = json.loads(fix())
+        except ValueError:
+            continue
+        if start or (repair != "truncated" and body != text):
+            report.repairs["prose"] += 1
+        if repair:
+            report.repairs[repair] += 1
+        return data
+    return None
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# LINE FORMAT
+# ──────────────────────────────────────────────────────────────────────────────
+class LineParser:
+    """Incremental parser for the line format; ``feed`` chunks, then ``close``.
+
+    Only complete lines are parsed, each once. ``head()`` is available as soon
+    as the question, all four options and the answer have arrived.
+    """
+
+    def __init__(self, fallback_topic="General"):
+        self.fallback_topic = fallback_topic
+        self.report = ParseReport("line")
+        self._buf = ""
+        self._question, self._explanation = [], []
+        self._options, self._answer, self._topic = [], "", ""
+        self._field = None      # where continuation lines go
+        self._styled = False
+        self._labels = 0
+
+    def feed(self, chunk):
+        self._buf += chunk
+        if "\n" in chunk:
+            *lines, self._buf = self._buf.split("\n")
+            for line in lines:
+                self._line(line)
+        return self
+
+    def _line(self, line):
+        line = line.strip()
+        if not line:
+            return
+        # Most lines can be ruled out as labels or options by their first character
+        first = line.lstrip(_MARKUP)[:1]
+        m = _LABEL.match(line) if first in _LABEL_FIRST else None
+        # Inside the explanation only a topic line ends it; "Answer: ..." there is prose
+        if m and (self._field != "explanation" or m.group(1).lower() == "topic"):
+            label, rest = m.group(1).lower(), m.group(2).strip()
+            self._labels += 1
+            if label == "question":
+                self._field, self._question = "question", [rest] if rest else []
+            elif label.endswith("answer"):
+                self._field, self._answer = None, rest
+            elif label == "explanation":
+                self._field, self._explanation = "explanation", [rest] if rest else []
+            else:
+                self._field, self._topic = None, rest
+            return
+        if self._field != "explanation" and len(self._options) < 4 and first in _OPTION_FIRST:
+            m = _OPTION.match(line)
+            letter = OPTION_LETTERS[len(self._options)]
+            if m and m.group(1).upper() == letter:
+                if line[:1] != letter or line[1:2] != ")":
+                    self._styled = True
+                self._options.append(m.group(2).strip())
+                self._field = None
+                return
+        if self._field == "question":
+            self._question.append(line)
+        elif self._field == "explanation":
+            self._explanation.append(line)
+
+    def _item(self, explanation):
+        return {"question": "\n".join(self._question), "options": list(self._options),
+                "answer": self._answer, "explanation": explanation, "topic": self._topic}
+
+    def head(self):
+        """The question without its explanation once everything before it has arrived, else None."""
+        if not (self._question and len(self._options) == 4 and self._answer):
+            return None
+        q = validate(self._item("…"), self.fallback_topic, ParseReport("line"))
+        if q:
+            q["explanation"] = ""
+        return q
+
+    def close(self):
+        """Parse whatever is left and return the complete question, or None."""
+        if self._buf:
+            self._line(self._buf)
+            self._buf = ""
+        if self._styled:
+            self.report.repairs["option_style"] += 1
+        if not self._labels and not self._options:
+            self.report.failures.update(FIELDS)
+            return None
+        return validate(self._item("\n".join(self._explanation)), self.fallback_topic, self.report)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# ENTRY POINTS
+# ──────────────────────────────────────────────────────────────────────────────
+def _looks_like_json(text):
+    return text.lstrip()[:1] in ("{", "[", "`")
+
+
+def parse_question(text, fallback_topic="General"):
+    """``(question or None, ParseReport)`` for a single-question response in either format."""
+    if _looks_like_json(text):
+        report = ParseReport("json")
+        data = load_json(text, report)
+        if isinstance(data, list) and len(data) == 1:
+            data = data[0]
+        if isinstance(data, dict):
+            return validate(data, fallback_topic, report), report
+    m = _STRICT.match(text)
+    if m:
+        # Well-formed line-format responses, the usual case, skip the line-by-line parser
+        report = ParseReport("line")
+        q, *opts, ans, expl, topic = m.groups()
+        return validate({"question": q, "options": opts, "answer": ans, "explanation": expl, "topic": topic},
+                        fallback_topic, report), report
+    parser = LineParser(fallback_topic)
+    q = parser.feed(text).close()
+    if q is None and not _looks_like_json(text) and "{" in text:
+        report = ParseReport("json")
+        data = load_json(text, report)
+        if isinstance(data, dict):
+            report.repairs["format"] += 1
+            return validate(data, fallback_topic, report), report
+    if q is not None and _looks_like_json(text):
+        parser.report.repairs["format"] += 1
+    return q, parser.report
+
+
+def _line_blocks(text):
+    """Line-format questions in one response, split at each question label."""
+    starts = [m.start() for m in re.finditer(r"^[\s*_#>-]*question\b", text, re.I | re.M)]
+    return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+def parse_batch(text, fallback_topics=()):
+    """``(questions, ParseReport)`` for a batch response; well-formed items are kept."""
+    report = ParseReport("json")
+    data = load_json(text, report)
+    if isinstance(data, dict):
+        data = data.get("questions", [data])
+    if not isinstance(data, list):
+        blocks = _line_blocks(text)
+        if not blocks:
+            report.failures.update(FIELDS)
+            return [], report
+        report.format = "line"
+        report.repairs["format"] += 1
+        out = []
+        for i, block in enumerate(blocks):
+            parser = LineParser(fallback_topics[i] if i < len(fallback_topics) else "General")
+            q = parser.feed(block).close()
+            if q:
+                out.append(q)
+            report.parsed += parser.report.parsed
+            report.failures.update(parser.report.failures)
+            report.repairs.update(parser.report.repairs)
+        return out, report
+
+    out = []
+    for i, item in enumerate(data):
+        fallback = fallback_topics[i] if i < len(fallback_topics) else "General"
+        q = validate(item, fallback, report)
+        if q:
+            out.append(q)
+    return out, report
@@ -0,0 +1,224 @@
+"""Spaced-repetition review of missed questions (SM-2 scheduling).
+
+A question the student gets wrong becomes a review card. Every later answer
+to it is graded and reschedules the card with SM-2: a lapse brings it back
+within minutes, each correct review pushes it further out by the card's
+ease factor, and a card that reaches ``GRADUATE_DAYS`` leaves the queue.
+
+``ReviewQueue`` keeps its cards in a heap ordered by due time, so the next
+due card is found in O(log n) and an answer reschedules in O(log n), both as
+the answer comes in. Rescheduled cards leave their old heap entry behind;
+it is recognised by its version and skipped when it reaches the top.
+
+A card keeps its question's id and the fields it is filed under; ``draw``
+looks the question up again (in the bank or question store) through its
+``resolve`` argument, which also picks up an explanation that was still
+streaming when it was missed. Bank questions can always be found again, so
+their cards stay small; a generated question may be evicted from the store
+(or never reach it), so its card also keeps the question itself to fall
+back on.
+"""
+import heapq
+import itertools
+import time
+
+RELEARN_SECONDS = 10 * 60     # a missed card comes back this soon
+LEASE_SECONDS = 30 * 60       # a drawn card that is never answered is due again after this
+GRADUATE_DAYS = 90            # cards scheduled this far out are considered learned
+MAX_CARDS = 300               # per student; the furthest-out cards give way beyond this
+START_EASE, MIN_EASE = 2.5, 1.3
+CARD_FIELDS = ("id", "topic", "difficulty", "source")   # what a card keeps of its question
+BODY_FIELDS = ("question", "options", "answer", "explanation")   # kept as well unless it is a bank question
+
+
+def quality(correct, expired=False):
+    """SM-2 grade (0-5) of an answer: 4 correct, 1 wrong, 0 out of time."""
+    if expired:
+        return 0
+    return 4 if correct else 1
+
+
+def card_ref(q):
+    """What a card keeps of question ``q``: see ``CARD_FIELDS`` and ``BODY_FIELDS``."""
+    fields = CARD_FIELDS if q.get("source") == "bank" else CARD_FIELDS + BODY_FIELDS
+    return {k: q.get(k) for k in fields if q.get(k) is not None}
+
+
+def _question(card, resolve):
+    """A copy of ``card``'s question, from ``resolve`` or else the card itself; {} if neither has it."""
+    q = resolve(card.ref)
+    if q:
+        return dict(q)
+    return dict(card.ref) if "question" in card.ref else {}
+
+
+class Card:
+    """One question scheduled for review."""
+
+    __slots__ = ("ref", "subject", "due", "interval", "ease", "reps", "lapses", "version")
+
+    def __init__(self, ref, subject, due, interval=0.0, ease=START_EASE, reps=0, lapses=0):
+        self.ref = ref             # the question's ``CARD_FIELDS``, and ``BODY_FIELDS`` if not from the bank
+        self.subject = subject
+        self.due = due
+        self.interval = interval   # days
+        self.ease = ease
+        self.reps = reps
+        self.lapses = lapses
+        self.version = 0
+
+    def schedule(self, grade, now):
+        """SM-2: update ease, repetitions and interval for an answer graded ``grade``."""
+        if grade < 3:
+            self.reps, self.interval = 0, 0.0
+            self.lapses += 1
+            self.due = now + RELEARN_SECONDS
+        else:
+            self.reps += 1
+            if self.reps == 1:
+                self.interval = 1.0
+            elif self.reps == 2:
+                self.interval = 6.0
+            else:
+                self.interval = round(self.interval * self.ease, 2)
+            self.due = now + self.interval * 86400
+        self.ease = max(MIN_EASE, self.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+        self.version += 1
+
+    def to_list(self):
+        return [self.ref, self.subject, self.due, self.interval, round(self.ease, 3), self.reps, self.lapses]
+
+
+class ReviewQueue:
+    """A student's review cards, with a heap of ``(due, tiebreak, id, version)`` entries."""
+
+    def __init__(self):
+        self.cards = {}      # question id -> Card
+        self._heap = []
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _push(self, card):
+        heapq.heappush(self._heap, (card.due, next(self._seq), card.ref["id"], card.version))
+        if len(self._heap) > 2 * len(self.cards) + 64:
+            # Mostly stale entries: rebuild from the live cards
+            self._heap = [e for e in self._heap if self._live(e)]
+            heapq.heapify(self._heap)
+
+    def _live(self, entry):
+        card = self.cards.get(entry[2])
+        return card is not None and card.version == entry[3]
+
+    def record(self, q, subject, grade, now=None):
+        """Schedule question ``q`` (a dict or record) after an answer graded ``grade``.
+
+        A missed question gets a card; a question without one that was
+        answered correctly needs no review.
+        """
+        now = now or time.time()
+        qid = q["id"]
+        card = self.cards.get(qid)
+        if card is None:
+            if grade >= 3:
+                return
+            card = self.cards[qid] = Card(card_ref(q), subject, now)
+            if len(self.cards) > MAX_CARDS:
+                self._drop_furthest()
+        card.schedule(grade, now)
+        if card.interval >= GRADUATE_DAYS:
+            del self.cards[qid]
+        else:
+            self._push(card)
+
+    def _drop_furthest(self):
+        furthest = max(self.cards.values(), key=lambda c: c.due)
+        del self.cards[furthest.ref["id"]]
+
+    def peek(self):
+        """The card due first, or None for an empty queue."""
+        while self._heap and not self._live(self._heap[0]):
+            heapq.heappop(self._heap)
+        return self.cards[self._heap[0][2]] if self._heap else None
+
+    def _due(self, now):
+        """Live cards due by ``now``; visits only the heap entries that are due."""
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if i >= len(self._heap) or self._heap[i][0] > now:
+                continue
+            if self._live(self._heap[i]):
+                yield self.cards[self._heap[i][2]]
+            stack.extend((2 * i + 1, 2 * i + 2))
+
+    def drawable(self, resolve, now=None, limit=None):
+        """Cards due by ``now`` whose question ``draw`` can serve, up to ``limit``."""
+        cards = []
+        for card in self._due(now or time.time()):
+            if limit is not None and len(cards) >= limit:
+                break
+            if _question(card, resolve):
+                cards.append(card)
+        return cards
+
+    def due_count(self, now=None):
+        """Cards due by ``now``."""
+        return sum(1 for _ in self._due(now or time.time()))
+
+    def due_subjects(self, now=None):
+        """Subjects with cards due by ``now``, most cards first."""
+        counts = {}
+        for card in self._due(now or time.time()):
+            counts[card.subject] = counts.get(card.subject, 0) + 1
+        return sorted(counts, key=counts.get, reverse=True)
+
+    def draw(self, resolve, now=None, exclude=()):
+        """The most overdue card's question, leased until it is answered; None if nothing is due.
+
+        ``resolve(ref)`` returns the full question for a card's ``ref``, or
+        None for a question that can't be found; the card's own copy stands in
+        then, and a card without one is passed over but kept.
+        """
+        now = now or time.time()
+        skipped, card, q = [], None, None
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if not self._live(entry):
+                continue
+            if entry[2] in exclude:
+                skipped.append(entry)
+                continue
+            card = self.cards[entry[2]]
+            q = _question(card, resolve)
+            if q:
+                break
+            skipped.append(entry)
+            card = None
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        if card is None:
+            return None
+        # Answering reschedules the card; an abandoned review brings it back after the lease
+        card.due = now + LEASE_SECONDS
+        card.version += 1
+        self._push(card)
+        for k in ("topic", "difficulty"):
+            if card.ref.get(k) and not q.get(k):
+                q[k] = card.ref[k]
+        q["_subject"] = card.subject
+        return q
+
+    def to_dict(self):
+        return {"cards": [c.to_list() for c in self.cards.values()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        queue = cls()
+        for ref, subject, due, interval, ease, reps, lapses in (data or {}).get("cards", []):
+            ref = card_ref(ref)
+            queue.cards[ref["id"]] = Card(ref, subject, due, interval, ease, reps, lapses)
+        queue._heap = [(c.due, next(queue._seq), qid, c.version) for qid, c in queue.cards.items()]
+        heapq.heapify(queue._heap)
+        return queue
@@ -0,0 +1,179 @@
+"""Quota-aware scheduling of Gemini calls.
+
+Every call takes a slot from ``CallScheduler`` first. Each model id has a
+token bucket sized to its requests-per-minute quota and an adaptive
+concurrency limit that halves on a rate-limit error and creeps back up on
+success. Waiting calls are served by priority class, so a student waiting
+for their next question goes ahead of background prefetch, which goes ahead
+of warm-up jobs. A call that can't get a slot within its class's wait limit
+raises ``QuotaExceeded`` so the caller can try another model or fall back.
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+INTERACTIVE, PREFETCH, WARMUP = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "prefetch", "warmup")
+MAX_WAIT = (5.0, 60.0, 180.0)   # seconds each class may queue for a slot
+DEFAULT_RPM = 60
+DEFAULT_CONCURRENCY = 8
+LIMITED_WINDOW = 60             # seconds a rate-limit error counts as "recent"
+
+
+class QuotaExceeded(Exception):
+    """No request slot for the model became free within the caller's wait limit."""
+
+
+def is_rate_limited(err):
+    """True for quota / HTTP 429 errors, which are worth waiting out."""
+    return (isinstance(err, QuotaExceeded) or getattr(err, "code", None) == 429
+            or type(err).__name__ == "ResourceExhausted" or "429" in str(err))
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+
+    def take(self, now):
+        """Take a token and return 0, or return the seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Lane:
+    """Per-model limits and counters."""
+
+    def __init__(self, rpm, max_concurrency):
+        self.bucket = TokenBucket(rpm / 60.0, max(1, rpm // 6))
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.inflight = 0
+        self.waiting = []          # heap of (priority, ticket)
+        self.successes = 0
+        self.rate_limited = 0
+        self.last_limited = 0.0
+
+
+class CallScheduler:
+    """Token buckets, priority queueing and adaptive concurrency per model id."""
+
+    def __init__(self, rpm=None, default_rpm=DEFAULT_RPM, max_concurrency=DEFAULT_CONCURRENCY,
+                 max_wait=MAX_WAIT):
+        self.rpm = dict(rpm or {})
+        self.default_rpm = default_rpm
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._lanes = {}
+        self._tickets = itertools.count()
+        self.metrics = {name: {"requests": 0, "immediate": 0, "queued": 0, "wait_seconds": 0.0,
+                               "timeouts": 0, "fallbacks": 0}
+                        for name in PRIORITY_NAMES}
+
+    def _lane(self, model_id):
+        lane = self._lanes.get(model_id)
+        if lane is None:
+            lane = self._lanes[model_id] = Lane(int(self.rpm.get(model_id, self.default_rpm)),
+                                                self.max_concurrency)
+        return lane
+
+    def acquire(self, model_id, priority=PREFETCH):
+        """Block until ``model_id`` has a token and a free slot for this call."""
+        m = self.metrics[PRIORITY_NAMES[priority]]
+        start = time.monotonic()
+        deadline = start + self.max_wait[priority]
+        ticket = (priority, next(self._tickets))
+        with self._cond:
+            m["requests"] += 1
+            lane = self._lane(model_id)
+            heapq.heappush(lane.waiting, ticket)
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if lane.waiting[0] == ticket and lane.inflight < lane.limit:
+                        wait = lane.bucket.take(now)
+                        if wait == 0:
+                            heapq.heappop(lane.waiting)
+                            lane.inflight += 1
+                            if not waited:
+                                m["immediate"] += 1
+                            else:
+                                m["queued"] += 1
+                                m["wait_seconds"] += now - start
+                            # The next waiter is now at the head
+                            self._cond.notify_all()
+                            return
+                    if now >= deadline:
+                        m["timeouts"] += 1
+                        lane.last_limited = time.time()
+                        raise QuotaExceeded(f"no {PRIORITY_NAMES[priority]} slot for {model_id} "
+                                            f"within {self.max_wait[priority]:.0f}s")
+                    waited = True
+                    self._cond.wait(min(wait, deadline - now) if wait else deadline - now)
+            except BaseException:
+                if ticket in lane.waiting:
+                    lane.waiting.remove(ticket)
+                    heapq.heapify(lane.waiting)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, model_id, err=None):
+        """Return the slot; a rate-limit ``err`` halves the model's concurrency limit."""
+        with self._cond:
+            lane = self._lane(model_id)
+            lane.inflight -= 1
+            if err is not None and is_rate_limited(err):
+                lane.rate_limited += 1
+                lane.last_limited = time.time()
+                lane.limit = max(1, lane.limit // 2)
+                lane.successes = 0
+            elif err is None:
+                lane.successes += 1
+                if lane.successes >= lane.limit and lane.limit < lane.max_concurrency:
+                    lane.limit += 1
+                    lane.successes = 0
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, model_id, priority=PREFETCH):
+        self.acquire(model_id, priority)
+        try:
+            yield
+        except BaseException as e:
+            self.release(model_id, e)
+            raise
+        self.release(model_id)
+
+    def record_fallback(self, priority=INTERACTIVE):
+        """Count a request that ended up served without the model."""
+        with self._cond:
+            self.metrics[PRIORITY_NAMES[priority]]["fallbacks"] += 1
+
+    def recently_limited(self, window=LIMITED_WINDOW):
+        """True if any model hit its quota, or its queue timed out, in the last ``window`` seconds."""
+        cutoff = time.time() - window
+        with self._cond:
+            return any(lane.last_limited > cutoff for lane in self._lanes.values())
+
+    def stats(self):
+        """Per-class queue/fallback counters and per-model limits."""
+        with self._cond:
+            return {
+                "classes": {k: dict(v) for k, v in self.metrics.items()},
+                "models": {mid: {"limit": lane.limit, "inflight": lane.inflight, "waiting": len(lane.waiting),
+                                 "tokens": round(lane.bucket.tokens, 2), "rate_limited": lane.rate_limited}
+                           for mid, lane in self._lanes.items()},
+            }
@@ -0,0 +1,173 @@
+"""Offline stand-in for ``genai.GenerativeModel``, for benchmarks and load tests.
+
+``StubModel`` answers the app's prompts with well-formed made-up questions in
+whichever format the prompt asks for (line format, JSON object or array, streamed), after
+a simulated latency, and fails a configurable share of calls:
+
+    model = StubModel("stub", latency=0.8, spread=0.4, error_rate=0.02, rate_limit_rate=0.05)
+
+The app uses stub models instead of Gemini when the ``STUB_MODEL`` setting or
+the ``SMARTPREP_STUB_MODEL`` environment variable holds such options, e.g.
+``"latency=0.8,spread=0.4,error_rate=0.02"`` (or just ``"1"`` for the defaults).
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+import threading
+import time
+
+LATENCY_DISTS = ("fixed", "uniform", "lognormal")
+
+_SINGLE_TOPIC = re.compile(r"on the topic \*\*(.+?)\*\*")
+_SUBJECT = re.compile(r"questions? for \*\*(.+?)\*\*")
+_BATCH_TOPIC = re.compile(r"^\d+\. (.+)$", re.M)
+
+
+class StubError(Exception):
+    """A simulated server-side failure."""
+
+
+class StubRateLimit(Exception):
+    """A simulated quota error; looks like a 429 to ``scheduler.is_rate_limited``."""
+
+    code = 429
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Generates fake JAMB questions with simulated latency and failures.
+
+    ``latency`` is the median seconds per call and ``spread`` its variability:
+    the half-width for "uniform", sigma for "lognormal", ignored for "fixed".
+    Streamed responses arrive in ``chunks`` pieces spread over the latency.
+    """
+
+    def __init__(self, model_name="stub", latency=0.0, spread=0.0, dist="lognormal", error_rate=0.0,
+                 rate_limit_rate=0.0, malformed_rate=0.0, chunks=8, seed=None):
+        if dist not in LATENCY_DISTS:
+            raise ValueError(f"dist must be one of {LATENCY_DISTS}")
+        self.model_name = model_name
+        self.latency = latency
+        self.spread = spread
+        self.dist = dist
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.chunks = max(1, chunks)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.calls = 0
+
+    def _roll(self):
+        """(latency, failure or None, malformed) for one call."""
+        with self._lock:
+            self.calls += 1
+            if self.dist == "fixed" or not self.spread:
+                delay = self.latency
+            elif self.dist == "uniform":
+                delay = self._rng.uniform(self.latency - self.spread, self.latency + self.spread)
+            else:
+                delay = self.latency * self._rng.lognormvariate(0, self.spread)
+            r = self._rng.random()
+            if r < self.rate_limit_rate:
+                err = StubRateLimit("429 Resource has been exhausted (stub)")
+            elif r < self.rate_limit_rate + self.error_rate:
+                err = StubError("500 Internal error (stub)")
+            else:
+                err = None
+            return max(0.0, delay), err, self._rng.random() < self.malformed_rate
+
+    def _next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def question(self, subject, topic):
+        """One made-up question as the dict the app's parsers produce."""
+        n = self._next_id()
+        return {
+            "question": f"[{self.model_name} #{n}] Which statement about {topic} in {subject} is correct?",
+            "options": [f"Statement {n}-{k} about {topic}" for k in range(1, 5)],
+            "answer": "ABCD"[n % 4],
+            "explanation": f"Statement {n}-{n % 4 + 1} follows from the core principle of {topic}. " * 3,
+            "topic": topic,
+        }
+
+    def render(self, prompt, malformed=False):
+        """Response text for ``prompt`` in the format it asks for."""
+        m = _SUBJECT.search(prompt)
+        subject = m.group(1) if m else "General Studies"
+        if "JSON array" in prompt:
+            items = [self.question(subject, t) for t in _BATCH_TOPIC.findall(prompt)]
+            text = json.dumps(items)
+            return text[:len(text) // 2] if malformed else text
+        m = _SINGLE_TOPIC.search(prompt)
+        q = self.question(subject, m.group(1) if m else "General")
+        if "JSON object" in prompt:
+            text = json.dumps(q)
+            return text[:len(text) // 2] if malformed else text
+        if malformed:
+            return f"Here is a question about {q['topic']}: {q['question']}"
+        opts = "\n".join(f"{letter}) {o}" for letter, o in zip("ABCD", q["options"]))
+        return (f"Question: {q['question']}\n{opts}\nAnswer: {q['answer']}\n"
+                f"Explanation: {q['explanation']}\nTopic: {q['topic']}")
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        delay, err, malformed = self._roll()
+        if not stream:
+            time.sleep(delay)
+            if err:
+                raise err
+            return StubResponse(self.render(prompt, malformed))
+        if err:
+            time.sleep(delay / self.chunks)
+            raise err
+        return self._stream(self.render(prompt, malformed), delay)
+
+    def _stream(self, text, delay):
+        size = max(1, -(-len(text) // self.chunks))
+        for i in range(0, len(text), size):
+            time.sleep(delay / self.chunks)
+            yield StubResponse(text[i:i + size])
+
+    async def generate_content_async(self, prompt, **kwargs):
+        delay, err, malformed = self._roll()
+        await asyncio.sleep(delay)
+        if err:
+            raise err
+        return StubResponse(self.render(prompt, malformed))
+
+
+def stub_factory(**options):
+    """``factory(model_id)`` for ``ModelRouter`` that builds stub models sharing ``options``."""
+    seed = options.pop("seed", None)
+    counter = itertools.count()
+
+    def factory(model_id):
+        s = None if seed is None else seed + next(counter)
+        return StubModel(model_id, seed=s, **options)
+
+    return factory
+
+
+def parse_options(spec):
+    """``StubModel`` keyword arguments from a ``"name=value,..."`` string."""
+    options = {}
+    for part in str(spec).split(","):
+        name, sep, value = part.partition("=")
+        name = name.strip()
+        if not sep or not name:
+            continue
+        if name == "dist":
+            options[name] = value.strip()
+        elif name in ("chunks", "seed"):
+            options[name] = int(value)
+        else:
+            options[name] = float(value)
+    return options